@@ -0,0 +1 @@
+# benchmarks: generador de datos sintéticos y mediciones de rendimiento
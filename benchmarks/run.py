@@ -0,0 +1,284 @@
+# run.py
+"""
+Benchmarks de carga, agregados, preprocesado, estadísticas y figuras sobre datos sintéticos.
+
+Cada caso se ejecuta `--repeat` veces para medir tiempo (mínimo y media) y una vez más bajo
+tracemalloc (y un pool de Arrow propio) para medir el pico de memoria. El resultado se guarda como JSON y
+puede compararse contra una ejecución anterior:
+
+  python -m benchmarks.run --size medium --out bench.json
+  python -m benchmarks.run --size medium --compare bench.json --tolerance 0.25
+
+Con --compare el proceso termina con código 1 si algún caso es más lento que la base
+por encima de la tolerancia, o si el cargador por bloques deja de usar menos memoria
+que la carga completa.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks import synthetic
+
+SIZES = {
+    "small": {"countries": 10, "days": 180, "age_buckets": 6},
+    "medium": {"countries": 50, "days": 730, "age_buckets": 10},
+    "large": {"countries": 200, "days": 1460, "age_buckets": 18},
+}
+
+# diferencias menores que esto (segundos) no cuentan como regresión
+MIN_DELTA = 0.005
+
+@contextlib.contextmanager
+def _arrow_pool():
+    """Pool de Arrow propio durante la medición: tracemalloc no ve la memoria de Arrow."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        yield None
+        return
+    previous = pa.default_memory_pool()
+    pool = pa.proxy_memory_pool(previous)
+    pa.set_memory_pool(pool)
+    try:
+        yield pool
+    finally:
+        pa.set_memory_pool(previous)
+
+def measure(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    with _arrow_pool() as pool:
+        tracemalloc.start()
+        try:
+            fn()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        arrow_peak = pool.max_memory() if pool is not None else 0
+    return {"seconds": min(times), "mean_seconds": sum(times) / len(times),
+            "peak_mb": (peak + arrow_peak) / 2 ** 20, "python_peak_mb": peak / 2 ** 20,
+            "arrow_peak_mb": arrow_peak / 2 ** 20, "retained_mb": current / 2 ** 20}
+
+def _quiet(fn):
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn()
+    return run
+
+def suite(data_dir, out_dir):
+    """Lista de (grupo, nombre, callable). Importa la app después de fijar COVID_DATA_DIR."""
+    from covid_stats_app import data_loader as dl
+    from covid_stats_app import indicators, plots, preprocess, rollups, stats, storage, validation
+    import pandas as pd
+
+    def drop_typed(key):
+        storage.typed_path(dl.source_path(key)).unlink(missing_ok=True)
+        for p in dl.get_shared_dir().glob(f"{key}-v*.arrow"):
+            p.unlink()
+
+    def cold(key):
+        def run():
+            drop_typed(key)
+            return dl.LOADERS[key]()
+        return run
+
+    def cold_all():
+        for key in dl.EXPECTED_FILES:
+            drop_typed(key)
+        return dl.load_all()
+
+    def appended(key, n=200):
+        # cada medición parte de la copia tipada al día y añade al CSV sus últimas `n` filas
+        # con las fechas desplazadas tras el final; se mide la ingesta incremental de la cola
+        state = {}
+        def run():
+            path = dl.source_path(key)
+            if not state:
+                dl.LOADERS[key]()
+                src = pd.read_csv(path)
+                dates = pd.to_datetime(src["date"])
+                tail = src.tail(n).assign(date=(dates.tail(n) + (dates.max() - dates.min() + pd.Timedelta(days=1))).dt.strftime("%Y-%m-%d"))
+                state.update(size=path.stat().st_size, tail=tail.to_csv(index=False, header=False).encode(),
+                             typed=storage.typed_path(path).read_bytes(),
+                             report=(dl.get_cache_dir() / "quality" / f"{key}.json").read_bytes())
+            with open(path, "r+b") as f:
+                f.truncate(state["size"])
+                f.seek(0, os.SEEK_END)
+                f.write(state["tail"])
+            storage.typed_path(path).write_bytes(state["typed"])
+            # el IPC compartido va por sha1: el de la medición anterior serviría la carga
+            for p in dl.get_shared_dir().glob(f"{key}-v*.arrow"):
+                p.unlink()
+            (dl.get_cache_dir() / "quality" / f"{key}.json").write_bytes(state["report"])
+            return dl.LOADERS[key]()
+        return run
+
+    def private(fn):
+        # carga como copia privada (sin el IPC mapeado), la referencia de memoria del modo por bloques
+        def run():
+            previous, dl.SHARED_MMAP = dl.SHARED_MMAP, False
+            try:
+                return fn()
+            finally:
+                dl.SHARED_MMAP = previous
+        return run
+
+    notif = dl.load_notifications()
+    hosp = dl.load_hospitalizations()
+    deaths = dl.load_deaths_by_age()
+    agg = dl.aggregate_for_choropleth(notif, value_col='new_cases')
+    cases = notif['new_cases']
+    cases_f = cases.astype('float64')
+    monthly = notif.assign(month=notif['date'].dt.to_period('M').dt.to_timestamp())
+    totals = deaths.groupby('age_group', as_index=False)['deaths'].sum()
+
+    coerced = dl._COERCERS["notifications"](dl._safe_read(dl.source_path("notifications")))
+    chunk = max(1000, len(notif) // 10)
+    bench = [
+        ("load", "load_notifications[cold]", cold("notifications")),
+        ("load", "load_hospitalizations[cold]", cold("hospitalizations")),
+        ("load", "load_deaths_by_age[cold]", cold("deaths_by_age")),
+        ("load", "load_all[cold]", cold_all),
+        ("load", "validation.validate",
+         lambda: validation.validate(coerced.copy(), "notifications", dl.METRIC_COLUMNS["notifications"])),
+        ("load", "load_notifications[typed]", dl.load_notifications),
+        ("load", "load_hospitalizations[typed]", dl.load_hospitalizations),
+        ("load", "load_deaths_by_age[typed]", dl.load_deaths_by_age),
+        ("load", "load_notifications[append]", appended("notifications")),
+        ("aggregate", "aggregate_for_choropleth[full]",
+         private(lambda: dl.aggregate_for_choropleth(dl.load_notifications(), value_col='new_cases'))),
+        ("aggregate", "aggregate_for_choropleth[mmap]",
+         lambda: dl.aggregate_for_choropleth(dl.load_notifications(), value_col='new_cases')),
+        ("aggregate", "aggregate_for_choropleth[chunked]",
+         lambda: dl.aggregate_for_choropleth(dl.iter_chunks("notifications", chunk, columns=['date', 'country_code', 'new_cases']), value_col='new_cases')),
+        ("aggregate", "rollups.build_cube", lambda: rollups.build_cube(notif, "notifications")),
+        ("aggregate", "indicators.compute_indicators", lambda: indicators.compute_indicators(notif, 'new_cases')),
+        ("preprocess", "preprocess_notifications", _quiet(lambda: preprocess.preprocess_notifications('new_cases'))),
+        ("preprocess", "preprocess_notifications[lite]", _quiet(lambda: preprocess.preprocess_notifications('new_cases', lite=True))),
+        ("stats", "safe_mean", lambda: stats.safe_mean(cases)),
+        ("stats", "safe_median", lambda: stats.safe_median(cases)),
+        ("stats", "safe_mode", lambda: stats.safe_mode(cases)),
+        ("stats", "safe_variance", lambda: stats.safe_variance(cases)),
+        ("stats", "safe_covariance", lambda: stats.safe_covariance(notif['new_cases'], notif['new_deaths'])),
+        ("stats", "fit_distributions[continuous]", lambda: stats.fit_distributions(cases_f[cases_f > 0], continuous=True)),
+        ("stats", "fit_distributions[discrete]", lambda: stats.fit_distributions(cases, continuous=False)),
+        ("stats", "compute_summary", lambda: stats.compute_summary(notif, 'new_cases', 'new_deaths')),
+        ("stats", "describe", lambda: stats.describe(cases)),
+        ("stats", "summarize_chunks",
+         lambda: stats.summarize_chunks(dl.iter_chunks("notifications", chunk, columns=['new_cases']), 'new_cases')),
+        ("stats", "grouped_describe", lambda: stats.grouped_describe(monthly, 'new_cases', ['country_code', 'month'])),
+        ("stats", "grouped_covariance", lambda: stats.grouped_covariance(monthly, 'new_cases', 'new_deaths', ['country_code'])),
+        ("stats", "grouped_fit", lambda: stats.grouped_fit(monthly, 'new_cases', ['country_code'])),
+        ("plots", "timeseries_plot", lambda: plots.timeseries_plot(notif, y='new_cases', entity_col='country')),
+        ("plots", "timeseries_plot[hosp]", lambda: plots.timeseries_plot(hosp, y='new_hospitalizations', entity_col='country')),
+        ("plots", "animated_choropleth", lambda: plots.animated_choropleth(agg, value_col='new_cases')),
+        ("plots", "histogram_plot", lambda: plots.histogram_plot(notif, 'new_cases')),
+        ("plots", "bar_plot", lambda: plots.bar_plot(totals, x='age_group', y='deaths')),
+        ("plots", "compact_choropleth_html",
+         lambda: plots.compact_choropleth_html(agg, Path(out_dir) / "bench.lite.html", value_col='new_cases')),
+    ]
+    rows = {"notifications": len(notif), "hospitalizations": len(hosp), "deaths_by_age": len(deaths)}
+    return bench, rows
+
+def compare(results, baseline, tolerance):
+    """Casos cuya duración mínima supera la base en más de `tolerance` (fracción)."""
+    base = {r["name"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        b = base.get(r["name"])
+        if not b or r.get("seconds") is None or b.get("seconds") is None:
+            continue
+        delta = r["seconds"] - b["seconds"]
+        ratio = r["seconds"] / b["seconds"] if b["seconds"] else float("inf")
+        r["baseline_seconds"] = b["seconds"]
+        r["ratio"] = ratio
+        if ratio > 1 + tolerance and delta > MIN_DELTA:
+            regressions.append(r["name"])
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", choices=list(SIZES), default="small")
+    parser.add_argument("--countries", type=int, default=None)
+    parser.add_argument("--days", type=int, default=None)
+    parser.add_argument("--age-buckets", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", default=None, help="Grupos separados por comas (load, aggregate, preprocess, stats, plots)")
+    parser.add_argument("--out", default=None, help="Ruta del JSON de resultados")
+    parser.add_argument("--compare", default=None, help="JSON de una ejecución anterior")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    params = dict(SIZES[args.size])
+    for k in ("countries", "days", "age_buckets"):
+        if getattr(args, k) is not None:
+            params[k] = getattr(args, k)
+
+    with tempfile.TemporaryDirectory(prefix="covid_bench_") as tmp:
+        data_dir = Path(tmp) / "final"
+        synthetic.generate(data_dir, params["countries"], params["days"], params["age_buckets"])
+        # la app lee el directorio de datos al importarse: fijarlo antes
+        os.environ["COVID_DATA_DIR"] = str(data_dir)
+        os.environ["COVID_CACHE_DIR"] = str(Path(tmp) / "cache")
+        os.environ["COVID_WORKER"] = "0"
+        bench, rows = suite(data_dir, tmp)
+        only = set(args.only.split(",")) if args.only else None
+        results = []
+        for group, name, fn in bench:
+            if only and group not in only:
+                continue
+            try:
+                res = {"group": group, "name": name, **measure(fn, args.repeat)}
+            except Exception as e:
+                res = {"group": group, "name": name, "seconds": None, "error": str(e)}
+            results.append(res)
+            if res.get("seconds") is None:
+                print(f"{name:<40} ERROR {res['error']}")
+            else:
+                print(f"{name:<40} {res['seconds'] * 1000:10.1f} ms  pico {res['peak_mb']:8.1f} MB")
+
+    by_name = {r["name"]: r for r in results if r.get("seconds") is not None}
+    checks = {}
+    full, chunked = by_name.get("aggregate_for_choropleth[full]"), by_name.get("aggregate_for_choropleth[chunked]")
+    if full and chunked:
+        checks["chunked_peak_below_full"] = chunked["peak_mb"] < full["peak_mb"]
+        print(f"Pico por bloques {chunked['peak_mb']:.1f} MB vs carga completa {full['peak_mb']:.1f} MB")
+
+    import numpy, pandas
+    report = {
+        "meta": {"timestamp": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                 "pandas": pandas.__version__, "numpy": numpy.__version__, "platform": platform.platform(),
+                 "params": params, "rows": rows, "repeat": args.repeat},
+        "results": results,
+        "checks": checks,
+    }
+    status = 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+        for name in regressions:
+            r = by_name[name]
+            print(f"REGRESIÓN {name}: {r['baseline_seconds'] * 1000:.1f} ms -> {r['seconds'] * 1000:.1f} ms (x{r['ratio']:.2f})")
+        if regressions or not all(checks.values()):
+            status = 1
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print("Resultados guardados en:", args.out)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# synthetic.py
+"""
+Generador de CSV sintéticos con el mismo formato que converted_covid_data/final:
+notificaciones y hospitalizaciones (series por país) y muertes por grupo etario.
+Escalable en número de países, días y grupos etarios.
+
+Uso:
+  python -m benchmarks.synthetic --out /tmp/covid_bench/final --countries 50 --days 730 --age-buckets 8
+"""
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# países reales (nombre, ISO3); por encima de esta lista se generan códigos ficticios
+COUNTRIES = [
+    ("Mexico", "MEX"), ("Guatemala", "GTM"), ("Honduras", "HND"), ("El Salvador", "SLV"),
+    ("Nicaragua", "NIC"), ("Costa Rica", "CRI"), ("Panama", "PAN"), ("Colombia", "COL"),
+    ("Venezuela", "VEN"), ("Ecuador", "ECU"), ("Peru", "PER"), ("Bolivia", "BOL"),
+    ("Chile", "CHL"), ("Argentina", "ARG"), ("Uruguay", "URY"), ("Paraguay", "PRY"),
+    ("Brazil", "BRA"), ("Cuba", "CUB"), ("Dominican Republic", "DOM"), ("Spain", "ESP"),
+    ("Portugal", "PRT"), ("France", "FRA"), ("Italy", "ITA"), ("Germany", "DEU"),
+    ("United Kingdom", "GBR"), ("United States", "USA"), ("Canada", "CAN"), ("Japan", "JPN"),
+    ("India", "IND"), ("China", "CHN"), ("South Africa", "ZAF"), ("Nigeria", "NGA"),
+    ("Egypt", "EGY"), ("Australia", "AUS"), ("Indonesia", "IDN"), ("Turkey", "TUR"),
+]
+
+FILES = {
+    "notifications": "notifications_timeseries.csv",
+    "hospitalizations": "hospitalizations_timeseries.csv",
+    "deaths_by_age": "deaths_by_age_timeseries.csv",
+}
+
+def countries(n):
+    out = COUNTRIES[:n]
+    for i in range(len(out), n):
+        out.append((f"Pais {i:04d}", f"Z{i // 26 % 26 + 65:c}{i % 26 + 65:c}"))
+    return out
+
+def age_buckets(n, width=None):
+    """n grupos etarios '0-9', '10-19', ..., '<último>+'."""
+    width = width or max(1, 90 // max(n - 1, 1))
+    labels = [f"{i * width}-{(i + 1) * width - 1}" for i in range(n - 1)]
+    return labels + [f"{(n - 1) * width}+"]
+
+def _waves(days, rng, scale):
+    """Curva epidémica: suma de olas gaussianas con ruido de Poisson."""
+    t = np.arange(days)
+    curve = np.zeros(days)
+    for _ in range(max(1, days // 180)):
+        center, width = rng.uniform(0, days), rng.uniform(15, 60)
+        curve += rng.uniform(0.3, 1.0) * np.exp(-0.5 * ((t - center) / width) ** 2)
+    return rng.poisson(scale * (0.02 + curve))
+
+def _series_frame(pairs, dates, rng, flows, scale, freq_days=1):
+    frames = []
+    idx = np.arange(0, len(dates), freq_days)
+    for name, code in pairs:
+        base = {'date': dates[idx].strftime('%Y-%m-%d'), 'country': name, 'country_code': code}
+        lead = None
+        for flow, cum, ratio in flows:
+            vals = _waves(len(dates), rng, scale) if lead is None else rng.binomial(lead, ratio)
+            lead = vals if lead is None else lead
+            vals = np.add.reduceat(vals, idx)
+            base[flow] = vals
+            if cum:
+                base[cum] = np.cumsum(vals)
+        frames.append(pd.DataFrame(base))
+    return pd.concat(frames, ignore_index=True)
+
+def generate(out_dir, n_countries=20, days=365, n_age=8, start="2020-03-01", seed=0, datasets=None):
+    """Escribe los CSV sintéticos en `out_dir`. Devuelve {dataset: (ruta, filas)}."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    pairs = countries(n_countries)
+    dates = pd.date_range(start, periods=days, freq="D")
+    datasets = datasets or list(FILES)
+    written = {}
+    if "notifications" in datasets:
+        df = _series_frame(pairs, dates, rng, [("new_cases", "cum_cases", None), ("new_deaths", "cum_deaths", 0.02)], 1000)
+        written["notifications"] = df
+    if "hospitalizations" in datasets:
+        df = _series_frame(pairs, dates, rng, [("new_hospitalizations", "cum_hospitalizations", None), ("icu", None, 0.15)], 100, freq_days=7)
+        written["hospitalizations"] = df
+    if "deaths_by_age" in datasets:
+        months = pd.date_range(start, periods=max(1, days // 30), freq="MS")
+        ages = age_buckets(n_age)
+        weights = np.linspace(0.2, 3.0, n_age)
+        rows = len(pairs) * len(months) * n_age
+        df = pd.DataFrame({
+            'date': np.tile(np.repeat(months.strftime('%Y-%m-%d'), n_age), len(pairs)),
+            'country': np.repeat([p[0] for p in pairs], len(months) * n_age),
+            'country_code': np.repeat([p[1] for p in pairs], len(months) * n_age),
+            'age_group': np.tile(ages, len(pairs) * len(months)),
+            'deaths': rng.poisson(np.tile(weights, rows // n_age) * 20),
+            'source_sheet': "Sintético",
+        })
+        written["deaths_by_age"] = df
+    out = {}
+    for key, df in written.items():
+        path = out_dir / FILES[key]
+        df.to_csv(path, index=False)
+        out[key] = (path, len(df))
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", required=True, help="Directorio de salida (equivalente a converted_covid_data/final)")
+    parser.add_argument("--countries", type=int, default=20)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--age-buckets", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for key, (path, rows) in generate(args.out, args.countries, args.days, args.age_buckets, seed=args.seed).items():
+        print(f"{key}: {rows:,} filas -> {path}")
@@ -6,11 +6,19 @@ echo "=== Build script: instalar dependencias y preprocesar ==="
 # Ajusta si Railway ya instala requirements; este paso es seguro incluso si ya se ejecutó.
 python -m pip install -r requirements.txt
 
-# Ejecutar preprocesador (puedes cambiar métricas con la var PREPROCESS_METRICS)
-: "${PREPROCESS_METRICS:=new_cases}"
+# Verificar el presupuesto de tiempo de importación (arranque rápido)
+python -m covid_stats_app.importtime
+
+# Ejecutar preprocesador (puedes cambiar métricas con la var PREPROCESS_METRICS;
+# "all" procesa todas en un solo lote paralelo, con PREPROCESS_WORKERS procesos)
+: "${PREPROCESS_METRICS:=all}"
 echo "Preprocesando métricas: ${PREPROCESS_METRICS}"
-for m in $(echo $PREPROCESS_METRICS | tr ',' ' '); do
-  python -m covid_stats_app.preprocess --metric "$m" || echo "Aviso: preprocesor falló para $m (continuando)"
-done
+if [ "$PREPROCESS_METRICS" = "all" ]; then
+  python -m covid_stats_app.preprocess --all || echo "Aviso: preprocesado por lotes falló (continuando)"
+else
+  for m in $(echo $PREPROCESS_METRICS | tr ',' ' '); do
+    python -m covid_stats_app.preprocess --metric "$m" || echo "Aviso: preprocesor falló para $m (continuando)"
+  done
+fi
 
 echo "=== Build terminado ==="
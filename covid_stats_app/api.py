@@ -0,0 +1,375 @@
+# api.py
+"""
+Servidor HTTP sin interfaz (ASGI) para consumidores máquina: series por país, filas
+paginadas, estadísticas, agregados del mapa e indicadores, en JSON o Arrow.
+
+  python -m covid_stats_app.api --port 8000        # requiere uvicorn
+  uvicorn covid_stats_app.api:app --port 8000
+
+Rutas (GET):
+  /health                      estado y huella de cada dataset
+  /datasets                    filas, columnas y métricas de cada dataset
+  /series/<dataset>            serie diaria de `metric` sumada sobre `country` (o por país con by_country=1)
+  /rows/<dataset>              filas filtradas por `country`, `start`, `end`, `columns`
+  /stats/<dataset>             media, mediana, moda, varianza, covarianza (`other`) y ajustes de `metric`
+  /choropleth/<dataset>        `metric` por país y periodo (`period`: day, week, month, total)
+  /indicators/<dataset>        indicadores por país de `metric` (latest=1: sólo la última fecha)
+  /quality/<dataset>           informe de calidad de la validación en la carga
+
+Las tablas admiten `limit` y `offset` (paginación) y `format=arrow` (o Accept:
+application/vnd.apache.arrow.stream). Cada respuesta lleva un ETag derivado de la huella
+de los CSV y de la consulta; con If-None-Match igual se responde 304 sin recalcular. Los
+cuerpos se guardan en API_CACHE y el cálculo corre en hilos (asyncio.to_thread) para no
+bloquear el bucle de eventos.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+import sys
+from urllib.parse import parse_qs
+
+import numpy as np
+import pandas as pd
+
+from covid_stats_app import data_loader as dl
+from covid_stats_app import indicators, instrument, rollups, stats
+from covid_stats_app.query import QueryIndex
+from covid_stats_app.result_cache import API_CACHE, LRUCache
+
+logger = logging.getLogger("api")
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+JSON_MIME = "application/json"
+
+DEFAULT_LIMIT = int(os.getenv("COVID_API_LIMIT", "1000"))
+MAX_LIMIT = int(os.getenv("COVID_API_MAX_LIMIT", "50000"))
+KEY_COLUMNS = ("country", "country_code")
+
+# índices (país, fecha) por (dataset, columna clave, huella)
+_INDEXES = LRUCache(maxsize=6)
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+# ---------- parámetros ----------
+def _one(q, name, default=None):
+    values = q.get(name)
+    return values[-1] if values else default
+
+def _many(q, name):
+    """Valores repetidos (?country=A&country=B) o separados por comas (?country=A,B)."""
+    out = []
+    for v in q.get(name, []):
+        out.extend(x.strip() for x in v.split(",") if x.strip())
+    return out or None
+
+def _int(q, name, default, lo=0, hi=None):
+    raw = _one(q, name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ApiError(400, f"'{name}' debe ser un entero")
+    if value < lo or (hi is not None and value > hi):
+        raise ApiError(400, f"'{name}' fuera de rango [{lo}, {hi if hi is not None else '∞'}]")
+    return value
+
+def _flag(q, name):
+    return str(_one(q, name, "0")).lower() in ("1", "true", "yes")
+
+def _date(q, name):
+    raw = _one(q, name)
+    if raw is None:
+        return None
+    try:
+        return pd.Timestamp(raw).date()
+    except (ValueError, TypeError):
+        raise ApiError(400, f"'{name}' no es una fecha válida (AAAA-MM-DD)")
+
+def _dataset(name):
+    if name not in dl.EXPECTED_FILES:
+        raise ApiError(404, f"Dataset desconocido: {name!r}. Disponibles: {', '.join(dl.EXPECTED_FILES)}")
+    if dl.source_path(name) is None:
+        raise ApiError(404, f"{dl.EXPECTED_FILES[name]} no encontrado")
+    return name
+
+def _metric(q, dataset, df=None):
+    metrics = dl.METRIC_COLUMNS[dataset]
+    metric = _one(q, "metric", metrics[0])
+    if metric not in metrics or (df is not None and metric not in df.columns):
+        raise ApiError(400, f"Métrica no válida para {dataset}: {metric!r}. Opciones: {', '.join(metrics)}")
+    return metric
+
+def _key_col(q):
+    key = _one(q, "key", "country_code")
+    if key not in KEY_COLUMNS:
+        raise ApiError(400, f"'key' debe ser una de: {', '.join(KEY_COLUMNS)}")
+    return key
+
+def _index(dataset, key_col):
+    fingerprint = dl.dataset_fingerprint(dataset)
+    return _INDEXES.get_or_compute((dataset, key_col, fingerprint),
+                                   lambda: QueryIndex(dl.LOADERS[dataset](), key_col=key_col))
+
+def _page(q, total):
+    limit = _int(q, "limit", DEFAULT_LIMIT, lo=1, hi=MAX_LIMIT)
+    offset = _int(q, "offset", 0)
+    nxt = offset + limit if offset + limit < total else None
+    return offset, limit, {"total": int(total), "offset": offset, "limit": limit, "next_offset": nxt}
+
+def _paginate(q, df):
+    offset, limit, meta = _page(q, len(df))
+    return meta, df.iloc[offset:offset + limit]
+
+# ---------- rutas ----------
+def route_health(q):
+    return {"status": "ok", "datasets": {k: dl.dataset_fingerprint(k) for k in dl.EXPECTED_FILES}}, None
+
+def route_datasets(q):
+    out = []
+    for key in dl.EXPECTED_FILES:
+        if dl.source_path(key) is None:
+            out.append({"dataset": key, "available": False})
+            continue
+        df = dl.LOADERS[key]()
+        out.append({"dataset": key, "available": True, "rows": int(len(df)), "columns": list(df.columns),
+                    "metrics": [m for m in dl.METRIC_COLUMNS[key] if m in df.columns],
+                    "fingerprint": dl.dataset_fingerprint(key)})
+    return {"datasets": out}, None
+
+def route_series(q, dataset):
+    key_col = _key_col(q)
+    idx = _index(dataset, key_col)
+    metric = _metric(q, dataset, idx.data)
+    countries, start, end = _many(q, "country"), _date(q, "start"), _date(q, "end")
+    if _flag(q, "by_country"):
+        df = idx.slice(countries, start, end, columns=[key_col, "date", metric])
+        df = df.groupby([key_col, "date"], as_index=False, observed=True, sort=True)[metric].sum()
+    else:
+        df = idx.series(metric, countries, start, end)
+    meta, page = _paginate(q, df)
+    return {"dataset": dataset, "metric": metric, **meta}, page
+
+def route_rows(q, dataset):
+    key_col = _key_col(q)
+    idx = _index(dataset, key_col)
+    columns = _many(q, "columns")
+    if columns:
+        unknown = [c for c in columns if c not in idx.data.columns]
+        if unknown:
+            raise ApiError(400, f"Columnas desconocidas: {', '.join(unknown)}")
+    # se paginan las posiciones: sólo se materializa la página pedida
+    pos = idx.positions(_many(q, "country"), _date(q, "start"), _date(q, "end"))
+    offset, limit, meta = _page(q, len(pos))
+    data = idx.data if not columns else idx.data[columns]
+    return {"dataset": dataset, **meta}, data.take(pos[offset:offset + limit])
+
+def route_stats(q, dataset):
+    df = dl.LOADERS[dataset]()
+    metric = _metric(q, dataset, df)
+    other = _one(q, "other")
+    if other is not None and other not in df.columns:
+        raise ApiError(400, f"Columna 'other' desconocida: {other!r}")
+    continuous = not _flag(q, "discrete")
+    countries, start, end = _many(q, "country"), _date(q, "start"), _date(q, "end")
+    if countries or start or end:
+        sub = _index(dataset, _key_col(q)).slice(countries, start, end)
+        result = stats.compute_summary(sub, metric, other, continuous)
+        n = len(sub)
+    else:
+        result = stats.cached_summary(dl.dataset_fingerprint(dataset), df, metric, other, continuous)
+        n = len(df)
+    return {"dataset": dataset, "metric": metric, "other": other, "continuous": continuous, "rows": int(n), **result}, None
+
+def route_choropleth(q, dataset):
+    metric = _metric(q, dataset)
+    period = _one(q, "period", "month")
+    if period not in rollups.PERIODS:
+        raise ApiError(400, f"'period' debe ser uno de: {', '.join(rollups.PERIODS)}")
+    df = rollups.rollup(dataset, period, by=["country_code"], metrics=[metric])
+    df = df[["country_code", "period_start", metric]]
+    start, end = _date(q, "start"), _date(q, "end")
+    if start is not None:
+        df = df[df["period_start"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["period_start"] <= pd.Timestamp(end)]
+    meta, page = _paginate(q, df.reset_index(drop=True))
+    return {"dataset": dataset, "metric": metric, "period": period, **meta}, page
+
+def route_indicators(q, dataset):
+    key_col = _key_col(q)
+    df = dl.LOADERS[dataset]()
+    metric = _metric(q, dataset, df)
+    window = _int(q, "window", 7, lo=1, hi=365)
+    ind = indicators.cached_indicators(dl.dataset_fingerprint(dataset), df, metric, key_col=key_col, window=window)
+    countries = _many(q, "country")
+    if countries:
+        ind = ind[ind[key_col].isin(countries)]
+    if _flag(q, "latest"):
+        ind = indicators.latest(ind, key_col)
+    meta, page = _paginate(q, ind.reset_index(drop=True))
+    return {"dataset": dataset, "metric": metric, "window": window, **meta}, page
+
+def route_quality(q, dataset):
+    return dl.quality_report(dataset), None
+
+ROUTES = {
+    "health": (route_health, False),
+    "datasets": (route_datasets, False),
+    "series": (route_series, True),
+    "rows": (route_rows, True),
+    "stats": (route_stats, True),
+    "choropleth": (route_choropleth, True),
+    "indicators": (route_indicators, True),
+    "quality": (route_quality, True),
+}
+
+# ---------- serialización ----------
+def _clean(obj):
+    """Tipos numpy/pandas a JSON; NaN e infinitos a null."""
+    if isinstance(obj, dict):
+        return {str(k): _clean(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_clean(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return _clean(obj.tolist())
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    return obj
+
+def _to_json(meta, df):
+    head = json.dumps(_clean(meta), ensure_ascii=False)
+    if df is None:
+        return head.encode("utf-8")
+    records = df.to_json(orient="records", date_format="iso", date_unit="s", force_ascii=False)
+    return (head[:-1] + (", " if meta else "") + '"data": ' + records + "}").encode("utf-8")
+
+def _to_arrow(meta, df):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           b"covid_api": json.dumps(_clean(meta)).encode("utf-8")})
+    buf = io.BytesIO()
+    with pa.ipc.new_stream(buf, table.schema) as writer:
+        writer.write_table(table)
+    return buf.getvalue()
+
+def _wants_arrow(q, headers):
+    fmt = _one(q, "format")
+    if fmt is not None:
+        if fmt not in ("json", "arrow"):
+            raise ApiError(400, "'format' debe ser json o arrow")
+        return fmt == "arrow"
+    return ARROW_MIME in headers.get("accept", "")
+
+# ---------- petición ----------
+def _resolve(path):
+    parts = [p for p in path.strip("/").split("/") if p]
+    if not parts or parts[0] not in ROUTES:
+        raise ApiError(404, f"Ruta desconocida: {path}")
+    handler, needs_dataset = ROUTES[parts[0]]
+    if needs_dataset != (len(parts) == 2) or len(parts) > 2:
+        raise ApiError(404, f"Ruta desconocida: {path}")
+    return parts[0], handler, (_dataset(parts[1]),) if needs_dataset else ()
+
+def _etag(name, args, q, arrow):
+    """ETag de la respuesta: huella de los datos implicados + ruta + consulta + formato."""
+    keys = args or tuple(dl.EXPECTED_FILES)
+    prints = tuple(dl.dataset_fingerprint(k) for k in keys)
+    query = tuple(sorted((k, tuple(v)) for k, v in q.items()))
+    digest = hashlib.sha1(repr((prints, name, args, query, arrow)).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+def _compute(name, handler, args, q, arrow):
+    with instrument.span(f"api.{name}") as rec:
+        meta, df = handler(q, *args)
+        if df is not None:
+            rec["rows"] = len(df)
+        if arrow:
+            if df is None:
+                raise ApiError(406, f"/{name} devuelve un objeto, no una tabla: usa format=json")
+            return _to_arrow(meta, df), ARROW_MIME
+        return _to_json(meta, df), JSON_MIME
+
+async def handle(method, path, query_string, headers):
+    """Resuelve una petición. Devuelve (status, cabeceras, cuerpo); con HEAD el cuerpo lo descarta `app`."""
+    if method not in ("GET", "HEAD"):
+        return _error(405, "Sólo se admiten GET y HEAD")
+    try:
+        q = parse_qs(query_string.decode("latin-1") if isinstance(query_string, bytes) else query_string)
+        name, handler, args = _resolve(path)
+        arrow = _wants_arrow(q, headers)
+        # la huella puede requerir leer el CSV (sha1) la primera vez: fuera del bucle de eventos
+        etag = await asyncio.to_thread(_etag, name, args, q, arrow)
+        common = {"etag": etag, "cache-control": "no-cache", "vary": "accept"}
+        if etag in headers.get("if-none-match", ""):
+            return 304, common, b""
+        cached = API_CACHE.get(etag)
+        if cached is None:
+            cached = await asyncio.to_thread(_compute, name, handler, args, q, arrow)
+            API_CACHE.put(etag, cached)
+        body, mime = cached
+        return 200, {**common, "content-type": mime + ("; charset=utf-8" if mime == JSON_MIME else "")}, body
+    except ApiError as e:
+        return _error(e.status, e.message)
+    except FileNotFoundError as e:
+        return _error(404, str(e))
+    except Exception as e:
+        logger.exception("Error atendiendo %s", path)
+        return _error(500, f"Error interno: {e}")
+
+def _error(status, message):
+    return status, {"content-type": JSON_MIME + "; charset=utf-8"}, \
+        json.dumps({"error": message, "status": status}, ensure_ascii=False).encode("utf-8")
+
+async def app(scope, receive, send):
+    """Aplicación ASGI (HTTP + lifespan)."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+    status, out_headers, body = await handle(scope["method"], scope["path"], scope.get("query_string", b""), headers)
+    out_headers["content-length"] = str(len(body))
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in out_headers.items()]})
+    await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP de los datos COVID (ASGI)")
+    parser.add_argument("--host", default=os.getenv("COVID_API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("COVID_API_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=1, help="Procesos de uvicorn (comparten los IPC mapeados)")
+    args = parser.parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError:
+        print("Falta uvicorn: instala con `pip install uvicorn` o usa otro servidor ASGI con covid_stats_app.api:app")
+        return 1
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run("covid_stats_app.api:app", host=args.host, port=args.port, workers=args.workers)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
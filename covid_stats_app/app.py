@@ -7,6 +7,7 @@ import streamlit as st
 import pandas as pd
 import streamlit.components.v1 as components
 from datetime import datetime, timedelta
+from concurrent.futures import TimeoutError as LoadTimeout
 
 # asegurar repo root
 ROOT = Path(__file__).resolve().parent.parent
@@ -14,7 +15,8 @@ if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from covid_stats_app import data_loader as dl
-from covid_stats_app import plots, stats
+from covid_stats_app import plots, stats, rollups, indicators, worker, instrument, export, validation
+from covid_stats_app.query import QueryIndex
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("covid_app")
@@ -39,6 +41,13 @@ DEATHS_METRICS = {
     "Muertes (conteo)": "deaths",
 }
 
+# esquemas de grupos etarios (None = grupos originales de la fuente)
+AGE_SCHEMES = {
+    "Original": None,
+    "Decenal (10 años)": "10y",
+    "Amplia (0-4, 5-14, 15-64, 65+)": "broad",
+}
+
 DATASET_MAP = {"Notificaciones": "notifications", "Hospitalizaciones": "hospitalizations", "Muertes por edad": "deaths_by_age"}
 GENERIC_FOOTER = "Panel interactivo para exploración y análisis de series COVID — diseñado para uso exploratorio."
 
@@ -55,26 +64,90 @@ def _files_state():
         state.append((str(p), m))
     return tuple(state)
 
+# segundos que una sección espera a su dataset antes de mostrarse sin él
+LOAD_TIMEOUT = float(os.getenv("COVID_LOAD_TIMEOUT", "30"))
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def dataset_loads(state_key):
+    # los tres datasets empiezan a cargarse en paralelo al abrir la app; cada sección espera sólo el suyo
+    return dl.start_loads()
+
+def _dataset_future(key, state_key):
+    loads = dataset_loads(state_key)
+    fut = loads.get(key)
+    if fut is None or (fut.done() and fut.exception() is not None):
+        # reintento tras un fallo (o si el CSV apareció después de lanzar las cargas)
+        fut = dl.start_loads([key]).get(key)
+        if fut is not None:
+            loads[key] = fut
+    return fut
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def load_dataset_cached(key, state_key):
+    # un único DataFrame compacto compartido por todas las sesiones (sin copia por llamada);
+    # es de sólo lectura: quien necesite modificarlo debe trabajar sobre una copia
+    fut = _dataset_future(key, state_key)
+    if fut is None:
+        return dl.LOADERS[key]()
+    return fut.result(timeout=LOAD_TIMEOUT)
+
 @st.cache_data(ttl=3600, show_spinner=False)
-def load_data_cached(state_key):
-    notif = hosp = deaths = pd.DataFrame()
-    errors = []
-    try:
-        notif = dl.load_notifications()
-    except Exception as e:
-        errors.append(f"Notificaciones: {e}")
-    try:
-        hosp = dl.load_hospitalizations()
-    except Exception as e:
-        errors.append(f"Hospitalizaciones: {e}")
+def count_rows_cached(key, state_key):
+    return dl.count_rows(key)
+
+DATASET_LABELS = {v: k for k, v in DATASET_MAP.items()}
+
+def get_dataset(key):
+    # cada sección carga sólo los datasets que usa
     try:
-        deaths = dl.load_deaths_by_age()
+        return load_dataset_cached(key, file_state)
+    except LoadTimeout:
+        st.info(f"{DATASET_LABELS[key]}: aún se está cargando; vuelve a ejecutar en unos segundos.")
+        return pd.DataFrame()
     except Exception as e:
-        errors.append(f"Muertes por edad: {e}")
-    return notif, hosp, deaths, errors
+        st.error(f"{DATASET_LABELS[key]}: {e}")
+        return pd.DataFrame()
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def query_index_cached(key, key_col, state_key):
+    return QueryIndex(load_dataset_cached(key, state_key), key_col=key_col)
+
+def get_index(key, key_col='country'):
+    # índice ordenado por (país, fecha) para filtrar sin copiar el dataset
+    df = get_dataset(key)
+    if key_col not in df.columns or 'date' not in df.columns:
+        return None
+    return query_index_cached(key, key_col, file_state)
+
+def get_indicators(key, metric, key_col='country'):
+    # indicadores por país de todo el dataset, compartidos entre sesiones por huella de datos
+    df = get_dataset(key)
+    if key_col not in df.columns or metric not in df.columns:
+        return pd.DataFrame()
+    return indicators.cached_indicators(dl.dataset_fingerprint(key), df, metric, key_col=key_col)
+
+@st.cache_resource(show_spinner=False)
+def start_worker():
+    # un único worker de precálculo por proceso: regenera mapas y agregados fuera de las peticiones
+    return worker.start_background()
+
+def show_chart(fig):
+    # la serialización y envío de la figura también cuenta en el panel de rendimiento
+    with instrument.span("render.plotly_chart", rows=sum(len(t.x) for t in fig.data if getattr(t, 'x', None) is not None)):
+        st.plotly_chart(fig, use_container_width=True)
+
+# panel opcional con el desglose de tiempos de cada rerun (COVID_PERF_PANEL=1 lo activa por defecto)
+perf_panel = st.sidebar.checkbox("Rendimiento", value=os.getenv("COVID_PERF_PANEL", "0") == "1",
+                                 help="Mide carga, coerción, agregados, estadísticas y figuras en cada rerun")
+if perf_panel:
+    instrument.start(label="rerun")
+else:
+    instrument.stop()
 
 file_state = _files_state()
-notif, hosp, deaths, load_errors = load_data_cached(file_state)
+if worker.enabled():
+    start_worker()
+missing = dl.missing_files()
 
 # uploader simple (si faltan CSV)
 def uploader_panel():
@@ -102,13 +175,24 @@ def uploader_panel():
                 st.success("Archivos guardados: " + ", ".join(saved))
                 st.experimental_rerun()
 
-if notif.empty or hosp.empty or deaths.empty:
+if missing:
     uploader_panel()
 
 # sidebar
 section = st.sidebar.selectbox("Sección", ["Resumen", "Notificaciones", "Hospitalizaciones", "Muertes por edad", "Análisis estadístico", "Exportar y ajustes"])
 
-if notif.empty and hosp.empty and deaths.empty:
+# estado de la carga de cada dataset (las secciones listas se muestran sin esperar al resto)
+with st.sidebar.expander("Carga de datos", expanded=False):
+    for key, fut in dataset_loads(file_state).items():
+        if not fut.done():
+            st.caption(f"⏳ {DATASET_LABELS[key]}: cargando…")
+        elif fut.exception() is not None:
+            st.caption(f"⚠️ {DATASET_LABELS[key]}: error")
+        else:
+            secs = dl.LOAD_TIMES.get(key)
+            st.caption(f"✅ {DATASET_LABELS[key]}" + (f" ({secs:.2f} s)" if secs is not None else ""))
+
+if len(missing) == len(dl.EXPECTED_FILES):
     st.warning("Aún no hay datos cargados. Sube los CSV en la sección superior para comenzar.")
     st.stop()
 
@@ -120,9 +204,10 @@ if section == "Resumen":
 Explora la evolución de COVID-19 (2020–2025) con indicadores y visualizaciones.
     """)
     c1, c2, c3, c4 = st.columns(4)
-    c1.metric("Registros — notificaciones", f"{len(notif):,}")
-    c2.metric("Registros — hospitalizaciones", f"{len(hosp):,}")
-    c3.metric("Registros — muertes por edad", f"{len(deaths):,}")
+    c1.metric("Registros — notificaciones", f"{count_rows_cached('notifications', file_state):,}")
+    c2.metric("Registros — hospitalizaciones", f"{count_rows_cached('hospitalizations', file_state):,}")
+    c3.metric("Registros — muertes por edad", f"{count_rows_cached('deaths_by_age', file_state):,}")
+    notif = get_dataset("notifications") if "notifications" not in missing else pd.DataFrame()
 
     st.markdown("### Filtrado por país y rango de fechas")
     countries = sorted(notif['country'].dropna().unique()) if 'country' in notif.columns else []
@@ -146,28 +231,48 @@ Explora la evolución de COVID-19 (2020–2025) con indicadores y visualizacione
     if 'summary_filter' in st.session_state:
         f = st.session_state['summary_filter']
         st.markdown("**Resultados del filtro:**")
-        df = notif.copy()
-        if f['country']:
-            df = df[df['country'] == f['country']]
-        if f['start'] and f['end']:
-            df = df[(pd.to_datetime(df['date']).dt.date >= f['start']) & (pd.to_datetime(df['date']).dt.date <= f['end'])]
+        idx = get_index("notifications")
+        if idx is None:
+            df = pd.DataFrame()
+        else:
+            df = idx.slice(keys=f['country'], start=f['start'] or None, end=f['end'] or None)
         if df.empty:
             st.info("No hay datos para el filtro aplicado.")
         else:
-            last7_mean = stats.safe_mean(df.sort_values('date').tail(7)['new_cases']) if 'new_cases' in df.columns else None
+            # media móvil de 7 días al final del rango: por país o sobre la suma de todos los países
+            if f['country']:
+                ind = get_indicators("notifications", "new_cases")
+                ind = ind[ind['country'] == f['country']] if not ind.empty else ind
+            else:
+                total = rollups.rollup("notifications", "day", by=[], metrics=["new_cases"]).rename(columns={'period_start': 'date'})
+                ind = indicators.compute_indicators(total.assign(country="Todos"), "new_cases", key_col='country')
+            if f['end'] and not ind.empty:
+                ind = ind[ind['date'] < pd.Timestamp(f['end']) + pd.Timedelta(days=1)]
+            rolling = ind['rolling_mean'].dropna() if not ind.empty else ind
+            last7_mean = float(rolling.iloc[-1]) if len(rolling) else None
             st.write(f"Periodos: {f['start']} — {f['end']}")
             st.metric("Media (últimos 7 días)", f"{last7_mean:,.1f}" if last7_mean is not None else "N/A")
             # Mostrar mini serie
-            fig = plots.timeseries_plot(df, date_col='date', y='new_cases', entity_col=None, countries=None, y_label="Nuevos casos", title="Serie (filtro aplicado)")
-            st.plotly_chart(fig, use_container_width=True)
+            fig = plots.cached_figure(
+                (dl.dataset_fingerprint("notifications"), 'new_cases', f['country'], f['start'], f['end'], 'resumen'),
+                lambda: plots.timeseries_plot(df, date_col='date', y='new_cases', entity_col=None, countries=None, y_label="Nuevos casos", title="Serie (filtro aplicado)"))
+            show_chart(fig)
     else:
         st.info("Seleccione país y rango y pulse 'Aplicar filtro' para ver indicadores por periodo.")
+    ind_all = get_indicators("notifications", "new_cases") if "notifications" not in missing else pd.DataFrame()
+    if not ind_all.empty:
+        with st.expander("Indicadores por país (último dato disponible)"):
+            last = indicators.latest(ind_all, key_col='country')
+            st.dataframe(last.rename(columns={
+                'rolling_mean': 'media 7d', 'rolling_sum': 'suma 7d', 'wow_growth': 'crecimiento semanal',
+                'doubling_time': 'duplicación (días)', 'rt_proxy': 'Rt (aprox.)'}).drop(columns=['incidence_100k']))
     st.markdown("---")
     st.write(GENERIC_FOOTER)
 
 # ---------- NOTIFICACIONES ----------
 elif section == "Notificaciones":
     st.title("Notificaciones — casos y muertes")
+    notif = get_dataset("notifications")
     countries = sorted(notif['country'].dropna().unique()) if 'country' in notif.columns else []
     sel_countries = st.multiselect("Selecciona países (vacío = todos)", countries, default=(countries[:3] if len(countries) > 0 else []))
     metric_label = st.selectbox("Métrica", list(NOTIF_METRICS.keys()))
@@ -175,105 +280,106 @@ elif section == "Notificaciones":
 
     st.subheader("Serie temporal")
     try:
-        fig_ts = plots.timeseries_plot(notif, date_col='date', y=metric_col, entity_col='country', countries=sel_countries if sel_countries else None, y_label=metric_label, title=f"{metric_label} — Serie temporal")
-        st.plotly_chart(fig_ts, use_container_width=True)
+        idx = get_index("notifications")
+        # la figura (ya reducida a un número acotado de puntos) se reutiliza entre reruns y sesiones
+        def _build_ts():
+            df_ts = idx.slice(keys=sel_countries or None, columns=['date', 'country', metric_col]) if idx is not None else notif
+            return plots.timeseries_plot(df_ts, date_col='date', y=metric_col, entity_col='country', countries=None, y_label=metric_label, title=f"{metric_label} — Serie temporal")
+        fig_ts = plots.cached_figure((dl.dataset_fingerprint("notifications"), metric_col, tuple(sel_countries), None, None), _build_ts)
+        show_chart(fig_ts)
     except Exception as e:
         st.error(f"No se pudo generar la serie temporal: {e}")
 
     st.subheader("Mapa animado")
-    st.write("Abajo se muestra la animación por fecha. Si está en blanco, ejecuta el preprocesador para generar el HTML o verifica country_code.")
+    st.write("Abajo se muestra la animación por fecha. Se genera en segundo plano cada vez que cambian los datos.")
 
     processed_dir = dl.get_base_dir().parent / "processed"
-    html_path = processed_dir / f"choropleth_notifications_{NOTIF_METRICS[metric_label]}.html"
-    csv_agg_path = processed_dir / f"notifications_agg_{NOTIF_METRICS[metric_label]}.csv"
+    # se prefiere la animación compacta (.lite.html) si está disponible
+    html_path = processed_dir / f"choropleth_notifications_{NOTIF_METRICS[metric_label]}.lite.html"
+    if not html_path.exists():
+        html_path = processed_dir / f"choropleth_notifications_{NOTIF_METRICS[metric_label]}.html"
 
+    status = worker.read_status() or {}
     if html_path.exists():
         with open(html_path, "r", encoding="utf-8") as f:
             html = f.read()
-        components.html(html, height=700, scrolling=True)
+        with instrument.span("render.html", bytes=len(html)):
+            components.html(html, height=700, scrolling=True)
+        if status.get("state") == "running":
+            st.caption(f"Actualizando el mapa con datos nuevos (desde {status.get('started')}); se muestra la versión anterior.")
+    elif status.get("state") == "running":
+        st.info(f"El mapa se está generando en segundo plano (desde {status.get('started')}). Recarga la página en unos segundos.")
+    elif status.get("state") == "error":
+        st.error("El worker de precálculo falló: " + "; ".join(status.get("errors", [])))
+    elif worker.enabled():
+        st.info("El mapa aún no se ha generado; el worker de precálculo lo creará en breve.")
     else:
-        try:
-            agg = dl.aggregate_for_choropleth(notif, date_col='date', value_col=metric_col, code_col='country_code')
-            if agg is None or agg.empty:
-                st.warning("No hay datos válidos para el mapa animado (country_code o fechas faltantes). Ejecuta el preprocesador para generar la animación HTML.")
-            else:
-                # crear acumulado por país para mostrar evolución
-                tmp = agg.copy()
-                tmp['date'] = pd.to_datetime(tmp['date'])
-                tmp = tmp.sort_values(['country_code','date'])
-                tmp['cum'] = tmp.groupby('country_code')[metric_col].cumsum()
-                tmp2 = tmp.rename(columns={metric_col:'value'})
-                fig_map = plots.animated_choropleth(tmp2, date_col='date', value_col='cum', code_col='country_code', title=f"{metric_label} — Animación acumulada")
-                st.plotly_chart(fig_map, use_container_width=True)
-        except Exception as e:
-            st.error(f"No se pudo generar el mapa animado: {e}")
+        st.warning("El mapa no está generado. Ejecuta `python -m covid_stats_app.worker --once` o el preprocesador.")
 
 # ---------- HOSPITALIZACIONES ----------
 elif section == "Hospitalizaciones":
     st.title("Hospitalizaciones")
+    hosp = get_dataset("hospitalizations")
     countries = sorted(hosp['country'].dropna().unique()) if 'country' in hosp.columns else []
     sel = st.selectbox("País", countries)
     metric_label = st.selectbox("Métrica", list(HOSP_METRICS.keys()))
     metric_col = HOSP_METRICS[metric_label]
     try:
-        fig = plots.timeseries_plot(hosp, date_col='date', y=metric_col, entity_col='country', countries=[sel] if sel else None, y_label=metric_label, title=f"{metric_label} — {sel}")
-        st.plotly_chart(fig, use_container_width=True)
+        idx = get_index("hospitalizations")
+        def _build_h():
+            df_h = idx.slice(keys=sel, columns=['date', 'country', metric_col]) if (idx is not None and sel) else hosp
+            return plots.timeseries_plot(df_h, date_col='date', y=metric_col, entity_col='country', countries=None, y_label=metric_label, title=f"{metric_label} — {sel}")
+        fig = plots.cached_figure((dl.dataset_fingerprint("hospitalizations"), metric_col, sel, None, None), _build_h)
+        show_chart(fig)
     except Exception as e:
         st.error(f"No se pudo generar la gráfica: {e}")
 
 # ---------- MUERTES POR EDAD ----------
 elif section == "Muertes por edad":
     st.title("Muertes por edad")
+    deaths = get_dataset("deaths_by_age")
     view = st.selectbox("Vista", ["Totales por grupo etario", "Serie temporal por grupo etario"])
+    scheme = AGE_SCHEMES[st.selectbox("Agrupación etaria", list(AGE_SCHEMES))]
     age_groups = []
     if 'age_group' in deaths.columns:
-        def _age_sort_key(g):
-            try:
-                s = str(g).strip()
-                if '+' in s:
-                    return (1000, int(s.replace('+','').split('+')[0]))
-                if '-' in s:
-                    a = int(s.split('-')[0])
-                    return (a, 0)
-                return (10**6, 0)
-            except Exception:
-                return (10**6, 0)
-        age_groups = sorted(deaths['age_group'].dropna().unique(), key=_age_sort_key)
+        # age_group llega como categórico ordenado por edad: el orden sale de sus categorías
+        ages = dl.order_age_groups(deaths['age_group'])
+        age_groups = [t[0] for t in dl.AGE_SCHEMES[scheme]] if scheme else list(ages.cat.remove_unused_categories().cat.categories)
 
     if view == "Totales por grupo etario":
         if not age_groups:
             st.warning("No se encontraron grupos etarios en el dataset.")
         else:
-            df_tot = deaths.groupby('age_group', as_index=False)['deaths'].sum()
-            df_tot['order'] = df_tot['age_group'].apply(lambda x: age_groups.index(x) if x in age_groups else 10**6)
-            df_tot = df_tot.sort_values('order')
+            df_tot = rollups.totals("deaths_by_age", ["age_group"], "deaths")
+            if scheme:
+                df_tot = dl.rebucket(df_tot, scheme)
+            df_tot = df_tot.sort_values('age_group')
             fig = plots.bar_plot(df_tot, x='age_group', y='deaths', x_label="Grupo etario", y_label="Total de muertes", title="Muertes acumuladas por grupo etario")
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart(fig)
     else:
         sel_age = st.selectbox("Seleccionar grupo etario", age_groups)
         if sel_age:
-            df_sel = deaths[deaths['age_group'] == sel_age].copy()
-            if df_sel.empty:
+            monthly = rollups.rollup("deaths_by_age", "month", by=["age_group"], metrics=["deaths"])[['period_start', 'age_group', 'deaths']]
+            if scheme:
+                monthly = dl.rebucket(monthly, scheme)
+            monthly = monthly[monthly['age_group'] == sel_age].rename(columns={'period_start': 'month'})
+            if monthly.empty:
                 st.info("No hay datos para el grupo seleccionado.")
             else:
-                df_sel['month'] = pd.to_datetime(df_sel['date'], errors='coerce').dt.to_period('M').dt.to_timestamp()
-                monthly = df_sel.groupby('month', as_index=False)['deaths'].sum()
                 fig = plots.timeseries_plot(monthly, date_col='month', y='deaths', entity_col=None, countries=None, y_label="Muertes", title=f"Muertes por mes — {sel_age}")
-                st.plotly_chart(fig, use_container_width=True)
+                show_chart(fig)
 
 # ---------- ANALISIS ESTADISTICO ----------
 elif section == "Análisis estadístico":
     st.title("Análisis estadístico")
     ds_label = st.selectbox("Dataset para análisis", list(DATASET_MAP.keys()))
     ds_key = DATASET_MAP[ds_label]
+    df = get_dataset(ds_key)
     if ds_key == "notifications":
-        df = notif
         metrics_map = NOTIF_METRICS
     elif ds_key == "hospitalizations":
-        df = hosp
         metrics_map = HOSP_METRICS
     else:
-        df = deaths
         metrics_map = DEATHS_METRICS
 
     numeric_options = [k for k, v in metrics_map.items() if v in df.columns]
@@ -285,23 +391,33 @@ elif section == "Análisis estadístico":
         cont = st.checkbox("Tratar como continua (normal/gamma)", value=True)
         other_options = [lab for lab in numeric_options if lab != col_label]
         other_label = st.selectbox("Covarianza con (otra columna)", other_options + ["-- ninguna --"])
+        group_options = [k for k in stats.GROUP_KEYS if k in df.columns or (k == 'month' and 'date' in df.columns)]
+        group_by = st.multiselect("Agrupar por (vacío = todo el dataset)", group_options)
 
-        if st.button("Calcular estadísticas"):
-            mean_v = stats.safe_mean(df[col_key])
-            median_v = stats.safe_median(df[col_key])
-            mode_v = stats.safe_mode(df[col_key])
-            var_v = stats.safe_variance(df[col_key])
-            cov_v = None
+        if group_by and st.button("Calcular estadísticas por grupo"):
+            table = stats.grouped_describe(df, col_key, group_by)
             if other_label and other_label != "-- ninguna --":
-                other_key = metrics_map[other_label]
-                cov_v = stats.safe_covariance(df[col_key], df[other_key])
-            fits = stats.fit_distributions(df[col_key], continuous=cont)
+                table = table.merge(stats.grouped_covariance(df, col_key, metrics_map[other_label], group_by), on=group_by, how='left')
+            st.session_state['last_grouped'] = {
+                'table': table, 'fits': stats.grouped_fit(df, col_key, group_by, continuous=cont),
+                'col_label': col_label, 'group_by': group_by,
+            }
+        if group_by and 'last_grouped' in st.session_state:
+            res_g = st.session_state['last_grouped']
+            st.subheader(f"Resultados por {', '.join(res_g['group_by'])} — {res_g['col_label']}")
+            st.dataframe(res_g['table'], use_container_width=True)
+            with st.expander("Ajustes por grupo (parámetros)"):
+                st.dataframe(res_g['fits'], use_container_width=True)
+
+        if not group_by and st.button("Calcular estadísticas"):
+            other_key = metrics_map[other_label] if other_label and other_label != "-- ninguna --" else None
+            # resultado compartido entre sesiones: se recalcula sólo si cambian datos o parámetros
+            res = stats.cached_summary(dl.dataset_fingerprint(ds_key), df, col_key, other_key, cont)
             st.session_state['last_stats'] = {
-                'mean': mean_v, 'median': median_v, 'mode': mode_v, 'var': var_v, 'cov': cov_v, 'fits': fits,
-                'col_label': col_label, 'other_label': other_label if other_label else None, 'cont': cont
+                **res, 'col_label': col_label, 'other_label': other_label if other_label else None, 'cont': cont
             }
 
-        if 'last_stats' in st.session_state:
+        if not group_by and 'last_stats' in st.session_state:
             res = st.session_state['last_stats']
             st.subheader(f"Resultados — {res.get('col_label')}")
             a, b, c, d = st.columns(4)
@@ -319,6 +435,9 @@ elif section == "Análisis estadístico":
                     st.write("Covarianza: N/A (datos insuficientes)")
             if 'acum' in col_key or 'cum' in col_key or 'acumul' in col_label.lower():
                 st.warning("Atención: la columna seleccionada parece ser acumulada. Use columnas de flujo para análisis por periodo.")
+            from covid_stats_app.result_cache import STATS_CACHE
+            cache_info = STATS_CACHE.stats()
+            st.caption(f"Caché de estadísticas: {cache_info['hits'] + cache_info['disk_hits']} aciertos, {cache_info['misses']} fallos, {cache_info['size']}/{cache_info['maxsize']} entradas")
             fits = res.get('fits', [])
             if not fits:
                 st.info("No se detectaron ajustes o la muestra es pequeña.")
@@ -339,38 +458,93 @@ elif section == "Análisis estadístico":
 # ---------- EXPORTAR ----------
 elif section == "Exportar y ajustes":
     st.title("Exportar y ajustes")
-    st.write("Opciones para convertir o descargar los archivos finales.")
-    if st.button("Crear archivos Parquet (si hay CSV)"):
-        created = []
-        for name in dl.EXPECTED_FILES.values():
-            p = dl.get_base_dir() / name
-            if p.exists():
-                dfp = pd.read_csv(p)
-                out = p.with_suffix('.parquet')
-                dfp.to_parquet(out, engine='pyarrow', index=False)
-                created.append(str(out))
-        if created:
-            st.success("Parquet creados: " + ", ".join(created))
+    st.write("Opciones para descargar los archivos finales.")
+    # las copias Parquet tipadas se regeneran solas al cargar cada CSV modificado
+    copies = dl.typed_copies()
+    ready = [str(p) for p in copies.values() if p is not None]
+    if ready:
+        st.caption("Copias Parquet tipadas: " + ", ".join(ready))
+    else:
+        st.caption("Aún no hay copias Parquet tipadas (se crean al cargar los CSV).")
+    if st.button("Informe de memoria"):
+        report = dl.memory_report([k for k in dl.EXPECTED_FILES if k not in missing])
+        if not report.empty:
+            report['antes (MB)'] = (report['bytes_before'] / 2**20).round(2)
+            report['después (MB)'] = (report['bytes_after'] / 2**20).round(2)
+            report['compartido (mmap)'] = report['shared_file'].fillna("—")
+            st.dataframe(report[['dataset', 'rows', 'antes (MB)', 'después (MB)', 'ratio', 'compartido (mmap)']])
+            st.caption("Texto repetido como categórico y conteos en el entero más pequeño posible. "
+                       "Los datasets mapeados desde un IPC compartido ocupan páginas comunes a todos los procesos.")
+    if st.button("Informe de calidad"):
+        # generado una vez al validar cada CSV en la carga; aquí sólo se lee
+        reports = [dl.quality_report(k) for k in dl.EXPECTED_FILES if k not in missing]
+        table = pd.concat([validation.report_frame(r) for r in reports if r], ignore_index=True) if any(reports) else pd.DataFrame()
+        if table.empty:
+            st.info("No hay informes de calidad disponibles.")
         else:
-            st.info("No se encontraron CSV para convertir.")
-    if st.button("Descargar CSV finales (zip)"):
-        import shutil, tempfile
-        tmp = tempfile.mkdtemp()
-        copied = []
-        for name in dl.EXPECTED_FILES.values():
-            p = dl.get_base_dir() / name
-            if p.exists():
-                shutil.copy(str(p), tmp)
-                copied.append(name)
-        if not copied:
+            for r in reports:
+                if r and r["rows_in"] != r["rows_out"]:
+                    st.caption(f"{DATASET_LABELS[r['dataset']]}: {r['rows_in'] - r['rows_out']:,} filas descartadas de {r['rows_in']:,}.")
+            st.dataframe(table[table['rows'] > 0] if (table['rows'] > 0).any() else table)
+            st.caption("Se eliminan filas sin fecha válida y duplicados exactos; el resto de incidencias sólo se informa.")
+    available = [k for k in dl.EXPECTED_FILES if k not in missing]
+    st.subheader("Archivos completos")
+    # los artefactos se generan una vez por versión de los datos y se reutilizan entre sesiones
+    if st.button("Preparar CSV finales (zip)"):
+        zip_path = export.csv_zip(available)
+        if zip_path is None:
             st.info("No hay CSV para incluir en el ZIP.")
         else:
-            zip_base = "/tmp/covid_final_csvs"
-            shutil.make_archive(zip_base, 'zip', tmp)
-            zip_path = zip_base + ".zip"
             with open(zip_path, 'rb') as f:
-                st.download_button("Descargar ZIP", f, file_name="covid_final_csvs.zip")
+                st.download_button("Descargar ZIP", f, file_name="covid_final_csvs.zip", mime=export.MIME_TYPES["zip"])
+    if st.button("Preparar Parquet tipado"):
+        cols = st.columns(max(len(available), 1))
+        for col, key in zip(cols, available):
+            pq_path = export.parquet_file(key)
+            if pq_path is not None:
+                with open(pq_path, 'rb') as f:
+                    col.download_button(DATASET_LABELS[key], f, file_name=export.filename(key, "parquet"),
+                                        mime=export.MIME_TYPES["parquet"], key=f"pq_{key}")
+
+    st.subheader("Exportación filtrada")
+    if available:
+        ex_label = st.selectbox("Dataset", [DATASET_LABELS[k] for k in available], key="ex_ds")
+        ex_key = DATASET_MAP[ex_label]
+        ex_idx = get_index(ex_key)
+        if ex_idx is None:
+            st.info("El dataset no tiene columnas de país y fecha para filtrar.")
+        else:
+            ex_countries = st.multiselect("Países (vacío = todos)", ex_idx.keys(), key="ex_countries")
+            dates = ex_idx.data['date'].dropna()
+            ex_range = st.date_input("Rango de fechas", value=(dates.min().date(), dates.max().date()), key="ex_range") \
+                if not dates.empty else ()
+            ex_metrics = st.multiselect("Métricas (vacío = todas)",
+                                        [m for m in dl.METRIC_COLUMNS[ex_key] if m in ex_idx.data.columns], key="ex_metrics")
+            ex_fmt = st.radio("Formato", ["csv", "parquet"], horizontal=True, key="ex_fmt")
+            ex_start, ex_end = (ex_range if isinstance(ex_range, (tuple, list)) and len(ex_range) == 2 else (None, None))
+            if st.button("Generar recorte"):
+                data, n = export.filtered(ex_idx, ex_key, ex_countries, ex_start, ex_end, ex_metrics, fmt=ex_fmt)
+                st.caption(f"{n:,} filas · {len(data) / 2**20:.2f} MB")
+                st.download_button("Descargar recorte", data, file_name=export.filename(ex_key, ex_fmt, subset=True),
+                                   mime=export.MIME_TYPES[ex_fmt], key="ex_download")
 
 if section != "Resumen":
     st.markdown("---")
     st.write(GENERIC_FOOTER)
+
+# ---------- RENDIMIENTO (opcional) ----------
+if perf_panel:
+    col = instrument.stop()
+    if col is not None:
+        spans = sorted(col.records, key=lambda r: r["offset"] or 0)
+        with st.expander(f"Rendimiento — {col.elapsed() * 1000:,.0f} ms en este rerun ({section})", expanded=True):
+            st.dataframe(pd.DataFrame([{
+                "tramo": "· " * r["depth"] + r["name"],
+                "ms": round(r["seconds"] * 1000, 1),
+                "filas": r["rows"],
+                "Δ memoria (MB)": round(r["mem_delta_mb"], 2) if r["mem_delta_mb"] is not None else None,
+            } for r in spans]))
+            st.markdown("**Totales por tramo**")
+            st.dataframe(pd.DataFrame(col.summary()))
+            st.download_button("Exportar JSON", col.to_json(indent=2), file_name="rendimiento.json", mime="application/json")
+        logger.info("rendimiento %s", col.to_json())
@@ -1,15 +1,39 @@
 # data_loader.py
 from pathlib import Path
 import os
+import io
+import json
+import hashlib
+import functools
+import re
+import threading
+import time
+import contextvars
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+import numpy as np
 import pandas as pd
 import logging
+from covid_stats_app import storage
+from covid_stats_app import instrument
+from covid_stats_app import validation
 
 logger = logging.getLogger("data_loader")
-try:
-    import pycountry
-except Exception:
-    pycountry = None
-    logger.warning("pycountry no disponible. El mapeo de países a ISO3 no funcionará sin esta librería.")
+
+# pycountry se importa sólo cuando hace falta mapear países a ISO3
+_pycountry = None
+_pycountry_checked = False
+
+def _get_pycountry():
+    global _pycountry, _pycountry_checked
+    if not _pycountry_checked:
+        _pycountry_checked = True
+        try:
+            import pycountry
+            _pycountry = pycountry
+        except Exception:
+            logger.warning("pycountry no disponible. El mapeo de países a ISO3 no funcionará sin esta librería.")
+    return _pycountry
 
 DEFAULT_BASE = Path(__file__).resolve().parent.parent / "converted_covid_data" / "final"
 BASE = Path(os.getenv("COVID_DATA_DIR", DEFAULT_BASE))
@@ -34,10 +58,60 @@ MANUAL_COUNTRY_ALIASES = {
     "colombia": "Colombia",
 }
 
+# Columnas de conteo de cada dataset (se coercionan a Int64)
+METRIC_COLUMNS = {
+    "notifications": ['new_cases', 'cum_cases', 'new_deaths', 'cum_deaths'],
+    "hospitalizations": ['new_hospitalizations', 'cum_hospitalizations', 'icu'],
+    "deaths_by_age": ['deaths'],
+}
+
+# Versión de la coerción de cada dataset: cambiarla invalida las copias Parquet existentes
+TYPED_VERSIONS = {
+    "notifications": "3",
+    "hospitalizations": "4",
+    "deaths_by_age": "4",
+}
+
+# columnas de texto con a lo sumo esta fracción de valores distintos se guardan como categóricas
+CATEGORY_MAX_RATIO = 0.5
+
+# Ingesta incremental: si un CSV sólo recibió filas nuevas al final, se parsea y valida sólo la cola
+INCREMENTAL = os.getenv("COVID_INCREMENTAL", "1").lower() not in ("0", "false", "no")
+
+# Datasets tipados compartidos entre procesos como Arrow IPC mapeado en memoria
+SHARED_MMAP = os.getenv("COVID_SHARED_MMAP", "1").lower() not in ("0", "false", "no")
+
 def get_base_dir():
     return BASE
 
+def get_cache_dir():
+    """Directorio para artefactos derivados (tablas de búsqueda, agregados, etc.)."""
+    return Path(os.getenv("COVID_CACHE_DIR", BASE.parent / "cache"))
+
+def get_shared_dir():
+    """Directorio de los IPC compartidos (uno por dataset y versión del CSV)."""
+    return get_cache_dir() / "shared"
+
+@instrument.traced("load.read_csv")
 def _safe_read(path):
+    """
+    CSV a DataFrame con el lector de pyarrow (multihilo y sin el GIL, así varias cargas
+    avanzan en paralelo). La fecha ISO también se parsea en pyarrow, con la misma unidad
+    que pandas. Si pyarrow no está o no puede leer el archivo (tipos o fechas con otro
+    formato), se usa pandas y la coerción parsea la fecha como antes.
+    """
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pacsv
+    except ImportError:
+        pacsv = None
+    if pacsv is not None:
+        try:
+            opts = pacsv.ConvertOptions(strings_can_be_null=True, column_types={"date": pa.timestamp("us")},
+                                        timestamp_parsers=["%Y-%m-%d"])
+            return pacsv.read_csv(path, convert_options=opts).to_pandas()
+        except Exception as e:
+            logger.info("pyarrow no pudo leer %s (%s); se usa pandas.", path, e)
     return pd.read_csv(path, low_memory=False, encoding="utf-8")
 
 def _normalize_country_name(name):
@@ -50,28 +124,123 @@ def _normalize_country_name(name):
     return s
 
 def _name_to_iso3(name):
+    """Resolución lenta vía pycountry; sólo se usa para nombres ausentes del índice."""
     if name is None:
         return None
+    pycountry = _get_pycountry()
     if pycountry is None:
         return None
     try:
-        if len(name) == 3 and name.isalpha() and name.upper() == name:
-            c = pycountry.countries.get(alpha_3=name)
-            if c:
-                return c.alpha_3
-        c = pycountry.countries.lookup(str(name))
-        return c.alpha_3
+        return pycountry.countries.lookup(str(name)).alpha_3
     except Exception:
+        return None
+
+# Tabla persistente nombre normalizado -> ISO3 (None = no resuelto). Se comparte entre
+# procesos vía disco para que las cargas posteriores no necesiten tocar pycountry.
+ISO3_TABLE_FILE = "iso3_lookup.json"
+ISO3_STATS = Counter()
+UNRESOLVED_COUNTRIES = Counter()
+_iso3_table = None
+_pycountry_index = None
+_iso3_lock = threading.Lock()
+
+def _pycountry_version():
+    """Versión instalada de pycountry (de los metadatos, sin importarlo) o None."""
+    from importlib import metadata
+    try:
+        return metadata.version("pycountry")
+    except metadata.PackageNotFoundError:
+        return None
+
+def _iso3_table_digest():
+    # la tabla guarda también los nombres no resueltos: si cambian los alias manuales o se
+    # instala/actualiza pycountry deja de ser válida y esos nombres se vuelven a intentar
+    raw = json.dumps({"aliases": MANUAL_COUNTRY_ALIASES, "pycountry": _pycountry_version()},
+                     sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _iso3_table_path():
+    return get_cache_dir() / ISO3_TABLE_FILE
+
+def _load_iso3_table():
+    global _iso3_table
+    if _iso3_table is None:
+        _iso3_table = {}
         try:
-            for c in pycountry.countries:
-                if str(c.name).lower() == str(name).lower():
-                    return c.alpha_3
+            data = json.loads(_iso3_table_path().read_text(encoding="utf-8"))
+            if data.get("digest") == _iso3_table_digest():
+                _iso3_table = dict(data.get("table", {}))
         except Exception:
             pass
-    return None
+    return _iso3_table
 
+def _save_iso3_table():
+    path = _iso3_table_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        table = _iso3_table
+        if _get_pycountry() is None:
+            # sin pycountry (p.ej. instalación rota) los fallos no son definitivos
+            table = {k: v for k, v in table.items() if v is not None}
+        payload = {"digest": _iso3_table_digest(), "table": table}
+        tmp.write_text(json.dumps(payload, ensure_ascii=False, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, path)
+    except Exception as e:
+        logger.warning("No se pudo guardar la tabla ISO3 en %s: %s", path, e)
+
+def _build_pycountry_index():
+    """Diccionario nombre/código en minúsculas -> ISO3, con los alias manuales fusionados."""
+    global _pycountry_index
+    if _pycountry_index is None:
+        index = {}
+        pycountry = _get_pycountry()
+        if pycountry is not None:
+            for c in pycountry.countries:
+                for attr in ("alpha_3", "alpha_2", "name", "official_name", "common_name"):
+                    v = getattr(c, attr, None)
+                    if v:
+                        index.setdefault(str(v).strip().lower(), c.alpha_3)
+        for alias, target in MANUAL_COUNTRY_ALIASES.items():
+            code = index.get(target.lower())
+            if code:
+                index[alias] = code
+        _pycountry_index = index
+    return _pycountry_index
+
+def _resolve_iso3(name):
+    key = str(name).strip().lower()
+    table = _load_iso3_table()
+    if key in table:
+        ISO3_STATS["table_hits"] += 1
+        return table[key], False
+    code = _build_pycountry_index().get(key)
+    if code is None:
+        code = _name_to_iso3(_normalize_country_name(name))
+    ISO3_STATS["resolved" if code else "unresolved"] += 1
+    table[key] = code
+    return code, True
+
+@instrument.traced("load.iso3")
 def _map_country_to_iso3(series_country):
-    return series_country.apply(lambda n: _name_to_iso3(_normalize_country_name(n)))
+    """Resuelve sólo los nombres únicos y los vuelve a mapear sobre la serie de forma vectorizada."""
+    uniques = pd.unique(series_country.dropna())
+    mapping = {}
+    changed = False
+    with _iso3_lock:
+        for name in uniques:
+            code, new = _resolve_iso3(name)
+            changed = changed or new
+            mapping[name] = code
+            if code is None:
+                UNRESOLVED_COUNTRIES[str(name)] += 1
+        if changed:
+            _save_iso3_table()
+    return series_country.map(mapping)
+
+def iso3_resolver_stats():
+    """Contadores del resolvedor ISO3 y nombres que no se pudieron resolver."""
+    return {"stats": dict(ISO3_STATS), "unresolved": dict(UNRESOLVED_COUNTRIES)}
 
 def _try_find(filename):
     p = BASE / filename
@@ -82,12 +251,12 @@ def _try_find(filename):
         return alt
     return None
 
-def load_notifications():
-    filename = EXPECTED_FILES["notifications"]
-    p = _try_find(filename)
-    if not p:
-        raise FileNotFoundError(f"{BASE/filename} no encontrado. Coloca el CSV en {BASE}")
-    df = _safe_read(p)
+def source_path(key):
+    """Ruta del CSV del dataset `key` o None si no se encuentra."""
+    return _try_find(EXPECTED_FILES[key])
+
+@instrument.traced("load.coerce")
+def _coerce_notifications(df):
     if 'date' in df.columns:
         df['date'] = pd.to_datetime(df['date'], errors='coerce')
     else:
@@ -104,49 +273,507 @@ def load_notifications():
         df['country_code'] = df['country_code'].astype(str).str.upper().replace({'NONE':'', 'NAN':''})
         df.loc[df['country_code'].str.strip() == '', 'country_code'] = pd.NA
 
-    for c in ['new_cases', 'cum_cases', 'new_deaths', 'cum_deaths']:
+    for c in METRIC_COLUMNS["notifications"]:
         if c in df.columns:
             df[c] = pd.to_numeric(df[c], errors='coerce').astype('Int64')
         else:
             df[c] = pd.Series([pd.NA]*len(df), dtype='Int64')
     return df
 
-def load_hospitalizations():
-    filename = EXPECTED_FILES["hospitalizations"]
-    p = _try_find(filename)
-    if not p:
-        raise FileNotFoundError(f"{BASE/filename} no encontrado. Coloca el CSV en {BASE}")
-    df = _safe_read(p)
+@instrument.traced("load.coerce")
+def _coerce_hospitalizations(df):
     if 'date' in df.columns:
         df['date'] = pd.to_datetime(df['date'], errors='coerce')
     else:
         df['date'] = pd.NaT
-    for c in ['new_hospitalizations', 'cum_hospitalizations', 'icu']:
+    # algunos CSV de hospitalizaciones sólo traen el nombre del país: el código ISO3 se
+    # deriva igual que en notificaciones (los agregados y mapas agrupan por country_code)
+    if ('country_code' not in df.columns or df['country_code'].isna().all()) and 'country' in df.columns:
+        df['country_code'] = _map_country_to_iso3(df['country'])
+    for c in METRIC_COLUMNS["hospitalizations"]:
         if c in df.columns:
             df[c] = pd.to_numeric(df[c], errors='coerce').astype('Int64')
         else:
             df[c] = pd.Series([pd.NA]*len(df), dtype='Int64')
     return df
 
-def load_deaths_by_age():
-    filename = EXPECTED_FILES["deaths_by_age"]
-    p = _try_find(filename)
-    if not p:
-        raise FileNotFoundError(f"{BASE/filename} no encontrado. Coloca el CSV en {BASE}")
-    df = _safe_read(p)
+# ---------- Grupos etarios ----------
+# "0 a 4", "15 a 64", "0-4", "5 – 14", "15 to 64", "65+", "80 y más", "7"
+_AGE_RE = (r'^\s*(?P<lower>\d+)\s*(?:(?:-|–|a|to|al)\s*(?P<upper>\d+)'
+           r'|(?P<open>\+|y\s+más|o\s+más|and\s+over|or\s+more))?\s*(?:años|years)?\s*$')
+AGE_MAX = 100  # límite para repartir los grupos abiertos ("65+") al re-agrupar
+
+# esquemas estándar: lista de (etiqueta, inferior, superior); superior None = abierto
+AGE_SCHEMES = {
+    "10y": [(f"{lo}-{lo + 9}", lo, lo + 9) for lo in range(0, 80, 10)] + [("80+", 80, None)],
+    "broad": [("0-4", 0, 4), ("5-14", 5, 14), ("15-64", 15, 64), ("65+", 65, None)],
+}
+
+def parse_age_bounds(labels):
+    """
+    Límites (inferior, superior) de cada etiqueta distinta, con una sola regex vectorizada.
+    Superior es inf en grupos abiertos; las etiquetas no reconocidas quedan con NaN.
+    """
+    uniq = pd.Series(pd.unique(pd.Series(labels).dropna().astype(str)), dtype=object)
+    m = uniq.str.extract(_AGE_RE, flags=re.IGNORECASE)
+    lower = pd.to_numeric(m['lower'], errors='coerce')
+    upper = pd.to_numeric(m['upper'], errors='coerce')
+    upper = upper.where(m['open'].isna(), np.inf).fillna(lower)
+    return pd.DataFrame({'label': uniq, 'lower': lower.astype('float64'), 'upper': upper.astype('float64')})
+
+def age_dtype(labels):
+    """Categórico ordenado por edad (inferior, superior); las etiquetas no reconocidas van al final."""
+    b = parse_age_bounds(labels)
+    b = b.sort_values(['lower', 'upper', 'label'], na_position='last', kind='mergesort')
+    return pd.CategoricalDtype(b['label'].tolist(), ordered=True)
+
+def order_age_groups(series):
+    """`series` como categórico ordenado por edad (se parsean sólo las etiquetas distintas)."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and series.dtype.ordered:
+        return series
+    labels = series.astype(object).where(series.notna(), None)
+    return labels.astype(age_dtype(labels))
+
+@functools.lru_cache(maxsize=32)
+def _rebucket_map(labels, scheme):
+    """Pesos (origen, destino, peso) por solapamiento en años, suponiendo reparto uniforme."""
+    src = parse_age_bounds(list(labels))
+    rows = []
+    for label, lo, hi in src.itertuples(index=False):
+        if np.isnan(lo):
+            continue
+        hi = AGE_MAX if np.isinf(hi) else hi
+        span = hi - lo + 1
+        for target, tlo, thi in AGE_SCHEMES[scheme]:
+            thi = AGE_MAX if thi is None else thi
+            overlap = min(hi, thi) - max(lo, tlo) + 1
+            if overlap > 0:
+                rows.append((label, target, overlap / span))
+    return pd.DataFrame(rows, columns=['source', 'target', 'weight'])
+
+def rebucket(df, scheme="10y", value_cols=('deaths',), age_col='age_group'):
+    """
+    Re-agrupa `df` al esquema `scheme` de AGE_SCHEMES. Un grupo contenido en un grupo
+    destino pasa entero; uno que abarca varios se reparte según los años que solapa
+    (los valores quedan en float en ese caso). Las demás columnas no numéricas se
+    conservan como claves. El mapeo se calcula una vez por conjunto de etiquetas.
+    """
+    value_cols = [c for c in value_cols if c in df.columns]
+    keys = [c for c in df.columns if c not in value_cols and c != age_col]
+    labels = tuple(sorted(pd.unique(df[age_col].dropna().astype(str))))
+    mapping = _rebucket_map(labels, scheme)
+    src = df.assign(**{age_col: df[age_col].astype(object)})
+    m = src.merge(mapping, left_on=age_col, right_on='source', how='inner')
+    if (mapping['weight'] < 1).any():
+        for c in value_cols:
+            m[c] = pd.to_numeric(m[c], errors='coerce').astype('float64') * m['weight']
+    m[age_col] = m['target'].astype(pd.CategoricalDtype([t[0] for t in AGE_SCHEMES[scheme]], ordered=True))
+    return m.groupby(keys + [age_col], observed=True, sort=True, dropna=False)[value_cols].sum().reset_index()
+
+@instrument.traced("load.coerce")
+def _coerce_deaths_by_age(df):
     if 'date' in df.columns:
         df['date'] = pd.to_datetime(df['date'], errors='coerce')
     else:
         df['date'] = pd.NaT
     if 'deaths' in df.columns:
         df['deaths'] = pd.to_numeric(df['deaths'], errors='coerce').astype('Int64')
+    if 'age_group' in df.columns:
+        df['age_group'] = order_age_groups(df['age_group'])
+    return df
+
+_COERCERS = {
+    "notifications": _coerce_notifications,
+    "hospitalizations": _coerce_hospitalizations,
+    "deaths_by_age": _coerce_deaths_by_age,
+}
+
+@instrument.traced("load.compact")
+def compact(df):
+    """
+    Representación compacta en memoria: texto repetido (país, código, grupo etario, hoja)
+    como categórico y conteos en el entero nullable más pequeño que los contiene. Las
+    categóricas existentes (p.ej. ordenadas) se dejan como están. Modifica `df` y lo devuelve.
+    """
+    for c in df.columns:
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_integer_dtype(s.dtype):
+            df[c] = pd.to_numeric(s, downcast='integer')
+        elif pd.api.types.is_string_dtype(s.dtype) and len(s):
+            if s.nunique(dropna=True) <= max(1, len(s) * CATEGORY_MAX_RATIO):
+                df[c] = s.astype('category')
     return df
 
+def _expanded_bytes(df):
+    # tamaño con la representación anterior: texto sin categorizar y conteos Int64
+    total = 0
+    for c in df.columns:
+        s = df[c]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype(s.cat.categories.dtype)
+        elif pd.api.types.is_integer_dtype(s.dtype):
+            s = s.astype('Int64')
+        total += int(s.memory_usage(deep=True, index=False))
+    return total
+
+def memory_report(keys=None):
+    """
+    Bytes en memoria de cada dataset antes (texto + Int64) y después de compactar, y el IPC
+    compartido desde el que se mapea (None si se carga como copia privada).
+    """
+    rows = []
+    for key in keys or EXPECTED_FILES:
+        p = source_path(key)
+        if p is None:
+            continue
+        df = LOADERS[key]()
+        after = int(df.memory_usage(deep=True, index=False).sum())
+        before = _expanded_bytes(df)
+        shared = storage.shared_path(get_shared_dir(), key, p, TYPED_VERSIONS[key]) if SHARED_MMAP and storage.enabled() else None
+        rows.append({"dataset": key, "rows": len(df), "bytes_before": before, "bytes_after": after,
+                     "ratio": after / before if before else None,
+                     "shared_file": shared.name if shared is not None and shared.exists() else None})
+    return pd.DataFrame(rows, columns=["dataset", "rows", "bytes_before", "bytes_after", "ratio", "shared_file"])
+
+def _quality_path(key):
+    return get_cache_dir() / "quality" / f"{key}.json"
+
+@instrument.traced("load.validate")
+def _validate(key, path, df):
+    """Valida el dataset recién coercionado y guarda su informe de calidad."""
+    df, report = validation.validate(df, key, METRIC_COLUMNS[key])
+    report["fingerprint"] = f"{key}:{TYPED_VERSIONS[key]}:{storage.source_sha1(path)}"
+    validation.write_report(_quality_path(key), report)
+    return df
+
+def quality_report(key):
+    """
+    Informe de calidad del dataset `key` (dict, ver validation.validate) o None si no hay
+    CSV. Se genera al validar en la carga; si falta o es de otra versión de los datos, se
+    vuelve a validar desde el CSV.
+    """
+    p = _try_find(EXPECTED_FILES[key])
+    if not p:
+        return None
+    report = validation.read_report(_quality_path(key))
+    if report is not None and report.get("fingerprint") == dataset_fingerprint(key):
+        return report
+    _validate(key, p, _COERCERS[key](_safe_read(p)))
+    return validation.read_report(_quality_path(key))
+
+def _load_typed(key, columns=None):
+    """
+    Devuelve el dataset `key` ya tipado. Con SHARED_MMAP lo abre por memory-map desde el
+    IPC compartido de la versión actual del CSV. Si no, usa la copia Parquet junto al CSV
+    si está al día, o parsea el CSV, aplica la coerción y regenera la copia (y el IPC).
+    `columns` limita las columnas leídas (proyección); las que no existan se ignoran.
+    """
+    filename = EXPECTED_FILES[key]
+    p = _try_find(filename)
+    if not p:
+        raise FileNotFoundError(f"{BASE/filename} no encontrado. Coloca el CSV en {BASE}")
+    version = TYPED_VERSIONS[key]
+    with instrument.span(f"load.{key}") as rec:
+        shared = storage.shared_path(get_shared_dir(), key, p, version) if SHARED_MMAP and storage.enabled() else None
+        if shared is not None:
+            with instrument.span("load.read_shared"):
+                df = storage.read_shared(shared, columns=columns)
+            if df is not None:
+                rec["rows"] = len(df)
+                return validation.mark(df)
+        with instrument.span("load.read_typed"):
+            df = storage.read_typed(p, version, columns=None if shared is not None else columns)
+        if df is None:
+            df = _load_appended(key, p, version) if INCREMENTAL else None
+            if df is None:
+                df = compact(_validate(key, p, _COERCERS[key](_safe_read(p))))
+            with instrument.span("load.write_typed", rows=len(df)):
+                storage.write_typed(df, p, version)
+        if shared is not None:
+            with instrument.span("load.write_shared", rows=len(df)):
+                if storage.write_shared(df, shared) is not None:
+                    storage.prune_shared(get_shared_dir(), key, keep=shared)
+                    mapped = storage.read_shared(shared, columns=columns)
+                    df = mapped if mapped is not None else df
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        rec["rows"] = len(df)
+        # todo lo que sale de aquí pasó la validación (la versión tipada lo garantiza)
+        return validation.mark(df)
+
+def _load_appended(key, path, version):
+    """
+    Fusiona en la copia tipada sólo las filas añadidas al final del CSV. Se parsean,
+    coercionan y validan sólo esas filas y se llevan a los tipos de la copia; el informe de
+    calidad suma el de la copia. Devuelve None (=> recarga completa) si no hay copia previa
+    o informe, o si cambiaron filas anteriores.
+    Sigue siendo O(tamaño del dataset): el sha1 del prefijo del CSV, leer la copia Parquet y
+    reescribirla entera (Parquet no admite añadir filas a un archivo existente).
+    """
+    cached, meta = storage.read_typed_any(path)
+    if cached is None:
+        return None
+    previous = validation.read_report(_quality_path(key))
+    if previous is None or previous.get("fingerprint") != f"{key}:{version}:{meta.get('sha1')}":
+        return None
+    appended = storage.read_appended(path, meta, version)
+    if appended is None:
+        return None
+    header, tail = appended
+    try:
+        new = _COERCERS[key](pd.read_csv(io.BytesIO(header + tail), low_memory=False, encoding="utf-8"))
+    except Exception as e:
+        logger.warning("No se pudo parsear la cola de %s (%s); recarga completa.", path, e)
+        return None
+    logger.info("Ingesta incremental de %s: %d filas nuevas", path.name, len(new))
+    new = new[[c for c in cached.columns if c in new.columns]]
+    with instrument.span("load.validate_tail", rows=len(new)):
+        new, report = validation.validate_appended(cached, new, key, METRIC_COLUMNS[key], previous)
+    report["fingerprint"] = f"{key}:{version}:{storage.source_sha1(path)}"
+    validation.write_report(_quality_path(key), report)
+    cached, new = _align_dtypes(cached, new)
+    return pd.concat([cached, new], ignore_index=True)
+
+def _align_dtypes(cached, new):
+    """
+    Lleva las filas nuevas a los tipos compactos de `cached` para concatenarlas sin volver a
+    compactar todo: categorías ampliadas con las etiquetas nuevas (re-ordenadas por edad en
+    las ordenadas) y enteros en el tipo de la copia si caben.
+    """
+    for c in new.columns:
+        dtype, s = cached[c].dtype, new[c]
+        if isinstance(dtype, pd.CategoricalDtype):
+            extra = pd.Index(s.dropna().unique()).difference(dtype.categories)
+            if len(extra):
+                labels = list(dtype.categories) + list(extra)
+                dtype = age_dtype(labels) if dtype.ordered else pd.CategoricalDtype(labels)
+                cached[c] = cached[c].cat.set_categories(dtype.categories)
+            new[c] = s.astype(object).where(s.notna(), None).astype(dtype)
+        elif pd.api.types.is_integer_dtype(dtype) and pd.api.types.is_integer_dtype(s.dtype):
+            info = np.iinfo(dtype.numpy_dtype if hasattr(dtype, "numpy_dtype") else dtype)
+            if s.dropna().empty or (s.min() >= info.min and s.max() <= info.max):
+                new[c] = s.astype(dtype)
+    return cached, new
+
+def count_rows(key):
+    """Número de filas del dataset sin cargarlo si su copia tipada está al día."""
+    p = _try_find(EXPECTED_FILES[key])
+    if not p:
+        return 0
+    n = storage.typed_num_rows(p, TYPED_VERSIONS[key])
+    if n is None:
+        n = len(_load_typed(key))
+    return n
+
+def dataset_fingerprint(key):
+    """Huella del contenido del dataset (sha1 del CSV + versión de la coerción) o None."""
+    p = _try_find(EXPECTED_FILES[key])
+    if not p:
+        return None
+    return f"{key}:{TYPED_VERSIONS[key]}:{storage.source_sha1(p)}"
+
+def missing_files():
+    """Claves de los datasets cuyo CSV no se encuentra."""
+    return [key for key, fname in EXPECTED_FILES.items() if _try_find(fname) is None]
+
+def load_notifications(columns=None):
+    return _load_typed("notifications", columns=columns)
+
+def load_hospitalizations(columns=None):
+    return _load_typed("hospitalizations", columns=columns)
+
+def load_deaths_by_age(columns=None):
+    return _load_typed("deaths_by_age", columns=columns)
+
+LOADERS = {
+    "notifications": load_notifications,
+    "hospitalizations": load_hospitalizations,
+    "deaths_by_age": load_deaths_by_age,
+}
+
+# ---------- Carga concurrente ----------
+LOAD_WORKERS = int(os.getenv("COVID_LOAD_WORKERS", "3"))
+# Conversión en frío (CSV -> copia tipada) en procesos aparte: coerción y compactado son
+# pandas con el GIL, así que en hilos no se solapan. Sólo útil con la caché Parquet activa.
+LOAD_PROCESSES = os.getenv("COVID_LOAD_PROCESSES", "0").lower() in ("1", "true", "yes")
+LOAD_TIMES = {}  # segundos de la última carga de cada dataset
+
+_load_pool = None
+_proc_pool = None
+_load_pool_lock = threading.Lock()
+
+def _get_load_pool(max_workers=None):
+    global _load_pool
+    with _load_pool_lock:
+        if _load_pool is None:
+            _load_pool = ThreadPoolExecutor(max_workers=max_workers or LOAD_WORKERS, thread_name_prefix="covid-load")
+        return _load_pool
+
+def _get_proc_pool(max_workers=None):
+    global _proc_pool
+    with _load_pool_lock:
+        if _proc_pool is None:
+            _proc_pool = ProcessPoolExecutor(max_workers=max_workers or LOAD_WORKERS)
+        return _proc_pool
+
+def _warm_typed(key):
+    """En un proceso hijo: regenera la copia tipada de `key`; devuelve sus filas."""
+    return len(LOADERS[key]())
+
+def _timed_load(key, processes=False):
+    t0 = time.perf_counter()
+    try:
+        path = source_path(key)
+        if processes and path is not None and storage.enabled() \
+                and storage.typed_num_rows(path, TYPED_VERSIONS[key]) is None:
+            # el hijo escribe la copia Parquet; aquí sólo se lee (Arrow, sin el GIL)
+            _get_proc_pool().submit(_warm_typed, key).result()
+        return LOADERS[key]()
+    finally:
+        LOAD_TIMES[key] = time.perf_counter() - t0
+
+def start_loads(keys=None, max_workers=None, processes=None):
+    """
+    Lanza en paralelo la carga de cada dataset disponible y devuelve {clave: Future}.
+    Los hilos comparten un pool del proceso; el parseo con pyarrow libera el GIL.
+    Con `processes` (por defecto COVID_LOAD_PROCESSES) los datasets sin copia tipada al
+    día se convierten en procesos aparte. Los datasets sin CSV no aparecen en el resultado.
+    """
+    pool = _get_load_pool(max_workers)
+    processes = LOAD_PROCESSES if processes is None else processes
+    futures = {}
+    for key in keys or EXPECTED_FILES:
+        if source_path(key) is None:
+            continue
+        # cada carga hereda el contexto (p.ej. el recolector de instrumentación del rerun)
+        futures[key] = pool.submit(contextvars.copy_context().run, _timed_load, key, processes)
+    return futures
+
+def load_all(keys=None, timeout=None, max_workers=None, processes=None):
+    """
+    Carga los datasets en paralelo y espera como mucho `timeout` segundos en total.
+    Devuelve {clave: {"status", "data", "error", "seconds"}} con status "ok", "error",
+    "timeout" (sigue cargando en segundo plano) o "missing" (no hay CSV). Un fallo en
+    un dataset no afecta a los demás.
+    """
+    keys = list(keys or EXPECTED_FILES)
+    futures = start_loads(keys, max_workers, processes)
+    wait(list(futures.values()), timeout=timeout)
+    out = {}
+    for key in keys:
+        fut = futures.get(key)
+        if fut is None:
+            out[key] = {"status": "missing", "data": None, "error": f"{EXPECTED_FILES[key]} no encontrado", "seconds": None}
+        elif not fut.done():
+            out[key] = {"status": "timeout", "data": None, "error": None, "seconds": None}
+        elif fut.exception() is not None:
+            out[key] = {"status": "error", "data": None, "error": str(fut.exception()), "seconds": LOAD_TIMES.get(key)}
+        else:
+            out[key] = {"status": "ok", "data": fut.result(), "error": None, "seconds": LOAD_TIMES.get(key)}
+    return out
+
+# Tamaño por defecto de los bloques del modo streaming
+CHUNK_ROWS = int(os.getenv("COVID_CHUNK_ROWS", "100000"))
+
+def iter_chunks(key, chunksize=None, columns=None, dedupe=True):
+    """
+    Recorre el dataset `key` en bloques ya tipados (fechas parseadas, conteos Int64) sin
+    materializarlo completo. Lee la copia Parquet por lotes si está al día (ya validada);
+    si no, el CSV por bloques aplicando la coerción y la limpieza de la validación a cada
+    uno. Con `dedupe` las filas duplicadas se descartan aunque caigan en bloques distintos,
+    como en la carga completa, a costa de 8 bytes por fila (validation.SeenRows); sin él,
+    sólo dentro de cada bloque.
+    """
+    chunksize = chunksize or CHUNK_ROWS
+    p = _try_find(EXPECTED_FILES[key])
+    if not p:
+        raise FileNotFoundError(f"{BASE/EXPECTED_FILES[key]} no encontrado. Coloca el CSV en {BASE}")
+    batches = storage.iter_typed(p, TYPED_VERSIONS[key], chunksize, columns=columns)
+    if batches is not None:
+        for batch in batches:
+            yield validation.mark(batch)
+        return
+    coerce = _COERCERS[key]
+    seen = validation.SeenRows() if dedupe else None
+    for chunk in pd.read_csv(p, chunksize=chunksize, encoding="utf-8", low_memory=False):
+        chunk = validation.clean(coerce(chunk), key, seen=seen)
+        if columns is not None:
+            chunk = chunk[[c for c in columns if c in chunk.columns]]
+        yield chunk
+
+def typed_copies():
+    """Estado de las copias Parquet: {dataset: ruta o None si no existe}."""
+    out = {}
+    for key, fname in EXPECTED_FILES.items():
+        p = _try_find(fname)
+        q = storage.typed_path(p) if p else None
+        out[key] = q if q is not None and q.exists() else None
+    return out
+
+def _merge_sorted(dates, codes, values):
+    """Ordena las claves (fecha, nº de país) y suma los valores de las repetidas."""
+    order = np.lexsort((codes, dates))
+    dates, codes, values = dates[order], codes[order], values[order]
+    del order
+    starts = np.ones(len(dates), dtype=bool)
+    starts[1:] = (dates[1:] != dates[:-1]) | (codes[1:] != codes[:-1])
+    starts = np.flatnonzero(starts)
+    return dates[starts], codes[starts], np.add.reduceat(values, starts)
+
+def _aggregate_chunks(chunks, date_col, value_col, code_col):
+    # agregado corriente sobre arrays numpy: fecha (int64), nº de país (int32) y suma; la
+    # memoria queda acotada por el número de pares (fecha, país) sin objetos por fila
+    labels = {}
+    acc = None
+    date_dtype = value_dtype = None
+    for chunk in chunks:
+        part = aggregate_for_choropleth(chunk, date_col=date_col, value_col=value_col, code_col=code_col)
+        if part.empty:
+            continue
+        for code in pd.unique(part[code_col]):
+            labels.setdefault(code, len(labels))
+        if date_dtype is None:
+            date_dtype = part[date_col].dtype
+            value_dtype = 'float64' if pd.api.types.is_float_dtype(part[value_col]) else 'int64'
+        dates = part[date_col].to_numpy(dtype=date_dtype).view('i8')
+        codes = part[code_col].map(labels).to_numpy(dtype='int32')
+        values = part[value_col].to_numpy(dtype=value_dtype)
+        del part
+        if acc is not None:
+            dates, codes, values = (np.concatenate([a, b]) for a, b in zip(acc, (dates, codes, values)))
+            acc = None
+        acc = _merge_sorted(dates, codes, values)
+        del dates, codes, values
+    if acc is None:
+        return pd.DataFrame()
+    dates, codes, values = acc
+    # mismo orden que groupby: fecha y después código de país alfabético
+    names = np.array(list(labels), dtype=object)
+    rank = np.empty(len(names), dtype='int32')
+    rank[np.argsort(names)] = np.arange(len(names), dtype='int32')
+    order = np.lexsort((rank[codes], dates))
+    return pd.DataFrame({
+        date_col: dates[order].view(date_dtype),
+        code_col: pd.array(names[codes[order]], dtype=str),
+        value_col: pd.array(values[order], dtype='Int64' if value_dtype == 'int64' else 'float64'),
+    })
+
+@instrument.traced("aggregate_for_choropleth")
 def aggregate_for_choropleth(df, date_col='date', value_col='new_cases', code_col='country_code'):
+    """Suma `value_col` por (fecha, país). `df` puede ser un DataFrame o un iterable de bloques (ver iter_chunks)."""
+    if df is not None and not isinstance(df, pd.DataFrame):
+        return _aggregate_chunks(df, date_col, value_col, code_col)
     if df is None or df.empty:
         return pd.DataFrame()
     if date_col not in df.columns or code_col not in df.columns or value_col not in df.columns:
         return pd.DataFrame()
+    if validation.is_validated(df) and date_col == 'date' and code_col == 'country_code':
+        # fechas válidas y códigos normalizados: sin copia ni coerción; groupby descarta códigos nulos
+        agg = df.groupby([date_col, code_col], as_index=False, observed=True)[value_col].sum()
+        agg[code_col] = agg[code_col].astype(str)
+        return validation.mark(agg)
     tmp = df.copy()
     tmp[date_col] = pd.to_datetime(tmp[date_col], errors='coerce')
     tmp[value_col] = pd.to_numeric(tmp[value_col], errors='coerce').fillna(0)
@@ -154,5 +781,5 @@ def aggregate_for_choropleth(df, date_col='date', value_col='new_cases', code_co
     tmp = tmp.dropna(subset=[date_col, code_col])
     if tmp.empty:
         return pd.DataFrame()
-    agg = tmp.groupby([date_col, code_col], as_index=False)[value_col].sum()
+    agg = tmp.groupby([date_col, code_col], as_index=False, observed=True)[value_col].sum()
     return agg
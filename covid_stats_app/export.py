@@ -0,0 +1,143 @@
+# export.py
+"""
+Exportación de los datos finales: ZIP con los CSV originales, Parquet tipado por dataset y
+recortes filtrados por país, rango de fechas y métricas.
+
+Los archivos completos se generan una vez por huella de datos en <cache>/exports y se
+reutilizan mientras los CSV no cambien. Cada proceso escribe en un temporal propio y lo
+renombra (os.replace), así exportaciones simultáneas no se pisan. Los recortes filtrados
+salen del QueryIndex (sin recorrer el dataset) y se guardan en memoria en EXPORT_CACHE.
+"""
+import hashlib
+import io
+import logging
+import os
+import shutil
+import threading
+import zipfile
+from pathlib import Path
+
+from covid_stats_app import data_loader as dl
+from covid_stats_app import instrument
+from covid_stats_app.result_cache import EXPORT_CACHE
+
+logger = logging.getLogger("export")
+
+# bloque de copia de los CSV al ZIP
+COPY_BLOCK = 1 << 20
+# filas por bloque al serializar un recorte a CSV
+CSV_CHUNK_ROWS = int(os.getenv("COVID_EXPORT_CHUNK_ROWS", "100000"))
+
+MIME_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet", "zip": "application/zip"}
+
+def export_dir():
+    return dl.get_cache_dir() / "exports"
+
+def _available(keys=None):
+    return [k for k in (keys or dl.EXPECTED_FILES) if dl.source_path(k) is not None]
+
+def _digest(*parts):
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:16]
+
+def _write_atomic(path, write):
+    """Ejecuta `write(f)` sobre un temporal del proceso/hilo y lo renombra a `path`."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return path
+
+def _prune(prefix, keep):
+    """Borra los artefactos `prefix-*` de versiones anteriores de los datos."""
+    for old in export_dir().glob(f"{prefix}-*"):
+        if old.name != keep.name and not old.name.startswith("."):
+            try:
+                old.unlink()
+            except OSError as e:
+                logger.info("No se pudo borrar %s: %s", old, e)
+
+@instrument.traced("export.csv_zip", rows=None)
+def csv_zip(keys=None):
+    """
+    ZIP con los CSV finales disponibles, copiados por bloques directamente al archivo (sin
+    copias intermedias). Devuelve la ruta del artefacto o None si no hay CSV.
+    """
+    keys = _available(keys)
+    if not keys:
+        return None
+    path = export_dir() / f"csv-{_digest(*(dl.dataset_fingerprint(k) for k in keys))}.zip"
+    if path.exists():
+        return path
+
+    def write(f):
+        with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for key in keys:
+                src_path = dl.source_path(key)
+                big = src_path.stat().st_size > zipfile.ZIP64_LIMIT
+                with open(src_path, "rb") as src, zf.open(dl.EXPECTED_FILES[key], "w", force_zip64=big) as dst:
+                    shutil.copyfileobj(src, dst, COPY_BLOCK)
+
+    _write_atomic(path, write)
+    _prune("csv", path)
+    return path
+
+@instrument.traced("export.parquet_file", rows=None)
+def parquet_file(key):
+    """
+    Parquet del dataset `key` escrito desde el DataFrame ya tipado (fechas, categóricas y
+    enteros compactos se conservan). Devuelve la ruta o None si no hay CSV.
+    """
+    fingerprint = dl.dataset_fingerprint(key)
+    if fingerprint is None:
+        return None
+    path = export_dir() / f"{key}-{_digest(fingerprint)}.parquet"
+    if path.exists():
+        return path
+    df = dl.LOADERS[key]()
+    _write_atomic(path, lambda f: df.to_parquet(f, index=False, engine="pyarrow"))
+    _prune(key, path)
+    return path
+
+def _serialize(df, fmt):
+    buf = io.BytesIO()
+    if fmt == "parquet":
+        df.to_parquet(buf, index=False, engine="pyarrow")
+    else:
+        df.to_csv(buf, index=False, encoding="utf-8", chunksize=CSV_CHUNK_ROWS)
+    return buf.getvalue()
+
+def filtered(index, key, countries=None, start=None, end=None, metrics=None, fmt="csv"):
+    """
+    Recorte de `key` a partir de su QueryIndex: claves `countries` (None = todas), fechas
+    entre `start` y `end` (inclusive) y sólo las métricas `metrics` (None = todas), además
+    de las columnas de identificación. Devuelve (bytes, filas).
+    """
+    if fmt not in ("csv", "parquet"):
+        raise ValueError(f"Formato de exportación no soportado: {fmt!r}")
+    countries = sorted(countries) if countries else None
+    metric_cols = dl.METRIC_COLUMNS.get(key, [])
+    columns = None
+    if metrics:
+        columns = [c for c in index.data.columns if c not in metric_cols or c in metrics]
+    cache_key = (dl.dataset_fingerprint(key), index.key_col,
+                 tuple(countries) if countries else None,
+                 str(start) if start is not None else None, str(end) if end is not None else None,
+                 tuple(columns) if columns else None, fmt)
+
+    def build():
+        with instrument.span("export.filtered") as rec:
+            df = index.slice(countries, start, end, columns=columns)
+            rec["rows"] = len(df)
+            return _serialize(df, fmt), len(df)
+
+    return EXPORT_CACHE.get_or_compute(cache_key, build)
+
+def filename(key, fmt, subset=False):
+    stem = dl.EXPECTED_FILES[key].rsplit(".", 1)[0]
+    return f"{stem}{'_filtrado' if subset else ''}.{fmt}"
@@ -0,0 +1,180 @@
+# fitting.py
+"""
+Ajuste rápido de distribuciones.
+
+- gamma: MLE por Newton sobre la forma, partiendo de la aproximación cerrada de Minka.
+- lognormal: MLE cerrado (media y desviación de log x).
+- weibull: MLE por Newton sobre la forma, partiendo de una aproximación por momentos.
+- binomial negativa: MLE por Newton sobre r (perfil de verosimilitud sobre valores únicos).
+El test K-S se calcula sobre una submuestra cuando la muestra es grande y los ajustes
+pueden repartirse entre candidatos y grupos en un pool de procesos.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+CONTINUOUS = ('normal', 'gamma', 'lognormal', 'weibull')
+DISCRETE = ('poisson', 'nbinom_mom', 'nbinom')
+
+KS_MAX_N = 5000
+_TOL = 1e-10
+_MAX_ITER = 50
+
+def _special():
+    # scipy se importa sólo al ajustar (ver importtime)
+    from scipy import special
+    return special
+
+def gamma_shape(s):
+    """
+    Forma MLE de la gamma dado s = log(media) - media(log x) (> 0). Acepta escalares o arrays
+    (un valor por grupo) y resuelve log(a) - digamma(a) = s por Newton vectorizado.
+    """
+    sp = _special()
+    s = np.asarray(s, dtype='float64')
+    a = (3 - s + np.sqrt((s - 3) ** 2 + 24 * s)) / (12 * s)
+    for _ in range(_MAX_ITER):
+        f = np.log(a) - sp.digamma(a) - s
+        fp = 1 / a - sp.polygamma(1, a)
+        step = f / fp
+        a = np.where(a - step > 0, a - step, a / 2)
+        if np.all(np.abs(step) <= _TOL * np.abs(a)):
+            break
+    return a
+
+def fit_gamma(x):
+    x = np.asarray(x, dtype='float64')
+    mean = x.mean()
+    a = float(gamma_shape(np.log(mean) - np.log(x).mean()))
+    return {'a': a, 'loc': 0.0, 'scale': float(mean / a)}
+
+def fit_lognormal(x):
+    lx = np.log(np.asarray(x, dtype='float64'))
+    return {'mu': float(lx.mean()), 'sigma': float(lx.std())}
+
+def fit_weibull(x):
+    x = np.asarray(x, dtype='float64')
+    z = x / x.max()  # escalar evita overflow en z**k
+    lz = np.log(z)
+    mlz = lz.mean()
+    cv = x.std() / x.mean()
+    k = cv ** -1.086 if cv > 0 else 1.0
+    for _ in range(_MAX_ITER):
+        zk = z ** k
+        s0, s1, s2 = zk.sum(), (zk * lz).sum(), (zk * lz * lz).sum()
+        g = s1 / s0 - 1 / k - mlz
+        gp = s2 / s0 - (s1 / s0) ** 2 + 1 / k ** 2
+        step = g / gp
+        k = k - step if k - step > 0 else k / 2
+        if abs(step) <= _TOL * k:
+            break
+    scale = x.max() * (z ** k).mean() ** (1 / k)
+    return {'c': float(k), 'loc': 0.0, 'scale': float(scale)}
+
+def fit_nbinom(x):
+    """MLE de (r, p) con la parametrización de scipy (media = r(1-p)/p). None si no hay sobredispersión."""
+    sp = _special()
+    x = np.asarray(x, dtype='float64')
+    mean, var = x.mean(), x.var()
+    if not (var > mean > 0):
+        return None
+    vals, counts = np.unique(x, return_counts=True)
+    n = counts.sum()
+    r = mean * mean / (var - mean)
+    for _ in range(_MAX_ITER):
+        f = (counts * sp.digamma(vals + r)).sum() - n * sp.digamma(r) + n * np.log(r / (r + mean))
+        fp = (counts * sp.polygamma(1, vals + r)).sum() - n * sp.polygamma(1, r) + n * (1 / r - 1 / (r + mean))
+        step = f / fp
+        r = r - step if r - step > 0 else r / 2
+        if abs(step) <= _TOL * r:
+            break
+    return {'r': float(r), 'p': float(r / (r + mean))}
+
+def ks_pvalue(x, dist, args, max_n=KS_MAX_N, seed=0):
+    """p-valor K-S contra `dist` de scipy.stats; con más de `max_n` puntos se usa una submuestra."""
+    from scipy import stats
+    x = np.asarray(x, dtype='float64')
+    if max_n and len(x) > max_n:
+        x = np.random.default_rng(seed).choice(x, size=max_n, replace=False)
+    return float(stats.kstest(x, dist, args=args).pvalue)
+
+def _fit_one(name, x, ks_max_n=KS_MAX_N):
+    """Ajusta un candidato. Devuelve el dict de fit_distributions o None si no aplica."""
+    x = np.asarray(x, dtype='float64')
+    positive = bool((x > 0).all())
+    if name == 'normal':
+        mu, std = float(x.mean()), float(x.std())
+        ksp = ks_pvalue((x - mu) / std, 'norm', (), ks_max_n) if std > 0 else None
+        return {'dist': 'normal', 'params': {'mu': mu, 'std': std}, 'kstest_pvalue': ksp}
+    if name == 'gamma' and positive:
+        p = fit_gamma(x)
+        return {'dist': 'gamma', 'params': p, 'kstest_pvalue': ks_pvalue(x, 'gamma', (p['a'], 0.0, p['scale']), ks_max_n)}
+    if name == 'lognormal' and positive:
+        p = fit_lognormal(x)
+        if p['sigma'] <= 0:
+            return None
+        return {'dist': 'lognormal', 'params': p, 'kstest_pvalue': ks_pvalue(x, 'lognorm', (p['sigma'], 0.0, np.exp(p['mu'])), ks_max_n)}
+    if name == 'weibull' and positive and x.std() > 0:
+        p = fit_weibull(x)
+        return {'dist': 'weibull', 'params': p, 'kstest_pvalue': ks_pvalue(x, 'weibull_min', (p['c'], 0.0, p['scale']), ks_max_n)}
+    if name == 'poisson':
+        return {'dist': 'poisson', 'params': {'lambda': float(x.mean())}}
+    if name == 'nbinom_mom':
+        mean, var = float(x.mean()), float(x.var())
+        if var > mean and mean > 0:
+            p = mean / var
+            return {'dist': 'nbinom_mom', 'params': {'r': float(mean * p / (1 - p)), 'p': float(p)}}
+        return None
+    if name == 'nbinom':
+        p = fit_nbinom(x)
+        return {'dist': 'nbinom', 'params': p} if p else None
+    return None
+
+def _fit_one_safe(name, x, ks_max_n=KS_MAX_N):
+    try:
+        return _fit_one(name, x, ks_max_n)
+    except Exception:
+        return None
+
+def fit_candidates(x, continuous=True, candidates=None, ks_max_n=KS_MAX_N, workers=None):
+    """Ajusta los candidatos sobre la muestra `x`; con `workers` > 1 cada candidato va a un proceso."""
+    x = np.asarray(x, dtype='float64')
+    candidates = list(candidates or (CONTINUOUS if continuous else DISCRETE))
+    if workers and workers > 1 and len(candidates) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            res = list(pool.map(_fit_one_safe, candidates, [x] * len(candidates), [ks_max_n] * len(candidates)))
+    else:
+        res = [_fit_one_safe(name, x, ks_max_n) for name in candidates]
+    return [r for r in res if r is not None]
+
+def _fit_group_batch(batch, continuous, candidates, ks_max_n):
+    rows = []
+    for key, x in batch:
+        for r in fit_candidates(x, continuous, candidates, ks_max_n):
+            rows.append((key, r))
+    return rows
+
+def fit_groups(df, col, by, continuous=True, candidates=None, ks_max_n=KS_MAX_N, workers=None, min_size=5):
+    """
+    Ajuste completo (con K-S) por grupo. Los grupos se reparten en lotes entre `workers`
+    procesos. Devuelve una tabla: claves, dist, params (dict), kstest_pvalue.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    vals = pd.to_numeric(df[col], errors='coerce')
+    frame = df[by].assign(_v=vals).dropna(subset=['_v'])
+    groups = [(key, g['_v'].to_numpy(dtype='float64')) for key, g in frame.groupby(by, observed=True, sort=True)]
+    groups = [(k, x) for k, x in groups if len(x) >= min_size]
+    if workers and workers > 1 and len(groups) > 1:
+        batches = [groups[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futs = [pool.submit(_fit_group_batch, b, continuous, candidates, ks_max_n) for b in batches if b]
+            rows = [row for f in futs for row in f.result()]
+    else:
+        rows = _fit_group_batch(groups, continuous, candidates, ks_max_n)
+    out = []
+    for key, r in rows:
+        key = key if isinstance(key, tuple) else (key,)
+        out.append({**dict(zip(by, key)), 'dist': r['dist'], 'params': r['params'], 'kstest_pvalue': r.get('kstest_pvalue')})
+    if not out:
+        return pd.DataFrame(columns=by + ['dist', 'params', 'kstest_pvalue'])
+    return pd.DataFrame(out).sort_values(by + ['dist'], kind='mergesort').reset_index(drop=True)
@@ -0,0 +1,75 @@
+# importtime.py
+"""
+Presupuesto de tiempo de importación de los módulos de la app.
+Uso:
+  python -m covid_stats_app.importtime [--budget 1.0]
+Importa los módulos en un intérprete limpio, mide el tiempo y falla (código 1) si se
+supera el presupuesto o si alguna dependencia pesada se cargó durante la importación.
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+PACKAGE = "covid_stats_app"
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+def app_modules(path=APP_PATH):
+    """Módulos del paquete que app.py importa a nivel de módulo (los que paga el arranque)."""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    found = []
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module == PACKAGE:
+            found += [f"{PACKAGE}.{alias.name}" for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and (node.module or "").startswith(PACKAGE + "."):
+            found.append(node.module)
+        elif isinstance(node, ast.Import):
+            found += [alias.name for alias in node.names if alias.name.startswith(PACKAGE + ".")]
+    return list(dict.fromkeys(found))
+
+# todo lo que importa app.py; result_cache se carga al usarse, pero también debe ser ligero
+MODULES = app_modules() + [f"{PACKAGE}.result_cache"]
+
+# dependencias que deben cargarse sólo al usarse, nunca al importar
+DEFERRED = ["scipy", "pycountry", "plotly.express"]
+
+DEFAULT_BUDGET = float(os.getenv("COVID_IMPORT_BUDGET", "1.0"))
+
+_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+for m in {modules!r}:
+    __import__(m)
+elapsed = time.perf_counter() - t
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+def measure_import_time(modules=None, deferred=None):
+    """Tiempo (s) de importar `modules` en un proceso nuevo y dependencias diferidas cargadas."""
+    code = _PROBE.format(modules=list(modules or MODULES), deferred=list(deferred or DEFERRED))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in [root, os.getenv("PYTHONPATH")] if p))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def check_budget(budget=DEFAULT_BUDGET, repeat=3):
+    """Devuelve (ok, resultado). Se toma el mejor de `repeat` intentos para reducir ruido."""
+    runs = [measure_import_time() for _ in range(max(1, repeat))]
+    best = min(runs, key=lambda r: r["seconds"])
+    best["budget"] = budget
+    ok = best["seconds"] <= budget and not best["loaded"]
+    return ok, best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="Segundos máximos de importación")
+    parser.add_argument("--repeat", type=int, default=3, help="Número de mediciones (se usa la mejor)")
+    args = parser.parse_args()
+    ok, res = check_budget(args.budget, args.repeat)
+    print(f"Importación: {res['seconds']:.3f}s (presupuesto {res['budget']:.3f}s)")
+    if res["loaded"]:
+        print("Dependencias cargadas antes de tiempo:", ", ".join(res["loaded"]))
+    sys.exit(0 if ok else 1)
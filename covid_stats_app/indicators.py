@@ -0,0 +1,77 @@
+# indicators.py
+"""
+Indicadores epidemiológicos por país sobre todo el dataset en una sola pasada:
+media y suma móviles, crecimiento semana contra semana, tiempo de duplicación,
+un proxy de Rt e incidencia por 100k habitantes.
+
+Todo sale de una suma acumulada por país: la suma móvil de `window` periodos es
+cs[t] - cs[t - window], calculada con un desplazamiento global y enmascarando las filas
+cuya ventana cruzaría a otro país. Las ventanas se cuentan en filas (periodos) de cada
+serie, que se asume regular (diaria o semanal).
+"""
+import numpy as np
+import pandas as pd
+
+INDICATOR_COLUMNS = ['rolling_sum', 'rolling_mean', 'wow_growth', 'doubling_time', 'rt_proxy', 'incidence_100k']
+
+def _shift_in_group(values, pos, n):
+    """values desplazado `n` filas dentro de cada grupo (NaN donde cruzaría de grupo)."""
+    out = np.full(len(values), np.nan)
+    if n < len(values):
+        out[n:] = values[:-n] if n else values
+    out[pos < n] = np.nan
+    return out
+
+def compute_indicators(df, value_col='new_cases', key_col='country_code', date_col='date', window=7,
+                       serial_interval=5, population=None):
+    """
+    Tabla (clave, fecha, valor, indicadores) para todas las series de `df` a la vez.
+    `population` es un dict/Series clave -> habitantes para la incidencia por 100k.
+    """
+    if df is None or df.empty or value_col not in df.columns:
+        return pd.DataFrame(columns=[key_col, date_col, value_col] + INDICATOR_COLUMNS)
+    base = df[[key_col, date_col, value_col]].dropna(subset=[key_col, date_col])
+    base = base.assign(**{value_col: pd.to_numeric(base[value_col], errors='coerce').astype('float64')})
+    base = base.groupby([key_col, date_col], as_index=False, observed=True, sort=True)[value_col].sum()
+    g = base.groupby(key_col, observed=True, sort=False)
+    pos = g.cumcount().to_numpy()
+    cs = g[value_col].cumsum().to_numpy(dtype='float64')
+
+    prev_cs = _shift_in_group(cs, pos, window)
+    rolling = np.where(pos == window - 1, cs, cs - prev_cs)
+    rolling[pos < window - 1] = np.nan
+    prev_rolling = _shift_in_group(rolling, pos, window)
+    serial_rolling = _shift_in_group(rolling, pos, serial_interval)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wow = rolling / prev_rolling - 1
+        ratio = cs / prev_cs
+        doubling = np.where(ratio > 1, window * np.log(2) / np.log(ratio), np.nan)
+        rt = rolling / serial_rolling
+    out = base.assign(
+        rolling_sum=rolling,
+        rolling_mean=rolling / window,
+        wow_growth=np.where(np.isfinite(wow), wow, np.nan),
+        doubling_time=doubling,
+        rt_proxy=np.where(np.isfinite(rt), rt, np.nan),
+    )
+    if population is not None:
+        pop = base[key_col].map(pd.Series(population)).astype('float64').to_numpy()
+        out['incidence_100k'] = rolling / pop * 1e5
+    else:
+        out['incidence_100k'] = np.nan
+    return out
+
+def latest(ind, key_col='country_code'):
+    """Última fila de indicadores de cada serie."""
+    if ind.empty:
+        return ind
+    return ind.groupby(key_col, observed=True, sort=True).tail(1).reset_index(drop=True)
+
+def cached_indicators(fingerprint, df, value_col='new_cases', key_col='country_code', window=7, **kwargs):
+    """compute_indicators con la caché LRU del proceso, indexada por huella del dataset y parámetros."""
+    if fingerprint is None:
+        return compute_indicators(df, value_col, key_col, window=window, **kwargs)
+    from covid_stats_app.result_cache import INDICATORS_CACHE
+    key = (fingerprint, value_col, key_col, window, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+    return INDICATORS_CACHE.get_or_compute(key, lambda: compute_indicators(df, value_col, key_col, window=window, **kwargs))
@@ -0,0 +1,162 @@
+# instrument.py
+"""
+Instrumentación ligera de las rutas calientes (carga, coerción, ISO3, agregados, stats,
+figuras). Cada tramo (`span`) registra tiempo de pared, filas procesadas y variación de
+memoria residente, anidado bajo el tramo que lo contiene.
+
+Los tramos sólo se miden si hay un recolector activo en el hilo/contexto actual (la app
+abre uno por rerun cuando el panel "Rendimiento" está activo) o si COVID_INSTRUMENT_LOG
+apunta a un archivo, donde se escribe una línea JSON por tramo. Sin ninguno de los dos
+el coste es el de una consulta a un ContextVar.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("instrument")
+
+LOG_PATH = os.getenv("COVID_INSTRUMENT_LOG")
+
+_collector = contextvars.ContextVar("covid_instrument_collector", default=None)
+_depth = contextvars.ContextVar("covid_instrument_depth", default=0)
+_log_lock = threading.Lock()
+
+try:
+    _PAGE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE = None
+
+def rss_bytes():
+    """Memoria residente del proceso (Linux, /proc); None si no está disponible."""
+    if _PAGE is None:
+        return None
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE
+    except Exception:
+        return None
+
+class Collector:
+    """Tramos registrados durante un rerun (o cualquier bloque de trabajo)."""
+    def __init__(self, label=None):
+        self.label = label
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.records = []
+
+    def add(self, rec):
+        self.records.append(rec)
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+    def summary(self):
+        """Totales por nombre de tramo: llamadas, segundos, filas."""
+        out = {}
+        for r in self.records:
+            s = out.setdefault(r["name"], {"name": r["name"], "calls": 0, "seconds": 0.0, "rows": 0})
+            s["calls"] += 1
+            s["seconds"] += r["seconds"]
+            s["rows"] += r["rows"] or 0
+        return sorted(out.values(), key=lambda s: -s["seconds"])
+
+    def to_dict(self):
+        return {"label": self.label, "started": self.started, "seconds": self.elapsed(), "spans": self.records}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), ensure_ascii=False, default=str, **kwargs)
+
+def active():
+    return _collector.get() is not None or bool(LOG_PATH)
+
+def start(label=None):
+    """Abre un recolector en el contexto actual y lo devuelve (sustituye al anterior)."""
+    col = Collector(label)
+    _collector.set(col)
+    _depth.set(0)
+    return col
+
+def stop():
+    """Cierra el recolector actual y lo devuelve."""
+    col = _collector.get()
+    _collector.set(None)
+    return col
+
+def current():
+    return _collector.get()
+
+@contextmanager
+def collect(label=None):
+    col = Collector(label)
+    token = _collector.set(col)
+    try:
+        yield col
+    finally:
+        _collector.reset(token)
+
+def _rows_of(obj):
+    try:
+        return len(obj) if hasattr(obj, "shape") else None
+    except Exception:
+        return None
+
+def _emit(rec):
+    col = _collector.get()
+    if col is not None:
+        col.add(rec)
+    if LOG_PATH:
+        line = json.dumps({"ts": time.time(), "pid": os.getpid(), **rec}, ensure_ascii=False, default=str)
+        try:
+            with _log_lock, open(LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except Exception as e:
+            logger.warning("No se pudo escribir el log de instrumentación: %s", e)
+
+@contextmanager
+def span(name, rows=None, **attrs):
+    """
+    Mide el bloque. El dict devuelto puede completarse dentro del bloque
+    (p.ej. rec["rows"] = len(df)) y se registra al salir.
+    """
+    if not active():
+        yield {}
+        return
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    col = _collector.get()
+    rec = {"name": name, "depth": depth, "rows": rows, **attrs}
+    rss0 = rss_bytes()
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        rec["seconds"] = time.perf_counter() - t0
+        rec["offset"] = t0 - col._t0 if col is not None else None
+        rss1 = rss_bytes()
+        rec["mem_delta_mb"] = (rss1 - rss0) / 2 ** 20 if rss0 is not None and rss1 is not None else None
+        _depth.reset(token)
+        _emit(rec)
+
+def traced(name=None, rows=_rows_of, input_rows=False):
+    """
+    Decorador: envuelve la función en un span. Las filas son `rows(resultado)` o, con
+    `input_rows`, las del primer argumento (DataFrame/Series de entrada).
+    """
+    def deco(fn):
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not active():
+                return fn(*args, **kwargs)
+            with span(label, rows=_rows_of(args[0]) if input_rows and args else None) as rec:
+                result = fn(*args, **kwargs)
+                if rows is not None and rec.get("rows") is None:
+                    rec["rows"] = rows(result)
+                return result
+        return wrapper
+    return deco
@@ -1,23 +1,111 @@
 # plots.py
-import plotly.express as px
+import base64
+import json
+import os
+import numpy as np
 import pandas as pd
-import plotly.io as pio
 from pathlib import Path
+from covid_stats_app import instrument
+from covid_stats_app import validation
 
-def timeseries_plot(df, date_col='date', y='new_cases', entity_col='country', countries=None, y_label=None, title=None):
-    df = df.copy()
-    if date_col in df.columns:
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+def _px():
+    # plotly.express tarda en importarse; se carga con la primera figura
+    import plotly.express as px
+    return px
+
+# series más largas que esto se reducen en el servidor; por encima de WEBGL_THRESHOLD puntos
+# en total se dibuja con scattergl y sin marcadores
+MAX_POINTS = int(os.getenv("COVID_PLOT_MAX_POINTS", "2000"))
+WEBGL_THRESHOLD = int(os.getenv("COVID_PLOT_WEBGL_THRESHOLD", "5000"))
+MARKERS_MAX = 500
+
+def lttb_indices(x, y, n):
+    """Índices elegidos por Largest-Triangle-Three-Buckets (conserva primer y último punto)."""
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else size
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area)) if hi > lo else lo
+        out[i + 1] = a
+    return np.unique(out)
+
+def minmax_indices(y, n):
+    """Índices del mínimo y máximo de cada uno de n/2 tramos (vectorizado)."""
+    size = len(y)
+    if n >= size or n < 2:
+        return np.arange(size)
+    buckets = np.arange(size) * (n // 2) // size
+    order = np.lexsort((np.asarray(y, dtype='float64'), buckets))
+    b = buckets[order]
+    first = np.r_[True, b[1:] != b[:-1]]
+    last = np.r_[b[1:] != b[:-1], True]
+    return np.unique(np.r_[order[first], order[last], 0, size - 1])
+
+def decimate(df, x_col, y_col, entity_col=None, max_points=MAX_POINTS, method='lttb'):
+    """Reduce cada serie (por `entity_col`) a lo sumo a `max_points` puntos; las filas con y nulo se descartan."""
+    df = df.dropna(subset=[x_col, y_col])
+    if len(df) <= max_points:
+        return df
+    groups = df.groupby(entity_col, observed=True, sort=False).indices if entity_col else {None: np.arange(len(df))}
+    xs = df[x_col].to_numpy()
+    xs = xs.astype('datetime64[ns]').astype('int64') if np.issubdtype(xs.dtype, np.datetime64) else xs
+    ys = df[y_col].to_numpy(dtype='float64')
+    keep = []
+    for pos in groups.values():
+        pos = pos[np.argsort(xs[pos], kind='mergesort')]
+        if len(pos) <= max_points:
+            keep.append(pos)
+        elif method == 'minmax':
+            keep.append(pos[minmax_indices(ys[pos], max_points)])
+        else:
+            keep.append(pos[lttb_indices(xs[pos], ys[pos], max_points)])
+    return df.iloc[np.concatenate(keep)]
+
+@instrument.traced("plots.timeseries_plot", input_rows=True)
+def timeseries_plot(df, date_col='date', y='new_cases', entity_col='country', countries=None, y_label=None, title=None,
+                    max_points=MAX_POINTS, method='lttb', webgl_threshold=WEBGL_THRESHOLD):
+    # filtrar antes de tocar fechas; sólo se re-parsean si no vienen ya como datetime
     if countries and entity_col in df.columns:
         df = df[df[entity_col].isin(countries)]
-    if entity_col and entity_col in df.columns:
-        fig = px.line(df, x=date_col, y=y, color=entity_col, markers=True, title=title or "")
-        fig.update_layout(legend_title=entity_col)
+    if date_col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+        df = df.assign(**{date_col: pd.to_datetime(df[date_col], errors='coerce')})
+    entity = entity_col if entity_col and entity_col in df.columns else None
+    if max_points and date_col in df.columns and y in df.columns:
+        df = decimate(df, date_col, y, entity, max_points=max_points, method=method)
+    webgl = webgl_threshold is not None and len(df) > webgl_threshold
+    opts = dict(markers=len(df) <= MARKERS_MAX, render_mode='webgl' if webgl else 'svg', title=title or "")
+    if entity:
+        fig = _px().line(df, x=date_col, y=y, color=entity, **opts)
+        fig.update_layout(legend_title=entity)
     else:
-        fig = px.line(df, x=date_col, y=y, markers=True, title=title or "")
+        fig = _px().line(df, x=date_col, y=y, **opts)
     fig.update_layout(xaxis_title="Fecha", yaxis_title=y_label or y, transition={'duration':300, 'easing':'cubic-in-out'})
     return fig
 
+def cached_figure(key, build):
+    """
+    Figura construida por `build()` y guardada en la caché LRU del proceso. `key` debe
+    identificar los datos y la vista, p.ej. (huella del dataset, métrica, países, rango).
+    """
+    from covid_stats_app.result_cache import FIGURE_CACHE
+    return FIGURE_CACHE.get_or_compute(key, build)
+
+def _clean_input(df, date_col, code_col):
+    # agregado de datos validados (ver validation): fechas y códigos ya limpios, sin nulos
+    return validation.is_validated(df) and date_col == 'date' and code_col == 'country_code' \
+        and not df[code_col].isna().any()
+
+@instrument.traced("plots.animated_choropleth", input_rows=True)
 def animated_choropleth(df, date_col='date', value_col='value', code_col='country_code', title=None, color_scale='Reds'):
     """
     df: preagregado por (date_col, code_col, value_col). value_col debe existir.
@@ -26,13 +114,16 @@ def animated_choropleth(df, date_col='date', value_col='value', code_col='countr
     """
     if df is None or df.empty:
         raise ValueError("No hay datos para la animación.")
-    tmp = df.copy()
-    tmp[date_col] = pd.to_datetime(tmp[date_col], errors='coerce')
-    tmp = tmp.dropna(subset=[date_col, code_col, value_col])
-    if tmp.empty:
-        raise ValueError("No hay registros válidos con fecha, código de país y valor.")
-    tmp[code_col] = tmp[code_col].astype(str).str.upper()
-    tmp['date_str'] = tmp[date_col].dt.strftime('%Y-%m-%d')
+    if _clean_input(df, date_col, code_col):
+        tmp = df
+    else:
+        tmp = df.copy()
+        tmp[date_col] = pd.to_datetime(tmp[date_col], errors='coerce')
+        tmp = tmp.dropna(subset=[date_col, code_col, value_col])
+        if tmp.empty:
+            raise ValueError("No hay registros válidos con fecha, código de país y valor.")
+        tmp[code_col] = tmp[code_col].astype(str).str.upper()
+    tmp = tmp.assign(date_str=tmp[date_col].dt.strftime('%Y-%m-%d'))
     tmp = tmp.sort_values(date_col)
     agg = tmp.groupby(['date_str', code_col], as_index=False)[value_col].sum()
     # calcular rango global para colors
@@ -40,7 +131,7 @@ def animated_choropleth(df, date_col='date', value_col='value', code_col='countr
     vmax = agg[value_col].max() if not agg[value_col].empty else 1
 
     title = title or f"Animación — {value_col}"
-    fig = px.choropleth(
+    fig = _px().choropleth(
         agg,
         locations=code_col,
         color=value_col,
@@ -81,6 +172,7 @@ def animated_choropleth(df, date_col='date', value_col='value', code_col='countr
         ]
     return fig
 
+@instrument.traced("plots.histogram_plot", input_rows=True)
 def histogram_plot(df, col, x_label=None, y_label=None, title=None, nbins=30):
     df = df.copy()
     if col not in df.columns:
@@ -88,20 +180,139 @@ def histogram_plot(df, col, x_label=None, y_label=None, title=None, nbins=30):
     s = pd.to_numeric(df[col], errors='coerce').dropna()
     title = title or f"Histograma — {x_label or col}"
     df_plot = pd.DataFrame({x_label or col: s})
-    fig = px.histogram(df_plot, x=x_label or col, nbins=nbins, title=title)
+    fig = _px().histogram(df_plot, x=x_label or col, nbins=nbins, title=title)
     fig.update_layout(xaxis_title=x_label or col, yaxis_title=y_label or "Frecuencia", bargap=0.05)
     return fig
 
+@instrument.traced("plots.bar_plot", input_rows=True)
 def bar_plot(df, x, y, x_label=None, y_label=None, title=None):
     df = df.copy()
     title = title or f"{y_label or y} por {x_label or x}"
-    fig = px.bar(df, x=x, y=y, title=title)
+    fig = _px().bar(df, x=x, y=y, title=title)
     fig.update_layout(xaxis_title=x_label or x, yaxis_title=y_label or y)
     return fig
 
+@instrument.traced("plots.save_fig_html", rows=None)
 def save_fig_html(fig, out_path, include_plotlyjs='cdn'):
     out_path = Path(out_path)
     out_path.parent.mkdir(parents=True, exist_ok=True)
+    import plotly.io as pio
     html = pio.to_html(fig, include_plotlyjs=include_plotlyjs)
     out_path.write_text(html, encoding='utf-8')
     return out_path
+
+# ---------- Animación ligera ----------
+# Un solo trace con las ubicaciones una vez; los valores de cada frame van como Float32Array
+# en base64 y, salvo cada `key_every` frames, sólo con las posiciones que cambiaron.
+_COMPACT_JS = """
+(function(){
+  var gd = document.getElementById('{plot_id}');
+  var D = __PAYLOAD__;
+  function bytes(b){var s=atob(b),u=new Uint8Array(s.length);for(var j=0;j<s.length;j++)u[j]=s.charCodeAt(j);return u.buffer;}
+  var z = new Float32Array(D.n), cur = -1, timer = null;
+  function apply(k){
+    var f = D.frames[k];
+    if (f.k) { z.set(new Float32Array(bytes(f.v))); return; }
+    var ii = new Uint32Array(bytes(f.i)), vv = new Float32Array(bytes(f.v));
+    for (var j = 0; j < ii.length; j++) z[ii[j]] = vv[j];
+  }
+  var box = document.createElement('div');
+  box.style.cssText = 'display:flex;gap:8px;align-items:center;font-family:sans-serif;margin:4px 0';
+  var play = document.createElement('button'); play.textContent = 'Play';
+  var pause = document.createElement('button'); pause.textContent = 'Pause';
+  var slider = document.createElement('input'); slider.type = 'range'; slider.min = 0; slider.max = D.labels.length - 1; slider.value = 0; slider.style.flex = '1';
+  var label = document.createElement('span');
+  box.appendChild(play); box.appendChild(pause); box.appendChild(slider); box.appendChild(label);
+  gd.parentNode.insertBefore(box, gd.nextSibling);
+  function draw(){
+    var arr = new Array(D.n);
+    for (var j = 0; j < D.n; j++) arr[j] = isNaN(z[j]) ? null : z[j];
+    Plotly.restyle(gd, {z: [arr]}, [0]);
+    label.textContent = D.labels[cur]; slider.value = cur;
+  }
+  function seek(k){
+    if (cur >= 0 && k === cur + 1) { apply(k); }
+    else { for (var j = k - (k % D.keyEvery); j <= k; j++) apply(j); }
+    cur = k; draw();
+  }
+  function stop(){ if (timer) { clearInterval(timer); timer = null; } }
+  play.onclick = function(){ stop(); if (cur >= D.labels.length - 1) seek(0);
+    timer = setInterval(function(){ if (cur >= D.labels.length - 1) { stop(); return; } seek(cur + 1); }, D.frameMs); };
+  pause.onclick = stop;
+  slider.oninput = function(){ stop(); seek(parseInt(slider.value, 10)); };
+  seek(0);
+})();
+"""
+
+def _b64(arr, dtype):
+    return base64.b64encode(np.ascontiguousarray(arr, dtype=dtype).tobytes()).decode('ascii')
+
+def compact_frames(df, date_col='date', value_col='value', code_col='country_code', freq=None, how='last'):
+    """
+    Matriz frames × ubicaciones (float32) a partir de un agregado largo.
+    `freq` ('W' o 'M') reduce los frames a uno por semana o mes usando el último valor
+    del periodo (`how='last'`, series acumuladas) o su suma (`how='sum'`).
+    Devuelve (etiquetas, códigos, matriz).
+    """
+    tmp = df[[date_col, code_col, value_col]]
+    if _clean_input(df, date_col, code_col):
+        tmp = tmp.assign(**{value_col: tmp[value_col].astype('float64')})
+    else:
+        if not pd.api.types.is_datetime64_any_dtype(tmp[date_col]):
+            tmp = tmp.assign(**{date_col: pd.to_datetime(tmp[date_col], errors='coerce')})
+        tmp = tmp.dropna(subset=[date_col, code_col])
+        if tmp.empty:
+            raise ValueError("No hay registros válidos con fecha, código de país y valor.")
+        tmp = tmp.assign(**{code_col: tmp[code_col].astype(str).str.upper(),
+                            value_col: pd.to_numeric(tmp[value_col], errors='coerce').astype('float64')})
+    mat = tmp.pivot_table(index=date_col, columns=code_col, values=value_col, aggfunc='sum').sort_index()
+    if freq:
+        periods = mat.index.to_period(freq)
+        mat = mat.groupby(periods).sum(min_count=1) if how == 'sum' else mat.groupby(periods).last()
+        fmt = '%Y-%m' if str(freq).upper().startswith('M') else '%Y-%m-%d'
+        labels = [p.start_time.strftime(fmt) for p in mat.index]
+    else:
+        labels = [d.strftime('%Y-%m-%d') for d in mat.index]
+    return labels, [str(c) for c in mat.columns], mat.to_numpy(dtype='float32')
+
+def encode_frames(values, key_every=30):
+    """Codifica la matriz de frames: keyframes completos cada `key_every` y deltas entre medias."""
+    frames = []
+    prev = None
+    for k, row in enumerate(values):
+        if k % key_every == 0:
+            frames.append({'k': 1, 'v': _b64(row, '<f4')})
+        else:
+            changed = np.flatnonzero(~((row == prev) | (np.isnan(row) & np.isnan(prev))))
+            frames.append({'i': _b64(changed, '<u4'), 'v': _b64(row[changed], '<f4')})
+        prev = row
+    return frames
+
+@instrument.traced("plots.compact_choropleth_html", input_rows=True)
+def compact_choropleth_html(df, out_path, date_col='date', value_col='value', code_col='country_code', title=None,
+                            color_scale='Reds', freq=None, how='last', key_every=30, frame_ms=300, include_plotlyjs='cdn'):
+    """
+    Exporta una animación choropleth ligera: un único trace con las ubicaciones y los valores
+    por frame en arrays compactos (delta) que un pequeño script aplica en el navegador.
+    """
+    import plotly.graph_objects as go
+    import plotly.io as pio
+    labels, codes, values = compact_frames(df, date_col, value_col, code_col, freq=freq, how=how)
+    finite = values[np.isfinite(values)]
+    vmin = float(finite.min()) if finite.size else 0.0
+    vmax = float(finite.max()) if finite.size else 1.0
+    first = [None if np.isnan(v) else float(v) for v in values[0]]
+    fig = go.Figure(go.Choropleth(
+        locations=codes, z=first, locationmode='ISO-3', zmin=vmin, zmax=vmax,
+        colorscale=color_scale, marker_line_width=0.1, colorbar=dict(title="Casos"),
+    ))
+    fig.update_layout(title=title or f"Animación — {value_col}", geo=dict(projection_type='natural earth'),
+                      margin=dict(l=0, r=0, t=40, b=0))
+    payload = {'n': len(codes), 'labels': labels, 'keyEvery': key_every, 'frameMs': frame_ms,
+               'frames': encode_frames(values, key_every)}
+    script = _COMPACT_JS.replace('__PAYLOAD__', json.dumps(payload, separators=(',', ':')))
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    html = pio.to_html(fig, include_plotlyjs=include_plotlyjs, post_script=script)
+    out_path.write_text(html, encoding='utf-8')
+    return out_path
@@ -3,41 +3,70 @@
 Genera datos procesados y una animación HTML del mapa choropleth.
 Uso:
   python -m covid_stats_app.preprocess --metric new_cases
+  python -m covid_stats_app.preprocess --all --workers 4
+  python -m covid_stats_app.preprocess --all --lite --freq W
+  python -m covid_stats_app.preprocess --indicators
 Genera:
-  converted_covid_data/processed/notifications_agg_<metric>.csv
-  converted_covid_data/processed/choropleth_notifications_<metric>.html
+  converted_covid_data/processed/<dataset>_agg_<metric>.csv
+  converted_covid_data/processed/choropleth_<dataset>_<metric>.html
+  (con --lite: choropleth_<dataset>_<metric>.lite.html, animación compacta opcionalmente
+  reducida a frames semanales/mensuales con --freq)
+  (con --indicators: <dataset>_indicators.csv con medias móviles, crecimiento y Rt por país)
+Con --all se procesan todas las métricas de notificaciones y hospitalizaciones cargando
+los datos una sola vez; las figuras se generan en paralelo en un pool de procesos.
 """
 import argparse
-from pathlib import Path
+import os
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from covid_stats_app import data_loader as dl
 from covid_stats_app import plots
-import pandas as pd
+from covid_stats_app import rollups
+from covid_stats_app import indicators
+from covid_stats_app import instrument
 
-def preprocess_notifications(metric='new_cases', use_cumulative=True):
-    base = dl.get_base_dir()
-    p = base / dl.EXPECTED_FILES["notifications"]
-    if not p.exists():
-        print("No existe CSV de notificaciones en:", p)
-        return
-    df = dl.load_notifications()
-    if metric not in df.columns:
-        print(f"La columna {metric} no existe en el CSV. Columnas disponibles: {list(df.columns)}")
-        return
-    df = df.copy()
-    df['date'] = pd.to_datetime(df['date'], errors='coerce')
-    df = df.dropna(subset=['date', 'country_code'])
-    df['country_code'] = df['country_code'].astype(str).str.upper()
-    df[metric] = pd.to_numeric(df[metric], errors='coerce').fillna(0)
-    agg = df.groupby(['date', 'country_code'], as_index=False)[metric].sum().sort_values(['country_code','date'])
+BATCH_DATASETS = ("notifications", "hospitalizations")
+
+def get_processed_dir():
+    return dl.get_base_dir().parent / "processed"
+
+@instrument.traced("preprocess.aggregate")
+def _aggregate_metric(dataset, metric, use_cumulative=True, chunked=False):
+    if chunked:
+        # streaming: agregado corriente por bloques, sin cargar el dataset completo
+        chunks = dl.iter_chunks(dataset, columns=['date', 'country_code', metric])
+        agg = dl.aggregate_for_choropleth(chunks, date_col='date', value_col=metric, code_col='country_code')
+        if not agg.empty and not metric.startswith("cum_"):
+            agg = agg.sort_values(['country_code', 'date'])
+            agg[f"{metric}_cum"] = agg.groupby('country_code', observed=True)[metric].cumsum()
+    else:
+        # agregado diario por país leído del cubo (se reconstruye sólo si cambió el CSV)
+        agg = rollups.rollup(dataset, "day", by=["country_code"], metrics=[metric])
+        agg = agg.rename(columns={'period_start': 'date'})
+    # datos validados al cargar: fechas presentes y códigos ya en mayúsculas; sólo quedan
+    # fuera las series sin código de país
+    agg = agg.dropna(subset=['country_code'])
+    agg['country_code'] = agg['country_code'].astype(str)
+    agg = agg.sort_values(['country_code', 'date'])
     # generar acumulado si se desea (útil para visualización del spread)
     if use_cumulative:
-        agg['cum'] = agg.groupby('country_code')[metric].cumsum()
-    out_dir = base.parent / "processed"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    csv_out = out_dir / f"notifications_agg_{metric}.csv"
-    agg.to_csv(csv_out, index=False)
-    print("CSV agregado guardado en:", csv_out)
+        agg['cum'] = agg[f"{metric}_cum"] if f"{metric}_cum" in agg.columns else agg[metric]
+    return agg[['date', 'country_code', metric] + (['cum'] if use_cumulative else [])]
 
+def html_path(dataset, metric, lite=False):
+    suffix = ".lite.html" if lite else ".html"
+    return get_processed_dir() / f"choropleth_{dataset}_{metric}{suffix}"
+
+@instrument.traced("preprocess.write_outputs", rows=lambda r: r["rows"])
+def _write_outputs(dataset, metric, agg, out_dir, use_cumulative=True, lite=False, freq=None):
+    """Escribe el CSV agregado y la animación HTML de una métrica. Devuelve un informe con tiempos."""
+    report = {"dataset": dataset, "metric": metric, "rows": len(agg), "csv": None, "html": None, "error": None}
+    t0 = time.perf_counter()
+    csv_out = out_dir / f"{dataset}_agg_{metric}.csv"
+    agg.to_csv(csv_out, index=False)
+    report["csv"] = str(csv_out)
+    t1 = time.perf_counter()
     # Generar figura animada (usamos la columna 'cum' si use_cumulative True)
     try:
         if use_cumulative:
@@ -45,16 +74,131 @@ def preprocess_notifications(metric='new_cases', use_cumulative=True):
             df_for_fig = agg.rename(columns={'cum': 'value'})
         else:
             df_for_fig = agg.rename(columns={metric: 'value'})
-        fig = plots.animated_choropleth(df_for_fig, date_col='date', value_col='value', code_col='country_code', title=f"Animación — {metric}")
-        html_out = out_dir / f"choropleth_notifications_{metric}.html"
-        plots.save_fig_html(fig, html_out)
-        print("HTML de animación guardado en:", html_out)
+        html_out = out_dir / html_path(dataset, metric, lite).name
+        if lite:
+            plots.compact_choropleth_html(df_for_fig, html_out, date_col='date', value_col='value', code_col='country_code',
+                                          title=f"Animación — {metric}", freq=freq, how='last' if use_cumulative else 'sum')
+        else:
+            fig = plots.animated_choropleth(df_for_fig, date_col='date', value_col='value', code_col='country_code', title=f"Animación — {metric}")
+            plots.save_fig_html(fig, html_out)
+        report["html"] = str(html_out)
     except Exception as e:
-        print("No se pudo generar la figura de animación:", e)
+        report["error"] = str(e)
+    t2 = time.perf_counter()
+    report["csv_seconds"] = t1 - t0
+    report["figure_seconds"] = t2 - t1
+    return report
+
+@instrument.traced("preprocess.write_indicators", rows=None)
+def write_indicators(dataset, out_dir=None, window=7):
+    """
+    Indicadores por país de las métricas de flujo del dataset en <dataset>_indicators.csv.
+    Agrupa por country_code o, si el dataset no lo tiene, por country. Devuelve la ruta, o
+    None si el dataset no tiene columna de país.
+    """
+    out_dir = out_dir or get_processed_dir()
+    df = dl.LOADERS[dataset](columns=['date', 'country_code', 'country'] + dl.METRIC_COLUMNS[dataset])
+    key_col = next((c for c in ('country_code', 'country') if c in df.columns and df[c].notna().any()), None)
+    if key_col is None:
+        print(f"{dataset} no tiene columna de país; se omiten sus indicadores.")
+        return None
+    out_dir.mkdir(parents=True, exist_ok=True)
+    fingerprint = dl.dataset_fingerprint(dataset)
+    frames = []
+    for metric in dl.METRIC_COLUMNS[dataset]:
+        if metric.startswith("cum_"):
+            continue
+        ind = indicators.cached_indicators(fingerprint, df, metric, key_col=key_col, window=window)
+        frames.append(ind.rename(columns={metric: 'value'}).assign(metric=metric))
+    out = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    csv_out = out_dir / f"{dataset}_indicators.csv"
+    out.to_csv(csv_out, index=False)
+    return csv_out
+
+def _render_job(job):
+    return _write_outputs(**job)
+
+def preprocess_notifications(metric='new_cases', use_cumulative=True, lite=False, freq=None, chunked=False):
+    base = dl.get_base_dir()
+    p = base / dl.EXPECTED_FILES["notifications"]
+    if not p.exists():
+        print("No existe CSV de notificaciones en:", p)
+        return
+    if metric not in dl.METRIC_COLUMNS["notifications"]:
+        print(f"La columna {metric} no existe en el CSV. Columnas disponibles: {dl.METRIC_COLUMNS['notifications']}")
+        return
+    agg = _aggregate_metric("notifications", metric, use_cumulative, chunked=chunked)
+    out_dir = get_processed_dir()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    report = _write_outputs("notifications", metric, agg, out_dir, use_cumulative, lite=lite, freq=freq)
+    print("CSV agregado guardado en:", report["csv"])
+    if report["error"]:
+        print("No se pudo generar la figura de animación:", report["error"])
+    else:
+        print("HTML de animación guardado en:", report["html"])
+
+def preprocess_batch(datasets=BATCH_DATASETS, use_cumulative=True, workers=None, lite=False, freq=None, chunked=False, out_dir=None):
+    """
+    Procesa todas las métricas de `datasets`. Los agregados se calculan en este proceso
+    (un cubo por dataset) y la escritura de CSV/HTML se reparte en `workers` procesos.
+    `out_dir` permite escribir en otro directorio (p.ej. uno temporal del worker).
+    Devuelve la lista de informes por métrica.
+    """
+    t_start = time.perf_counter()
+    out_dir = out_dir or get_processed_dir()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    jobs = []
+    for dataset in datasets:
+        if dl.source_path(dataset) is None:
+            print(f"No existe CSV de {dataset}; se omite.")
+            continue
+        if 'country_code' not in dl.LOADERS[dataset](columns=['country_code']).columns:
+            print(f"{dataset} no tiene country_code ni country para derivarlo; se omite.")
+            continue
+        for metric in dl.METRIC_COLUMNS[dataset]:
+            agg = _aggregate_metric(dataset, metric, use_cumulative, chunked=chunked)
+            jobs.append({"dataset": dataset, "metric": metric, "agg": agg, "out_dir": out_dir,
+                         "use_cumulative": use_cumulative, "lite": lite, "freq": freq})
+    t_agg = time.perf_counter()
+    print(f"Agregados listos: {len(jobs)} métricas en {t_agg - t_start:.2f}s")
+
+    workers = workers or int(os.getenv("PREPROCESS_WORKERS", "0")) or min(len(jobs), os.cpu_count() or 1)
+    reports = []
+    def _progress(rep):
+        reports.append(rep)
+        status = "error: " + rep["error"] if rep["error"] else "ok"
+        print(f"[{len(reports)}/{len(jobs)}] {rep['dataset']}/{rep['metric']}: "
+              f"csv {rep['csv_seconds']:.2f}s, figura {rep['figure_seconds']:.2f}s ({status})")
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            _progress(_render_job(job))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for fut in as_completed([pool.submit(_render_job, job) for job in jobs]):
+                _progress(fut.result())
+    print(f"Lote terminado en {time.perf_counter() - t_start:.2f}s con {max(1, workers)} proceso(s).")
+    return reports
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--metric", default="new_cases", help="Columna métrica a procesar (por defecto new_cases)")
     parser.add_argument("--no-cum", action="store_true", help="No generar acumulado; animar valores diarios en su lugar")
+    parser.add_argument("--all", action="store_true", help="Procesar todas las métricas de notificaciones y hospitalizaciones")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos para el modo --all (por defecto, núcleos disponibles)")
+    parser.add_argument("--lite", action="store_true", help="Exportar la animación compacta (.lite.html)")
+    parser.add_argument("--freq", choices=["W", "M"], default=None, help="Con --lite: un frame por semana (W) o mes (M)")
+    parser.add_argument("--chunked", action="store_true", help="Agregar leyendo por bloques (datasets mayores que la memoria)")
+    parser.add_argument("--indicators", action="store_true", help="Exportar sólo los indicadores por país (medias móviles, crecimiento, Rt)")
     args = parser.parse_args()
-    preprocess_notifications(metric=args.metric, use_cumulative=not args.no_cum)
+    if args.indicators:
+        for dataset in BATCH_DATASETS:
+            if dl.source_path(dataset) is None:
+                print(f"No existe CSV de {dataset}; se omite.")
+                continue
+            csv_out = write_indicators(dataset)
+            if csv_out is not None:
+                print("Indicadores guardados en:", csv_out)
+    elif args.all:
+        preprocess_batch(use_cumulative=not args.no_cum, workers=args.workers, lite=args.lite, freq=args.freq, chunked=args.chunked)
+    else:
+        preprocess_notifications(metric=args.metric, use_cumulative=not args.no_cum, lite=args.lite, freq=args.freq, chunked=args.chunked)
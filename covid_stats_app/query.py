@@ -0,0 +1,81 @@
+# query.py
+"""
+Índice en memoria para consultas por país + rango de fechas.
+
+Los datos se ordenan una sola vez por (clave, fecha) y se guardan los rangos de filas
+de cada clave; una consulta resuelve el rango de fechas con búsqueda binaria dentro de
+cada rango y devuelve sólo esas filas, sin recorrer ni copiar el DataFrame completo.
+"""
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+
+def _as_bound(value, end=False):
+    """Convierte un límite a datetime64. Una fecha sin hora como final incluye todo ese día."""
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    if end and isinstance(value, date) and not isinstance(value, datetime):
+        return (ts + pd.Timedelta(days=1)).to_datetime64(), "left"
+    return ts.to_datetime64(), ("right" if end else "left")
+
+class QueryIndex:
+    def __init__(self, df, key_col='country_code', date_col='date'):
+        if key_col not in df.columns or date_col not in df.columns:
+            raise ValueError(f"El DataFrame necesita las columnas {key_col!r} y {date_col!r}.")
+        self.key_col = key_col
+        self.date_col = date_col
+        self.data = df.sort_values([key_col, date_col], kind='mergesort', na_position='last').reset_index(drop=True)
+        if not pd.api.types.is_datetime64_any_dtype(self.data[date_col]):
+            self.data[date_col] = pd.to_datetime(self.data[date_col], errors='coerce')
+        self._dates = self.data[date_col].to_numpy()
+        keys = self.data[key_col]
+        valid = int(keys.notna().sum())  # las claves nulas quedan al final
+        self._offsets = {}
+        if valid:
+            codes, uniques = pd.factorize(keys.iloc[:valid])
+            bounds = np.concatenate(([0], np.flatnonzero(codes[1:] != codes[:-1]) + 1, [valid]))
+            for i in range(len(bounds) - 1):
+                self._offsets[uniques[codes[bounds[i]]]] = (int(bounds[i]), int(bounds[i + 1]))
+        self._null_range = (valid, len(self.data))
+
+    def __len__(self):
+        return len(self.data)
+
+    def keys(self):
+        return sorted(self._offsets)
+
+    def _ranges(self, keys):
+        if keys is None:
+            ranges = list(self._offsets.values())
+            if self._null_range[1] > self._null_range[0]:
+                ranges.append(self._null_range)
+            return ranges
+        if isinstance(keys, str):
+            keys = [keys]
+        return [self._offsets[k] for k in keys if k in self._offsets]
+
+    def positions(self, keys=None, start=None, end=None):
+        """Posiciones (enteras) de las filas que cumplen la consulta, en orden (clave, fecha)."""
+        lo_b = _as_bound(start)
+        hi_b = _as_bound(end, end=True)
+        parts = []
+        for s, e in self._ranges(keys):
+            lo, hi = s, e
+            if lo_b is not None:
+                lo = s + int(np.searchsorted(self._dates[s:e], lo_b[0], side=lo_b[1]))
+            if hi_b is not None:
+                hi = s + int(np.searchsorted(self._dates[s:e], hi_b[0], side=hi_b[1]))
+            if hi > lo:
+                parts.append(np.arange(lo, hi))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def slice(self, keys=None, start=None, end=None, columns=None):
+        """Filas de `keys` (una clave, lista o None = todas) entre `start` y `end` (inclusive)."""
+        data = self.data if columns is None else self.data[[c for c in columns if c in self.data.columns]]
+        return data.take(self.positions(keys, start, end))
+
+    def series(self, metric, keys=None, start=None, end=None):
+        """Serie de `metric` por fecha sumada sobre las claves seleccionadas."""
+        df = self.slice(keys, start, end, columns=[self.date_col, metric])
+        return df.groupby(self.date_col, as_index=False)[metric].sum()
@@ -0,0 +1,121 @@
+# result_cache.py
+"""
+Caché LRU compartida por el proceso (todas las sesiones de Streamlit) para resultados
+costosos, con persistencia opcional en disco y métricas de aciertos/fallos.
+"""
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import logging
+import os
+import pickle
+import threading
+
+logger = logging.getLogger("result_cache")
+
+_MISSING = object()
+
+class LRUCache:
+    def __init__(self, maxsize=128, persist_dir=None):
+        self.maxsize = maxsize
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return self.persist_dir / f"{digest}.pkl"
+
+    def _disk_get(self, key):
+        if self.persist_dir is None:
+            return _MISSING
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                stored_key, value = pickle.load(f)
+            return value if stored_key == key else _MISSING
+        except Exception:
+            return _MISSING
+
+    def _disk_put(self, key, value):
+        if self.persist_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning("No se pudo persistir la entrada de caché en %s: %s", path, e)
+
+    def _store(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+        value = self._disk_get(key)
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.disk_hits += 1
+            self._store(key, value)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+        self._disk_put(key, value)
+
+    def get_or_compute(self, key, fn):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = fn()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / total if total else None,
+                "size": len(self._data), "maxsize": self.maxsize,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.disk_hits = 0
+
+def _stats_persist_dir():
+    if os.getenv("COVID_STATS_CACHE_PERSIST", "0").lower() in ("0", "false", "no"):
+        return None
+    from covid_stats_app import data_loader as dl
+    return dl.get_cache_dir() / "stats"
+
+# resultados de stats por (huella del dataset, columna, otra columna, continua)
+STATS_CACHE = LRUCache(maxsize=int(os.getenv("COVID_STATS_CACHE_SIZE", "256")), persist_dir=_stats_persist_dir())
+
+# indicadores por país (tablas del tamaño del dataset): pocas entradas
+INDICATORS_CACHE = LRUCache(maxsize=int(os.getenv("COVID_INDICATORS_CACHE_SIZE", "16")))
+
+# figuras de plotly por (huella del dataset, métrica, selección, rango)
+FIGURE_CACHE = LRUCache(maxsize=int(os.getenv("COVID_FIGURE_CACHE_SIZE", "64")))
+
+# recortes exportados (bytes CSV/Parquet) por (huella del dataset, filtros, formato)
+EXPORT_CACHE = LRUCache(maxsize=int(os.getenv("COVID_EXPORT_CACHE_SIZE", "8")))
+
+# respuestas de la API HTTP (cuerpo, tipo) por ETag
+API_CACHE = LRUCache(maxsize=int(os.getenv("COVID_API_CACHE_SIZE", "128")))
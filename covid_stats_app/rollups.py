@@ -0,0 +1,140 @@
+# rollups.py
+"""
+Cubo de agregados por dataset: (país, [grupo etario], periodo ∈ {day, week, month}).
+El periodo "total" agrega todas las filas (también las que no tienen fecha).
+
+Se construye una vez a partir del dataset tipado y se guarda en
+<cache>/rollup_<dataset>.parquet con la firma del CSV de origen, de modo que se
+reconstruye sólo cuando cambian los datos. Primero se suman por (país, [grupo etario],
+día) todas las filas del mismo día (regiones, hojas de origen), también las cum_*. Sobre
+ese diario, las columnas de flujo (new_*, deaths, icu) se suman por periodo y llevan su
+acumulado `<métrica>_cum`; las columnas ya acumuladas (cum_*) toman el último día del
+periodo.
+"""
+import threading
+import pandas as pd
+from covid_stats_app import data_loader as dl
+from covid_stats_app import storage
+
+ROLLUP_VERSION = "2"
+PERIODS = ("day", "week", "month", "total")
+
+DIMENSIONS = {
+    "notifications": ["country_code"],
+    "hospitalizations": ["country_code"],
+    "deaths_by_age": ["country_code", "age_group"],
+}
+
+_cubes = {}
+_lock = threading.Lock()
+
+def _is_cumulative(metric):
+    return metric.startswith("cum_")
+
+def _period_start(dates, period):
+    if period == "day":
+        return dates.dt.normalize()
+    if period == "week":
+        return dates.dt.to_period("W").dt.start_time
+    if period == "month":
+        return dates.dt.to_period("M").dt.to_timestamp()
+    if period == "total":
+        return pd.Series(pd.NaT, index=dates.index, dtype=dates.dtype)
+    raise ValueError(f"Periodo no soportado: {period}")
+
+def _aggregate(df, keys, metrics, cum_how="last", running=True):
+    """
+    Agrega `metrics` por `keys` (la última clave es period_start) y, con `running`, añade
+    los acumulados de los flujos. Las columnas cum_* toman el último valor (filas de una
+    misma serie) o se suman (`cum_how="sum"`, al colapsar series distintas).
+    """
+    flows = [m for m in metrics if not _is_cumulative(m)]
+    cums = [m for m in metrics if _is_cumulative(m)]
+    g = df.groupby(keys, dropna=False, sort=True, observed=True)
+    parts = []
+    if flows:
+        parts.append(g[flows].sum())
+    if cums:
+        parts.append(g[cums].sum() if cum_how == "sum" else g[cums].last())
+    out = pd.concat(parts, axis=1).reset_index() if parts else df[keys].drop_duplicates()
+    series_keys = keys[:-1]
+    if flows and running:
+        # los conteos compactos (Int8/Int16) se acumulan en Int64
+        vals = out[flows].astype('Int64')
+        if series_keys:
+            cum = vals.groupby([out[k] for k in series_keys], dropna=False, sort=False, observed=True).cumsum()
+        else:
+            cum = vals.cumsum()
+        for m in flows:
+            out[f"{m}_cum"] = cum[m]
+    return out
+
+def build_cube(df, dataset):
+    """Cubo largo con columna `period` a partir del dataset tipado `df`."""
+    dims = [d for d in DIMENSIONS[dataset] if d in df.columns]
+    metrics = [m for m in dl.METRIC_COLUMNS[dataset] if m in df.columns]
+    base = df[dims + ['date'] + metrics]
+    if not pd.api.types.is_datetime64_any_dtype(base['date']):
+        base = base.assign(date=pd.to_datetime(base['date'], errors='coerce'))
+    # totales diarios por serie: las filas de un mismo día se suman (también las cum_*)
+    base = _aggregate(base.assign(date=base['date'].dt.normalize()), dims + ['date'], metrics, cum_how="sum", running=False)
+    # el último valor de las columnas acumuladas debe respetar el orden temporal
+    base = base.sort_values('date', kind='mergesort', na_position='first')
+    dated = base[base['date'].notna()]
+    frames = []
+    for period in PERIODS:
+        src = base if period == "total" else dated
+        tmp = src[dims + metrics].assign(period_start=_period_start(src['date'], period))
+        agg = _aggregate(tmp, dims + ['period_start'], metrics)
+        agg.insert(0, 'period', period)
+        frames.append(agg)
+    return pd.concat(frames, ignore_index=True)
+
+def _cube_path(dataset):
+    return dl.get_cache_dir() / f"rollup_{dataset}.parquet"
+
+def get_cube(dataset, df=None):
+    """
+    Cubo del dataset. Con `df` se construye en memoria sin persistir; sin él se usa la copia
+    en disco si está al día con el CSV, o se reconstruye y guarda.
+    """
+    if df is not None:
+        return build_cube(df, dataset)
+    p = dl.source_path(dataset)
+    if p is None:
+        raise FileNotFoundError(f"No se encontró el CSV de {dataset}.")
+    sig = storage.file_signature(p)
+    with _lock:
+        hit = _cubes.get(dataset)
+        if hit is not None and hit[0] == sig:
+            return hit[1]
+        version = f"{dl.TYPED_VERSIONS[dataset]}.{ROLLUP_VERSION}"
+        cube = storage.read_typed(p, version, out_path=_cube_path(dataset))
+        if cube is None:
+            cube = build_cube(dl.LOADERS[dataset](), dataset)
+            storage.write_typed(cube, p, version, out_path=_cube_path(dataset))
+        _cubes[dataset] = (sig, cube)
+        return cube
+
+def rollup(dataset, period="day", by=("country_code",), metrics=None, df=None):
+    """
+    Agregado de `metrics` por `by` + period_start al periodo dado, leído del cubo.
+    `by` debe ser un subconjunto de las dimensiones del dataset; el resto se suma.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Periodo no soportado: {period}")
+    cube = get_cube(dataset, df=df)
+    dims = [d for d in DIMENSIONS[dataset] if d in cube.columns]
+    by = [b for b in (by or []) if b in dims]
+    metrics = [m for m in (metrics or dl.METRIC_COLUMNS[dataset]) if m in cube.columns]
+    sub = cube.loc[cube['period'] == period]
+    if by == dims:
+        keep = by + ['period_start'] + metrics + [f"{m}_cum" for m in metrics if f"{m}_cum" in cube.columns]
+        return sub[keep].reset_index(drop=True)
+    # colapsar dimensiones: los flujos se vuelven a sumar (el cubo ya es pequeño)
+    return _aggregate(sub, by + ['period_start'], metrics, cum_how="sum")
+
+def totals(dataset, by, metric, df=None):
+    """Total de `metric` por `by` sobre todo el periodo (p.ej. muertes por grupo etario)."""
+    out = rollup(dataset, "total", by=by, metrics=[metric], df=df)
+    return out[list(by) + [metric]]
@@ -1,8 +1,8 @@
 # stats.py
 import numpy as np
 import pandas as pd
-from scipy import stats
 from collections import Counter
+from covid_stats_app import instrument
 
 def safe_mean(series):
     s = pd.to_numeric(series, errors='coerce').dropna()
@@ -33,36 +33,261 @@ def safe_covariance(series_x, series_y):
     cov = np.cov(df.iloc[:, 0], df.iloc[:, 1], ddof=0)[0, 1]
     return float(cov)
 
-def fit_distributions(series, continuous=True):
+@instrument.traced("stats.fit_distributions", input_rows=True)
+def fit_distributions(series, continuous=True, candidates=None, ks_max_n=None, workers=None):
+    """
+    Ajusta distribuciones candidatas (ver fitting.py). Continuas: normal, gamma, lognormal y
+    weibull con p-valor K-S (sobre submuestra si hay más de `ks_max_n` puntos). Discretas:
+    poisson, binomial negativa por momentos y por máxima verosimilitud.
+    """
+    from covid_stats_app import fitting
     s = pd.to_numeric(series, errors='coerce').dropna()
-    res = []
     if len(s) < 5:
-        return res
-    if continuous:
-        mu = float(s.mean())
-        std = float(s.std(ddof=0))
-        if std > 0:
-            kstest = stats.kstest((s - mu) / std, 'norm')
-            res.append({'dist': 'normal', 'params': {'mu': mu, 'std': std}, 'kstest_pvalue': float(kstest.pvalue)})
+        return []
+    return fitting.fit_candidates(s.to_numpy(dtype='float64'), continuous=continuous, candidates=candidates,
+                                  ks_max_n=fitting.KS_MAX_N if ks_max_n is None else ks_max_n, workers=workers)
+
+@instrument.traced("stats.compute_summary", input_rows=True)
+def compute_summary(df, col, other=None, continuous=True):
+    """Resultado completo del botón 'Calcular estadísticas' para una columna."""
+    values = numeric(df[col])
+    summary = describe(values)
+    cov = safe_covariance(df[col], df[other]) if other else None
+    return {
+        'mean': summary['mean'], 'median': summary['median'], 'mode': summary['mode'], 'var': summary['var'],
+        'cov': cov, 'fits': fit_distributions(values, continuous=continuous),
+    }
+
+def cached_summary(fingerprint, df, col, other=None, continuous=True):
+    """
+    compute_summary con caché LRU compartida entre sesiones (result_cache.STATS_CACHE),
+    indexada por (huella del dataset, columna, otra columna, continua).
+    """
+    if fingerprint is None:
+        return compute_summary(df, col, other, continuous)
+    from covid_stats_app.result_cache import STATS_CACHE
+    key = (fingerprint, col, other, bool(continuous))
+    return STATS_CACHE.get_or_compute(key, lambda: compute_summary(df, col, other, continuous))
+
+# ---------- Resumen en una pasada y combinable (bloques / grupos) ----------
+# valores distintos que conserva por defecto el resumen por bloques: en columnas continuas
+# o acumuladas el conteo exacto crecería con cada bloque
+CHUNK_MAX_DISTINCT = 4096
+
+def _merge_moments(a, b):
+    """Combina (n, media, M2) de dos particiones (fórmula de Chan)."""
+    n = a[0] + b[0]
+    if n == 0:
+        return a
+    delta = b[1] - a[1]
+    mean = a[1] + delta * b[0] / n
+    m2 = a[2] + b[2] + delta * delta * a[0] * b[0] / n
+    return (n, mean, m2)
+
+def _median_from_counts(counts):
+    counts = counts.sort_index()
+    n = int(counts.sum())
+    cum = counts.cumsum().to_numpy()
+    values = counts.index.to_numpy(dtype='float64')
+    lo = values[np.searchsorted(cum, (n - 1) // 2, side='right')]
+    hi = values[np.searchsorted(cum, n // 2, side='right')]
+    return float((lo + hi) / 2)
+
+def _compress_counts(counts, bins):
+    """Reduce un conteo de valores a `bins` intervalos de igual ancho (centros como índice)."""
+    values = counts.index.to_numpy(dtype='float64')
+    edges = np.linspace(values.min(), values.max(), bins + 1)
+    idx = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, bins - 1)
+    centers = (edges[:-1] + edges[1:]) / 2
+    return pd.Series(counts.to_numpy(), index=centers[idx]).groupby(level=0).sum()
+
+class Summary:
+    """
+    Resumen combinable de una columna numérica: n, media y M2 (Welford/Chan) más el conteo
+    de valores en su dtype nativo, del que salen la moda y la mediana. Si se fija
+    `max_distinct` y hay más valores distintos, el conteo se agrupa en intervalos y la
+    mediana/moda pasan a ser aproximadas (`approximate=True`).
+    """
+    def __init__(self, count=0, mean=0.0, m2=0.0, counts=None, approximate=False, max_distinct=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.counts = counts if counts is not None else pd.Series(dtype='float64')
+        self.approximate = approximate
+        self.max_distinct = max_distinct
+        self._maybe_compress()
+
+    @classmethod
+    def from_series(cls, series, max_distinct=None):
+        # única conversión de la columna
+        s = series if pd.api.types.is_float_dtype(series) else pd.to_numeric(series, errors='coerce')
+        s = s.dropna()
+        if len(s) == 0:
+            return cls(max_distinct=max_distinct)
+        vals = s.to_numpy(dtype='float64')
+        mean = vals.mean()
+        return cls(len(vals), float(mean), float(((vals - mean) ** 2).sum()), s.value_counts(sort=False),
+                   max_distinct=max_distinct)
+
+    def _maybe_compress(self):
+        if self.max_distinct and len(self.counts) > self.max_distinct:
+            self.counts = _compress_counts(self.counts, self.max_distinct)
+            self.approximate = True
+
+    def merge(self, other):
+        """Nuevo Summary que combina dos particiones (bloques, grupos)."""
+        n, mean, m2 = _merge_moments((self.count, self.mean, self.m2), (other.count, other.mean, other.m2))
+        if len(self.counts) == 0:
+            counts = other.counts
+        elif len(other.counts) == 0:
+            counts = self.counts
+        else:
+            counts = self.counts.add(other.counts, fill_value=0)
+        return Summary(n, mean, m2, counts, self.approximate or other.approximate,
+                       self.max_distinct or other.max_distinct)
+
+    def variance(self, ddof=0):
+        return float(self.m2 / (self.count - ddof)) if self.count > ddof else None
+
+    def median(self):
+        return _median_from_counts(self.counts) if self.count > 0 else None
+
+    def mode(self):
+        if self.count == 0:
+            return None
+        # entre empates, el menor valor: no depende del orden en que se combinaron los bloques
+        freq = int(self.counts.max())
+        top = self.counts.index[self.counts.to_numpy() == freq].min()
+        top = top.item() if hasattr(top, 'item') else top
+        return {'mode': top, 'count': freq}
+
+    def to_dict(self, ddof=0):
+        return {
+            'count': int(self.count),
+            'mean': float(self.mean) if self.count > 0 else None,
+            'median': self.median(),
+            'mode': self.mode(),
+            'var': self.variance(ddof),
+            'approximate': self.approximate,
+        }
+
+def numeric(series):
+    """Columna convertida a numérica sin nulos; se hace una vez y se reutiliza."""
+    return pd.to_numeric(series, errors='coerce').dropna()
+
+@instrument.traced("stats.describe", input_rows=True)
+def describe(series, ddof=0, max_distinct=None):
+    """Media, mediana, moda y varianza en una sola conversión de la columna."""
+    return Summary.from_series(series, max_distinct=max_distinct).to_dict(ddof)
+
+def summarize_chunks(chunks, col, ddof=0, max_distinct=CHUNK_MAX_DISTINCT):
+    """
+    Igual que describe pero recorriendo bloques (p.ej. data_loader.iter_chunks) sin
+    materializar la columna completa; los resúmenes parciales se combinan con merge.
+    El conteo de valores se acota a `max_distinct` (mediana y moda aproximadas si se
+    supera); con None es exacto y crece con los valores distintos.
+    """
+    total = Summary(max_distinct=max_distinct)
+    for chunk in chunks:
+        if col in chunk.columns:
+            total = total.merge(Summary.from_series(chunk[col], max_distinct=max_distinct))
+    return total.to_dict(ddof)
+
+def covariance_chunks(chunks, col_x, col_y):
+    """Covarianza poblacional de dos columnas acumulando co-momentos por bloque."""
+    n, mx, my, c = 0, 0.0, 0.0, 0.0
+    for chunk in chunks:
+        if col_x not in chunk.columns or col_y not in chunk.columns:
+            continue
+        df = pd.concat([pd.to_numeric(chunk[col_x], errors='coerce'), pd.to_numeric(chunk[col_y], errors='coerce')], axis=1).dropna()
+        if df.shape[0] == 0:
+            continue
+        x = df.iloc[:, 0].to_numpy(dtype='float64')
+        y = df.iloc[:, 1].to_numpy(dtype='float64')
+        nb, mxb, myb = len(x), x.mean(), y.mean()
+        cb = float(((x - mxb) * (y - myb)).sum())
+        tot = n + nb
+        c += cb + (mxb - mx) * (myb - my) * n * nb / tot
+        mx += (mxb - mx) * nb / tot
+        my += (myb - my) * nb / tot
+        n = tot
+    return float(c / n) if n > 0 else None
+
+# ---------- Estadísticos por grupo (vectorizados) ----------
+GROUP_KEYS = ('country_code', 'age_group', 'month')
+
+def _group_frame(df, cols, by):
+    """Claves de grupo + columnas numéricas; 'month' se deriva de 'date' si no existe."""
+    by = [by] if isinstance(by, str) else list(by)
+    out = {}
+    for k in by:
+        if k == 'month' and 'month' not in df.columns:
+            out[k] = pd.to_datetime(df['date'], errors='coerce').dt.to_period('M').dt.to_timestamp()
         else:
-            res.append({'dist': 'normal', 'params': {'mu': mu, 'std': std}, 'kstest_pvalue': None})
-        try:
-            a, loc, scale = stats.gamma.fit(s, floc=0)
-            kstest = stats.kstest(s, 'gamma', args=(a, loc, scale))
-            res.append({'dist': 'gamma', 'params': {'a': float(a), 'loc': float(loc), 'scale': float(scale)}, 'kstest_pvalue': float(kstest.pvalue)})
-        except Exception:
-            pass
+            out[k] = df[k]
+    for c in cols:
+        out[c] = pd.to_numeric(df[c], errors='coerce').astype('float64')
+    return pd.DataFrame(out), by
+
+@instrument.traced("stats.grouped_describe", input_rows=True)
+def grouped_describe(df, col, by, ddof=0):
+    """count/mean/median/mode/var de `col` por cada grupo de `by` en una tabla."""
+    frame, by = _group_frame(df, [col], by)
+    frame = frame.dropna(subset=[col])
+    g = frame.groupby(by, observed=True, sort=True)[col]
+    out = g.agg(['count', 'mean', 'median'])
+    out['var'] = g.var(ddof=ddof)
+    # moda: frecuencia de cada (grupo, valor) y el primero con mayor frecuencia
+    freq = frame.groupby(by + [col], observed=True).size().rename('mode_count').reset_index()
+    freq = freq.sort_values(by + ['mode_count', col], ascending=[True] * len(by) + [False, True], kind='mergesort')
+    mode = freq.drop_duplicates(by).set_index(by).rename(columns={col: 'mode'})
+    return out.join(mode[['mode', 'mode_count']]).reset_index()
+
+@instrument.traced("stats.grouped_covariance", input_rows=True)
+def grouped_covariance(df, col_x, col_y, by):
+    """
+    Covarianza poblacional de dos columnas por grupo: media de (x - media_g(x))(y - media_g(y)).
+    Se centra antes de multiplicar; E[xy] - E[x]E[y] se cancela con conteos grandes.
+    """
+    frame, by = _group_frame(df, [col_x, col_y], by)
+    frame = frame.dropna(subset=[col_x, col_y])
+    g = frame.groupby(by, observed=True, sort=True)
+    means = g[[col_x, col_y]].transform('mean')
+    frame['cov'] = (frame[col_x] - means[col_x]) * (frame[col_y] - means[col_y])
+    return frame.groupby(by, observed=True, sort=True)['cov'].mean().reset_index()
+
+@instrument.traced("stats.grouped_fit", input_rows=True)
+def grouped_fit(df, col, by, continuous=True, min_size=5):
+    """
+    Parámetros de los mismos ajustes que fit_distributions, para todos los grupos a la vez.
+    Devuelve una tabla larga: claves, dist, param, value. Sin K-S (sólo parámetros); para
+    ajustes completos con K-S por grupo ver fitting.fit_groups.
+    """
+    frame, by = _group_frame(df, [col], by)
+    frame = frame.dropna(subset=[col])
+    g = frame.groupby(by, observed=True, sort=True)[col]
+    base = g.agg(['count', 'mean'])
+    base['var'] = g.var(ddof=0)
+    base = base[base['count'] >= min_size]
+    parts = []
+    if continuous:
+        parts.append(pd.DataFrame({'dist': 'normal', 'mu': base['mean'], 'std': np.sqrt(base['var'])}))
+        pos = frame[frame[col] > 0]
+        logm = pos.assign(_log=np.log(pos[col])).groupby(by, observed=True)['_log'].mean()
+        gp = pos.groupby(by, observed=True)[col].agg(['count', 'mean']).join(logm)
+        gp = gp[(gp['count'] >= min_size) & (gp['count'] == base['count'].reindex(gp.index))]
+        sgap = np.log(gp['mean']) - gp['_log']
+        gp = gp[sgap > 0]
+        from covid_stats_app import fitting
+        a = pd.Series(fitting.gamma_shape(sgap[sgap > 0].to_numpy()), index=gp.index)
+        parts.append(pd.DataFrame({'dist': 'gamma', 'a': a, 'loc': 0.0, 'scale': gp['mean'] / a}))
     else:
-        lam = float(s.mean())
-        res.append({'dist': 'poisson', 'params': {'lambda': lam}})
-        try:
-            mean = float(s.mean())
-            var = float(s.var(ddof=0))
-            if var > mean and mean > 0:
-                p = mean / var
-                if p < 1:
-                    r = mean * p / (1 - p)
-                    res.append({'dist': 'nbinom_mom', 'params': {'r': float(r), 'p': float(p)}})
-        except Exception:
-            pass
-    return res
+        parts.append(pd.DataFrame({'dist': 'poisson', 'lambda': base['mean']}))
+        nb = base[(base['var'] > base['mean']) & (base['mean'] > 0)]
+        p = nb['mean'] / nb['var']
+        parts.append(pd.DataFrame({'dist': 'nbinom_mom', 'r': nb['mean'] * p / (1 - p), 'p': p}))
+    parts = [p.reset_index() for p in parts if len(p)]
+    if not parts:
+        return pd.DataFrame(columns=by + ['dist', 'param', 'value'])
+    long = [p.melt(id_vars=by + ['dist'], var_name='param', value_name='value') for p in parts]
+    return pd.concat(long, ignore_index=True).dropna(subset=['value']).sort_values(by + ['dist'], kind='mergesort').reset_index(drop=True)
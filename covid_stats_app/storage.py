@@ -0,0 +1,335 @@
+# storage.py
+"""
+Copias tipadas (Parquet) de los CSV finales.
+
+Cada CSV tiene un Parquet hermano (mismo nombre, extensión .parquet) con las columnas
+ya coercionadas. En los metadatos del Parquet se guarda la firma del CSV de origen
+(mtime, tamaño y sha1); la copia se reconstruye sólo cuando esa firma cambia.
+
+Además, cada dataset tipado puede materializarse como archivo Arrow IPC sin comprimir
+(`write_shared`) y abrirse por memory-map (`read_shared`): los procesos del servidor
+comparten así las páginas del archivo en la caché del sistema en vez de tener cada uno
+su copia deserializada.
+"""
+from pathlib import Path
+import os
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("storage")
+
+# pyarrow se importa en el primer uso para no pagarlo en el arranque
+pa = pq = None
+_arrow_checked = False
+
+def _arrow():
+    global pa, pq, _arrow_checked
+    if not _arrow_checked:
+        _arrow_checked = True
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            pa, pq = pyarrow, pyarrow.parquet
+        except Exception:
+            logger.warning("pyarrow no disponible. Las copias Parquet tipadas quedan desactivadas.")
+    return pa is not None
+
+META_KEY = b"covid_stats_app.source"
+# filas por row group: acota la memoria al leer las copias por lotes
+ROW_GROUP_SIZE = 128 * 1024
+_HASH_BLOCK = 1 << 20
+
+def enabled():
+    if os.getenv("COVID_PARQUET_CACHE", "1").lower() in ("0", "false", "no"):
+        return False
+    return _arrow()
+
+def typed_path(csv_path):
+    return Path(csv_path).with_suffix(".parquet")
+
+def file_signature(path):
+    st = Path(path).stat()
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+def file_sha1(path, limit=None):
+    """sha1 del archivo; con `limit` sólo de los primeros `limit` bytes."""
+    h = hashlib.sha1()
+    remaining = limit
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            n = _HASH_BLOCK if remaining is None else min(_HASH_BLOCK, remaining)
+            block = f.read(n)
+            if not block:
+                break
+            h.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return h.hexdigest()
+
+def read_meta(parquet_path):
+    try:
+        meta = pq.read_schema(parquet_path).metadata or {}
+        raw = meta.get(META_KEY)
+        return json.loads(raw) if raw else None
+    except Exception:
+        return None
+
+def _is_fresh(csv_path, meta, version, pq_path=None):
+    """
+    True si la copia con metadatos `meta` corresponde al CSV actual. Si sólo cambió el
+    mtime y el sha1 coincide, se guarda la firma nueva en `pq_path` para que las cargas
+    siguientes no vuelvan a leer el CSV entero.
+    """
+    if not meta or meta.get("version") != version:
+        return False
+    sig = file_signature(csv_path)
+    if sig["mtime_ns"] == meta.get("mtime_ns") and sig["size"] == meta.get("size"):
+        return True
+    # mtime distinto (p.ej. archivo copiado de nuevo): comparar contenido
+    if sig["size"] != meta.get("size") or file_sha1(csv_path) != meta.get("sha1"):
+        return False
+    if pq_path is not None:
+        _refresh_signature(pq_path, {**meta, **sig})
+    return True
+
+def write_table_atomic(table, out_path):
+    out_path = Path(out_path)
+    tmp = out_path.with_name(f".{out_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp, out_path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return out_path
+
+def _with_meta(table, meta):
+    schema_meta = dict(table.schema.metadata or {})
+    schema_meta[META_KEY] = json.dumps(meta).encode("utf-8")
+    return table.replace_schema_metadata(schema_meta)
+
+def _refresh_signature(pq_path, meta):
+    """Reescribe la copia con `meta` (los metadatos van en el pie del Parquet)."""
+    try:
+        write_table_atomic(_with_meta(pq.read_table(pq_path), meta), pq_path)
+    except Exception as e:
+        logger.warning("No se pudo actualizar la firma de %s: %s", pq_path, e)
+
+def write_typed(df, csv_path, version, out_path=None):
+    """
+    Escribe la copia tipada de `csv_path` (o un artefacto derivado en `out_path`) con la firma
+    del CSV en los metadatos. Devuelve la ruta o None si no se pudo escribir.
+    """
+    if not enabled():
+        return None
+    meta = file_signature(csv_path)
+    meta["sha1"] = source_sha1(csv_path)
+    meta["version"] = version
+    try:
+        table = _with_meta(pa.Table.from_pandas(df, preserve_index=False), meta)
+        out_path = Path(out_path) if out_path is not None else typed_path(csv_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        return write_table_atomic(table, out_path)
+    except Exception as e:
+        logger.warning("No se pudo escribir la copia Parquet de %s: %s", csv_path, e)
+        return None
+
+def read_typed(csv_path, version, columns=None, out_path=None):
+    """Lee la copia tipada (o el artefacto `out_path`) si está al día con el CSV; si no, None."""
+    if not enabled():
+        return None
+    pq_path = Path(out_path) if out_path is not None else typed_path(csv_path)
+    if not pq_path.exists():
+        return None
+    meta = read_meta(pq_path)
+    try:
+        if not _is_fresh(csv_path, meta, version, pq_path):
+            return None
+        if columns is not None:
+            names = set(pq.read_schema(pq_path).names)
+            columns = [c for c in columns if c in names]
+        return pd.read_parquet(pq_path, columns=columns, engine="pyarrow")
+    except Exception as e:
+        logger.warning("Copia Parquet ilegible (%s), se reconstruye desde CSV: %s", pq_path, e)
+        return None
+
+def iter_typed(csv_path, version, batch_size, columns=None):
+    """Iterador de DataFrames por lotes de la copia tipada si está al día; si no, None."""
+    if not enabled():
+        return None
+    pq_path = typed_path(csv_path)
+    if not pq_path.exists() or not _is_fresh(csv_path, read_meta(pq_path), version, pq_path):
+        return None
+    pf = pq.ParquetFile(pq_path)
+    if columns is not None:
+        columns = [c for c in columns if c in pf.schema_arrow.names]
+    return (batch.to_pandas() for batch in pf.iter_batches(batch_size=batch_size, columns=columns))
+
+def read_typed_any(csv_path):
+    """Lee la copia tipada sin comprobar si está al día. Devuelve (df, meta) o (None, None)."""
+    if not enabled():
+        return None, None
+    pq_path = typed_path(csv_path)
+    if not pq_path.exists():
+        return None, None
+    try:
+        return pd.read_parquet(pq_path, engine="pyarrow"), read_meta(pq_path)
+    except Exception:
+        return None, None
+
+def read_appended(csv_path, meta, version):
+    """
+    Si desde que se generó la copia tipada el CSV sólo ha crecido por el final, devuelve
+    (cabecera, bytes nuevos); si cambió cualquier byte anterior, None. El sha1 del prefijo
+    se continúa con la cola y se memoriza como sha1 del CSV, así la copia nueva no vuelve
+    a leer el archivo. El prefijo sí se lee entero (lectura secuencial y hash, O(tamaño)).
+    """
+    if not meta or meta.get("version") != version:
+        return None
+    old = meta.get("size")
+    sig = file_signature(csv_path)
+    if not old or sig["size"] <= old:
+        return None
+    h = hashlib.sha1()
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        f.seek(0)
+        remaining, block = old, b""
+        while remaining > 0:
+            block = f.read(min(_HASH_BLOCK, remaining))
+            if not block:
+                return None
+            h.update(block)
+            remaining -= len(block)
+        # la versión anterior debe terminar en una fila completa
+        if not block.endswith(b"\n") or h.hexdigest() != meta.get("sha1"):
+            return None
+        tail = f.read(sig["size"] - old)
+    h.update(tail)
+    _sha1_memo[str(csv_path)] = (sig, h.hexdigest())
+    return header, tail
+
+_sha1_memo = {}
+
+def source_sha1(csv_path):
+    """
+    sha1 del CSV. Se toma de los metadatos de la copia tipada si su firma coincide; si no,
+    se calcula (y se memoriza por firma en el proceso).
+    """
+    sig = file_signature(csv_path)
+    key = str(csv_path)
+    hit = _sha1_memo.get(key)
+    if hit is not None and hit[0] == sig:
+        return hit[1]
+    sha1 = None
+    if enabled() and typed_path(csv_path).exists():
+        meta = read_meta(typed_path(csv_path))
+        if meta and meta.get("mtime_ns") == sig["mtime_ns"] and meta.get("size") == sig["size"]:
+            sha1 = meta.get("sha1")
+    sha1 = sha1 or file_sha1(csv_path)
+    _sha1_memo[key] = (sig, sha1)
+    return sha1
+
+def typed_num_rows(csv_path, version):
+    """Filas de la copia tipada (leídas de los metadatos Parquet) o None si no está al día."""
+    if not enabled():
+        return None
+    pq_path = typed_path(csv_path)
+    if not pq_path.exists():
+        return None
+    try:
+        if not _is_fresh(csv_path, read_meta(pq_path), version, pq_path):
+            return None
+        return pq.read_metadata(pq_path).num_rows
+    except Exception:
+        return None
+
+# ---------- Arrow IPC compartido por memory-map ----------
+def shared_path(shared_dir, name, csv_path, version):
+    """
+    Ruta del IPC de `name` para el contenido actual del CSV. El nombre lleva la versión de
+    la coerción y el sha1 del origen: un CSV nuevo produce un archivo nuevo y los procesos
+    que aún mapean el anterior siguen leyéndolo sin cortes.
+    """
+    return Path(shared_dir) / f"{name}-v{version}-{source_sha1(csv_path)[:16]}.arrow"
+
+def write_shared(df, path):
+    """Escribe `df` como Arrow IPC sin compresión (condición para mapearlo sin copia)."""
+    if not enabled():
+        return None
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # un único lote: cada columna es un búfer contiguo que se puede mapear tal cual
+        with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+        return path
+    except Exception as e:
+        logger.warning("No se pudo escribir el IPC compartido %s: %s", path, e)
+        return None
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+def _masked_int(col, dtype):
+    """Columna entera Arrow -> IntegerArray de pandas sobre el mismo búfer (sin copia)."""
+    arr = col.chunk(0) if col.num_chunks == 1 else col.combine_chunks()
+    np_type = np.dtype(dtype.numpy_dtype)
+    data = np.frombuffer(arr.buffers()[1], dtype=np_type, count=len(arr), offset=arr.offset * np_type.itemsize)
+    if arr.null_count:
+        mask = arr.is_null().to_numpy(zero_copy_only=False)
+    else:
+        # np.zeros no toca las páginas hasta que se escriben
+        mask = np.zeros(len(arr), dtype=bool)
+    return pd.arrays.IntegerArray(data, mask, copy=False)
+
+def read_shared(path, columns=None):
+    """
+    Abre el IPC por memory-map y lo convierte a pandas sin copiar las columnas que lo
+    permiten (numéricas, enteros nullable, fechas y códigos de categóricas; los búferes
+    quedan de sólo lectura). None si no existe.
+    """
+    if not enabled():
+        return None
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+        if columns is not None:
+            table = table.select([c for c in columns if c in table.column_names])
+        # pandas copia los enteros nullable al convertirlos: se montan aparte sobre el mapa
+        pd_types = {c["name"]: c.get("numpy_type") for c in (table.schema.pandas_metadata or {}).get("columns", [])}
+        ints = {name: pd.api.types.pandas_dtype(pd_types[name]) for name in table.column_names
+                if str(pd_types.get(name, "")).startswith(("Int", "UInt")) and pa.types.is_integer(table.schema.field(name).type)}
+        rest = table.drop_columns(list(ints)).to_pandas(split_blocks=True)
+        # el constructor con copy=False conserva los búferes (asignar columna a columna copia)
+        return pd.DataFrame({name: _masked_int(table.column(name), ints[name]) if name in ints else rest[name]
+                             for name in table.column_names}, copy=False)
+    except Exception as e:
+        logger.warning("IPC compartido ilegible (%s), se regenera: %s", path, e)
+        return None
+
+def prune_shared(shared_dir, name, keep):
+    """
+    Borra las versiones anteriores del IPC de `name`. En POSIX los procesos que aún las
+    mapean no se ven afectados (el archivo vive hasta que se desmapea).
+    """
+    removed = []
+    for old in Path(shared_dir).glob(f"{name}-v*.arrow"):
+        if old.name == Path(keep).name:
+            continue
+        try:
+            old.unlink()
+            removed.append(old)
+        except OSError as e:
+            # p.ej. Windows con el archivo aún mapeado: se reintenta en el próximo cambio
+            logger.info("No se pudo borrar %s: %s", old, e)
+    return removed
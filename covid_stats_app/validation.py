@@ -0,0 +1,273 @@
+# validation.py
+"""
+Validación de los datasets en una sola pasada vectorizada al cargarlos (después de la
+coerción y antes de guardar la copia tipada).
+
+Se limpia lo que antes descartaba cada función por su cuenta:
+  * filas sin fecha válida (fechas vacías o no parseables)     -> se eliminan
+  * filas duplicadas exactas                                    -> se eliminan
+  * códigos de país con espacios o minúsculas                   -> se normalizan
+Y se informa, sin tocar los datos, de lo que requiere criterio humano:
+  * conteos negativos y acumulados que disminuyen (correcciones de la fuente)
+  * claves (fecha, país[, grupo etario]) repetidas (p.ej. varias hojas de origen)
+  * códigos que no son ISO3 o que no se pudieron resolver
+  * valores numéricos ausentes o que no se pudieron convertir
+
+Los DataFrames validados llevan df.attrs["validated"] = True; las funciones de agregado
+y de gráficos lo usan para saltarse sus copias, coerciones y dropna.
+"""
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("validation")
+
+ATTR = "validated"
+ISO3_PATTERN = r"[A-Z]{3}"
+MAX_EXAMPLES = 5
+
+# claves que identifican una fila de cada dataset; "country_code" se sustituye por
+# "country" en los CSV que sólo traen el nombre (p.ej. hospitalizaciones)
+KEYS = {
+    "notifications": ["date", "country_code"],
+    "hospitalizations": ["date", "country_code"],
+    "deaths_by_age": ["date", "country_code", "age_group"],
+}
+
+def keys_for(key, df):
+    """Columnas clave de `key` presentes en `df` (con "country" si falta "country_code")."""
+    out = []
+    for k in KEYS.get(key, []):
+        if k == "country_code" and k not in df.columns:
+            k = "country"
+        if k in df.columns:
+            out.append(k)
+    return out
+
+def mark(df):
+    """Marca `df` como validado (se propaga a recortes y copias) y lo devuelve."""
+    df.attrs[ATTR] = True
+    return df
+
+def is_validated(df):
+    return bool(getattr(df, "attrs", {}).get(ATTR))
+
+def _examples(series):
+    counts = series.value_counts(dropna=False).head(MAX_EXAMPLES)
+    return {("<vacío>" if pd.isna(k) else str(k)): int(v) for k, v in counts.items()}
+
+def _check(name, rows, action, column=None, examples=None):
+    return {"check": name, "column": column, "rows": int(rows), "action": action, "examples": examples or {}}
+
+def _decreases(df, col, groups):
+    """Filas en que el acumulado `col` baja respecto a la fecha anterior de su serie."""
+    sub = df[groups + ["date", col]].dropna(subset=[col]).sort_values(groups + ["date"], kind="mergesort")
+    if groups:
+        diff = sub.groupby(groups, observed=True, dropna=False, sort=False)[col].diff()
+    else:
+        # sin columna de país todo el dataset es una sola serie
+        diff = sub[col].diff()
+    bad = (diff < 0).fillna(False).astype(bool).to_numpy()
+    return int(bad.sum()), sub.loc[bad, groups[0]] if groups else None
+
+def _bad_dates(df):
+    """NaT tras la coerción = fecha vacía o no parseable."""
+    return df["date"].isna() if "date" in df.columns else pd.Series(True, index=df.index)
+
+def _normalize_codes(df):
+    """Códigos de país sin espacios y en mayúsculas; vacíos y "nan"/"none" -> NA."""
+    codes = df["country_code"].astype("str").str.strip().str.upper()
+    codes = codes.mask(codes.isin(["", "NAN", "NONE", "<NA>"]) | df["country_code"].isna())
+    df["country_code"] = codes
+    return codes
+
+def validate(df, key, metrics=()):
+    """
+    Valida y limpia el dataset `key` ya coercionado. Devuelve (df limpio, informe). El
+    informe lista cada comprobación con las filas afectadas, la acción y ejemplos.
+    """
+    rows_in = len(df)
+    checks = []
+    label = "country" if "country" in df.columns else "country_code"
+
+    bad_date = _bad_dates(df)
+    n = int(bad_date.sum())
+    checks.append(_check("invalid_date", n, "dropped", "date", _examples(df.loc[bad_date, label]) if n and label in df.columns else None))
+    if n:
+        df = df.loc[~bad_date.to_numpy()]
+
+    dup_rows = df.duplicated()
+    n = int(dup_rows.sum())
+    checks.append(_check("duplicate_row", n, "dropped"))
+    if n:
+        df = df.loc[~dup_rows.to_numpy()]
+    df = df.reset_index(drop=True)
+
+    if "country_code" in df.columns:
+        codes = _normalize_codes(df)
+        unresolved = ~codes.str.fullmatch(ISO3_PATTERN).fillna(False).astype(bool)
+        n = int(unresolved.sum())
+        examples = None
+        if n:
+            # código ausente: el nombre del país dice qué no se resolvió
+            shown = codes.where(codes.notna(), "<sin código> " + df[label].astype("str")) if label in df.columns else codes
+            examples = _examples(shown[unresolved])
+        checks.append(_check("unresolved_iso3", n, "kept", "country_code", examples))
+
+    for c in metrics:
+        if c not in df.columns:
+            continue
+        values = df[c]
+        n = int(values.isna().sum())
+        checks.append(_check("missing_value", n, "kept (NA)", c))
+        neg = (values < 0).fillna(False).astype(bool)
+        n = int(neg.sum())
+        checks.append(_check("negative_count", n, "kept", c, _examples(df.loc[neg.to_numpy(), label]) if n and label in df.columns else None))
+        if c.startswith("cum_"):
+            groups = [g for g in keys_for(key, df) if g != "date"]
+            n, where = _decreases(df, c, groups)
+            checks.append(_check("cumulative_decrease", n, "kept", c, _examples(where) if n and where is not None else None))
+
+    keys = keys_for(key, df)
+    if keys:
+        dup_keys = df.duplicated(keys, keep=False)
+        n = int(df.duplicated(keys).sum())
+        examples = _examples(df.loc[dup_keys.to_numpy(), "source_sheet"]) if n and "source_sheet" in df.columns else None
+        checks.append(_check("duplicate_key", n, "kept", ",".join(keys), examples))
+
+    report = {"dataset": key, "rows_in": int(rows_in), "rows_out": int(len(df)), "checks": checks}
+    issues = {c["check"]: c["rows"] for c in checks if c["rows"]}
+    if issues:
+        logger.info("Validación de %s: %s", key, issues)
+    return mark(df), report
+
+def _subtract(check, base):
+    """Filas y ejemplos de `check` que no estaban ya en `base` (la misma comprobación)."""
+    out = dict(check, rows=check["rows"] - (base["rows"] if base else 0), examples={})
+    for k, v in check["examples"].items():
+        v -= base["examples"].get(k, 0) if base else 0
+        if v > 0:
+            out["examples"][k] = v
+    return out
+
+def _add(check, other):
+    check["rows"] += other["rows"]
+    for k, v in other["examples"].items():
+        check["examples"][k] = check["examples"].get(k, 0) + v
+
+def validate_appended(cached, new, key, metrics, previous):
+    """
+    Valida sólo las filas `new` añadidas al final del dataset `cached` (ya validado) en la
+    ingesta incremental. Se validan junto con su contexto en `cached`: las filas de las
+    mismas fechas (duplicados exactos y de clave) y la última fecha de cada serie
+    (acumulados que bajan). Las cuentas nuevas son las del conjunto menos las del contexto
+    y se suman a `previous`, el informe de `cached`. Devuelve (filas nuevas limpias, informe).
+    Supone filas nuevas posteriores a las anteriores de su serie; si no, los acumulados que
+    bajan pueden contarse distinto que validando todo.
+    """
+    groups = [g for g in keys_for(key, cached) if g != "date"]
+    context = cached["date"].isin(new["date"].dropna().unique())
+    if groups:
+        last = cached.groupby(groups, observed=True, dropna=False, sort=False)["date"].transform("max")
+        context |= cached["date"] == last
+    context = cached.loc[context.to_numpy()]
+    # el contexto ya está limpio: no pierde filas y queda al principio del resultado
+    combined, report = validate(pd.concat([context, new], ignore_index=True), key, metrics)
+    _, base = validate(context.reset_index(drop=True), key, metrics)
+    base = {(c["check"], c["column"]): c for c in base["checks"]}
+    merged = {(c["check"], c["column"]): c for c in previous.get("checks", [])}
+    for c in report["checks"]:
+        delta = _subtract(c, base.get((c["check"], c["column"])))
+        old = merged.get((c["check"], c["column"]))
+        if old is None:
+            merged[(c["check"], c["column"])] = delta
+        else:
+            _add(old, delta)
+    tail = combined.iloc[len(context):].reset_index(drop=True)
+    report = {"dataset": key, "rows_in": int(previous.get("rows_in", 0)) + len(new),
+              "rows_out": int(previous.get("rows_out", 0)) + len(tail), "checks": list(merged.values())}
+    return mark(tail), report
+
+def _hashable(df):
+    """
+    Misma representación de cada columna en todos los bloques: fechas en ns (la unidad que
+    infiere to_datetime depende del bloque) y las columnas sin ningún valor como texto nulo
+    (read_csv las lee como float).
+    """
+    cols = {}
+    for c, s in df.items():
+        if pd.api.types.is_datetime64_any_dtype(s):
+            s = s.dt.as_unit("ns")
+        elif s.dtype.kind == "f" and s.isna().all():
+            s = s.astype("str")
+        cols[c] = s
+    return pd.DataFrame(cols, copy=False)
+
+class SeenRows:
+    """
+    Huellas de 64 bits (ordenadas) de las filas ya emitidas en un recorrido por bloques,
+    para descartar también los duplicados exactos que caen en bloques distintos. Ocupa
+    8 bytes por fila conservada.
+    """
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def first_seen(self, df):
+        """Máscara de las filas de `df` que no habían aparecido antes; las registra."""
+        hashes = pd.util.hash_pandas_object(_hashable(df), index=False).to_numpy()
+        keep = ~pd.Series(hashes).duplicated().to_numpy()
+        pos = np.searchsorted(self.hashes, hashes)
+        found = pos < len(self.hashes)
+        found[found] = self.hashes[pos[found]] == hashes[found]
+        keep &= ~found
+        merged = np.concatenate([self.hashes, hashes[keep]])
+        # dos tramos ya ordenados: el sort estable (timsort) los fusiona en tiempo lineal
+        merged.sort(kind="stable")
+        self.hashes = merged
+        return keep
+
+def clean(df, key, seen=None):
+    """
+    Sólo la limpieza de validate, sin informe ni log (para los bloques del modo streaming).
+    Con `seen` (un SeenRows compartido por todo el recorrido) los duplicados se buscan
+    también en los bloques anteriores; sin él, sólo dentro de `df`.
+    """
+    bad_date = _bad_dates(df).to_numpy()
+    if bad_date.any():
+        df = df.loc[~bad_date]
+    keep = seen.first_seen(df) if seen is not None else ~df.duplicated().to_numpy()
+    df = df.loc[keep].reset_index(drop=True)
+    if "country_code" in df.columns:
+        _normalize_codes(df)
+    return mark(df)
+
+_report_lock = threading.Lock()
+
+def write_report(path, report):
+    path = Path(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with _report_lock, open(tmp, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+    except Exception as e:
+        logger.warning("No se pudo guardar el informe de calidad %s: %s", path, e)
+
+def read_report(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def report_frame(report):
+    """Tabla de comprobaciones de un informe (para mostrarla o exportarla)."""
+    rows = [{"dataset": report.get("dataset"), **{k: v for k, v in c.items() if k != "examples"},
+             "examples": ", ".join(f"{k} ({v})" for k, v in c["examples"].items())} for c in report.get("checks", [])]
+    return pd.DataFrame(rows, columns=["dataset", "check", "column", "rows", "action", "examples"])
@@ -0,0 +1,188 @@
+# worker.py
+"""
+Worker de precálculo: vigila los CSV de COVID_DATA_DIR y, cuando cambian, regenera fuera
+de las peticiones los agregados CSV, los cubos de rollups, los indicadores y las
+animaciones HTML de processed/.
+
+Todo se escribe primero en processed/.staging y después cada archivo se mueve a su sitio
+con os.replace, de modo que la app nunca lee un artefacto a medio escribir. El estado se
+publica en processed/worker_status.json.
+
+Uso:
+  python -m covid_stats_app.worker            # vigila en primer plano
+  python -m covid_stats_app.worker --once     # una sola regeneración si hay cambios
+La app lo arranca como hilo daemon (COVID_WORKER=0 lo desactiva).
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from covid_stats_app import data_loader as dl
+from covid_stats_app import preprocess
+from covid_stats_app import storage
+
+logger = logging.getLogger("worker")
+
+INTERVAL = float(os.getenv("COVID_WORKER_INTERVAL", "30"))
+LITE = os.getenv("COVID_WORKER_LITE", "1").lower() not in ("0", "false", "no")
+STATUS_NAME = "worker_status.json"
+
+_thread = None
+_start_lock = threading.Lock()
+_run_lock = threading.Lock()
+
+def enabled():
+    return os.getenv("COVID_WORKER", "1").lower() not in ("0", "false", "no")
+
+def status_path():
+    return preprocess.get_processed_dir() / STATUS_NAME
+
+def read_status():
+    """Estado publicado por el worker, o None si aún no ha corrido."""
+    try:
+        with open(status_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def _write_status(status):
+    p = status_path()
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_name(f".{p.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(status, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, p)
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+def sources_state():
+    """Firma (mtime_ns, tamaño) de cada CSV de origen disponible."""
+    state = {}
+    for key in dl.EXPECTED_FILES:
+        p = dl.source_path(key)
+        if p is not None:
+            sig = storage.file_signature(p)
+            state[key] = [sig["mtime_ns"], sig["size"]]
+    return state
+
+def _changed(state, status):
+    if not status:
+        return list(state)
+    # artefactos borrados a mano también fuerzan la regeneración
+    out_dir = preprocess.get_processed_dir()
+    if any(not (out_dir / name).exists() for name in status.get("artifacts", [])):
+        return list(state)
+    seen = status.get("sources") or {}
+    # un dataset que falló no se reintenta hasta que cambie su CSV (el fallo se repetiría)
+    failed = status.get("failed") or {}
+    return [k for k, sig in state.items() if seen.get(k) != sig and (failed.get(k) or {}).get("source") != sig]
+
+def _swap_in(staging, out_dir):
+    """Mueve cada archivo generado a processed/ (os.replace es atómico en el mismo disco)."""
+    moved = []
+    for p in sorted(staging.iterdir()):
+        if p.is_file():
+            os.replace(p, out_dir / p.name)
+            moved.append(p.name)
+    return moved
+
+def _regenerate(dataset, staging, workers, lite):
+    """Artefactos de un dataset en `staging`. Devuelve los informes por métrica."""
+    if dataset not in preprocess.BATCH_DATASETS:
+        if dataset == "deaths_by_age":
+            from covid_stats_app import rollups
+            rollups.get_cube("deaths_by_age")
+        return []
+    reports = preprocess.preprocess_batch([dataset], workers=workers, lite=lite, out_dir=staging)
+    preprocess.write_indicators(dataset, out_dir=staging)
+    return reports
+
+def run_once(force=False, workers=1, lite=LITE):
+    """
+    Regenera los artefactos si cambió algún CSV (o siempre con `force`). Devuelve el estado
+    publicado. Sólo una regeneración a la vez por proceso. Cada dataset se regenera por
+    separado: si uno falla, los demás se publican igual y el fallido queda en "failed" con
+    la firma de su CSV hasta que éste cambie.
+    """
+    with _run_lock:
+        state = sources_state()
+        previous = read_status() or {}
+        changed = list(state) if force else _changed(state, previous)
+        if not changed:
+            return previous or None
+        out_dir = preprocess.get_processed_dir()
+        failed = {k: v for k, v in (previous.get("failed") or {}).items() if k in state and k not in changed}
+        status = {"state": "running", "started": _now(), "finished": None, "changed": changed,
+                  "sources": dict(previous.get("sources") or {}), "failed": failed, "artifacts": [],
+                  "errors": [f"{k}: {v['error']}" for k, v in failed.items()]}
+        _write_status(status)
+        staging = out_dir / f".staging-{os.getpid()}"
+        t0 = time.perf_counter()
+        try:
+            for d in changed:
+                # staging propio por dataset: lo de un dataset fallido no se publica
+                d_staging = staging / d
+                try:
+                    d_staging.mkdir(parents=True, exist_ok=True)
+                    reports = _regenerate(d, d_staging, workers, lite)
+                except Exception as e:
+                    logger.exception("Falló la regeneración de %s", d)
+                    failed[d] = {"source": state[d], "error": str(e)}
+                    status["errors"].append(f"{d}: {e}")
+                    continue
+                status["artifacts"] += _swap_in(d_staging, out_dir)
+                status["errors"] += [f"{r['dataset']}/{r['metric']}: {r['error']}" for r in reports if r["error"]]
+                status["sources"][d] = state[d]
+                failed.pop(d, None)
+            # los artefactos de los datasets que no se regeneraron siguen publicados
+            status["artifacts"] = sorted(set(previous.get("artifacts") or []) | set(status["artifacts"]))
+            status["state"] = "error" if failed else "idle"
+        except Exception as e:
+            logger.exception("Falló la regeneración de artefactos")
+            status["state"] = "error"
+            status["errors"].append(str(e))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        status["finished"] = _now()
+        status["seconds"] = round(time.perf_counter() - t0, 2)
+        _write_status(status)
+        return status
+
+def watch(interval=INTERVAL, stop=None, workers=1, lite=LITE):
+    """Bucle de vigilancia: comprueba los CSV cada `interval` segundos hasta que se active `stop`."""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            run_once(workers=workers, lite=lite)
+        except Exception:
+            logger.exception("Error en el worker de precálculo")
+        stop.wait(interval)
+
+def start_background(interval=INTERVAL):
+    """Arranca (una vez por proceso) el worker como hilo daemon. Devuelve el hilo."""
+    global _thread
+    with _start_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=watch, kwargs={"interval": interval}, name="covid-worker", daemon=True)
+            _thread.start()
+        return _thread
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--once", action="store_true", help="Regenerar una vez (si hay cambios) y salir")
+    parser.add_argument("--force", action="store_true", help="Regenerar aunque no haya cambios")
+    parser.add_argument("--interval", type=float, default=INTERVAL, help="Segundos entre comprobaciones")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos para generar las figuras")
+    parser.add_argument("--full", action="store_true", help="Generar la animación completa en lugar de la compacta")
+    args = parser.parse_args()
+    lite = LITE and not args.full
+    if args.once or args.force:
+        print(json.dumps(run_once(force=args.force, workers=args.workers, lite=lite), ensure_ascii=False, indent=2))
+    else:
+        watch(args.interval, workers=args.workers, lite=lite)
@@ -0,0 +1,20 @@
+# conftest.py
+import pytest
+
+from benchmarks import synthetic
+from covid_stats_app import data_loader as dl
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Directorio final/ vacío con su caché aparte; el cargador apunta a él durante el test."""
+    final = tmp_path / "final"
+    final.mkdir()
+    monkeypatch.setattr(dl, "BASE", final)
+    monkeypatch.setenv("COVID_CACHE_DIR", str(tmp_path / "cache"))
+    return final
+
+@pytest.fixture
+def synthetic_data(data_dir):
+    """CSV sintéticos pequeños de los tres datasets en `data_dir`."""
+    synthetic.generate(data_dir, n_countries=4, days=60, n_age=4)
+    return data_dir
@@ -0,0 +1,47 @@
+# test_ages.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from covid_stats_app import data_loader as dl
+
+def test_parse_age_bounds():
+    labels = ["0-4", "5 a 14 años", "10 to 19 years", "65+", "80 y más", "30", "desconocido", None, "0-4"]
+    b = dl.parse_age_bounds(labels).set_index("label")
+    assert list(b.index) == ["0-4", "5 a 14 años", "10 to 19 years", "65+", "80 y más", "30", "desconocido"]
+    assert b.loc["5 a 14 años"].tolist() == [5, 14]
+    assert b.loc["10 to 19 years"].tolist() == [10, 19]
+    assert b.loc["65+"].tolist() == [65, np.inf]
+    assert b.loc["80 y más"].tolist() == [80, np.inf]
+    assert b.loc["30"].tolist() == [30, 30]
+    assert b.loc["desconocido"].isna().all()
+
+def test_age_groups_sort_by_age():
+    dtype = dl.age_dtype(["65+", "5-14", "desconocido", "15-64", "0-4"])
+    assert list(dtype.categories) == ["0-4", "5-14", "15-64", "65+", "desconocido"]
+    assert dtype.ordered
+
+def test_rebucket_splits_by_overlap():
+    df = pd.DataFrame({"country_code": "CHL", "age_group": ["0-19", "75+", "30-39"], "deaths": [10, 26, 7]})
+    out = dl.rebucket(df, "10y").set_index("age_group")["deaths"]
+    assert out["0-9"] == out["10-19"] == 5
+    # abierto hasta AGE_MAX: 75..100 son 26 años, 5 caen en 70-79
+    assert np.isclose(out["70-79"], 5) and np.isclose(out["80+"], 21)
+    assert out["30-39"] == 7
+
+def test_rebucket_keeps_integers_when_groups_nest():
+    df = pd.DataFrame({"age_group": ["0-4", "5-9", "10-14", "65+"], "deaths": pd.array([1, 2, 3, 4], dtype="Int64")})
+    out = dl.rebucket(df, "broad")
+    assert pd.api.types.is_integer_dtype(out["deaths"])
+    # sólo aparecen los grupos destino con datos
+    assert out.set_index("age_group")["deaths"].to_dict() == {"0-4": 1, "5-14": 5, "65+": 4}
+
+@pytest.mark.parametrize("scheme", list(dl.AGE_SCHEMES))
+def test_rebucket_preserves_totals(synthetic_data, scheme):
+    df = dl.load_deaths_by_age()
+    out = dl.rebucket(df, scheme)
+    assert list(out["age_group"].cat.categories) == [t[0] for t in dl.AGE_SCHEMES[scheme]]
+    keys = ["date", "country", "country_code", "source_sheet"]
+    before = df.groupby(keys, observed=True)["deaths"].sum().astype("float64")
+    after = out.groupby(keys, observed=True)["deaths"].sum().astype("float64")
+    pd.testing.assert_series_equal(after, before, check_names=False)
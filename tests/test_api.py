@@ -0,0 +1,118 @@
+# test_api.py
+import asyncio
+import io
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from covid_stats_app import api
+from covid_stats_app import data_loader as dl
+from covid_stats_app.result_cache import API_CACHE
+
+@pytest.fixture(autouse=True)
+def _empty_caches():
+    API_CACHE.clear()
+    api._INDEXES.clear()
+    yield
+    API_CACHE.clear()
+    api._INDEXES.clear()
+
+def _call(path, query="", headers=None, method="GET"):
+    """Una petición contra la aplicación ASGI. Devuelve (status, cabeceras, cuerpo)."""
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(),
+             "headers": [(k.encode(), v.encode()) for k, v in (headers or {}).items()]}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(api.app(scope, receive, send))
+    start, body = sent
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body["body"]
+
+def _json(path, query=""):
+    status, _, body = _call(path, query)
+    assert status == 200, body
+    return json.loads(body)
+
+def test_health_and_datasets(synthetic_data):
+    health = _json("/health")
+    assert health["status"] == "ok"
+    assert health["datasets"] == {k: dl.dataset_fingerprint(k) for k in dl.EXPECTED_FILES}
+    datasets = {d["dataset"]: d for d in _json("/datasets")["datasets"]}
+    assert datasets["notifications"]["rows"] == len(dl.load_notifications())
+    assert datasets["deaths_by_age"]["metrics"] == ["deaths"]
+
+@pytest.mark.parametrize("method,path,query,status", [
+    ("GET", "/nada", "", 404),
+    ("GET", "/series/otro", "", 404),
+    ("GET", "/series", "", 404),
+    ("POST", "/health", "", 405),
+    ("GET", "/rows/notifications", "limit=0", 400),
+    ("GET", "/series/notifications", "metric=deaths", 400),
+    ("GET", "/rows/notifications", "start=ayer", 400),
+    ("GET", "/choropleth/notifications", "period=year", 400),
+    ("GET", "/quality/notifications", "format=arrow", 406),
+])
+def test_errors(synthetic_data, method, path, query, status):
+    got, headers, body = _call(path, query, method=method)
+    assert got == status
+    assert json.loads(body)["status"] == status and headers["content-type"].startswith(api.JSON_MIME)
+
+def test_series_sums_selected_countries(synthetic_data):
+    out = _json("/series/notifications", "metric=new_deaths&country=MEX,GTM&start=2020-03-05&end=2020-03-09")
+    df = dl.load_notifications()
+    sub = df[df["country_code"].isin(["MEX", "GTM"]) & df["date"].between("2020-03-05", "2020-03-09")]
+    expected = sub.groupby("date")["new_deaths"].sum()
+    assert out["total"] == 5 and out["next_offset"] is None
+    assert [r["new_deaths"] for r in out["data"]] == expected.tolist()
+    assert [r["date"][:10] for r in out["data"]] == expected.index.strftime("%Y-%m-%d").tolist()
+
+def test_rows_pages_cover_the_query(synthetic_data):
+    query = "country=HND&country=SLV&columns=date,country_code,new_cases&limit=25"
+    pages, offset = [], 0
+    while offset is not None:
+        page = _json("/rows/notifications", f"{query}&offset={offset}")
+        assert len(page["data"]) <= 25
+        pages.extend(page["data"])
+        offset = page["next_offset"]
+    assert page["total"] == len(pages) == 120
+    df = dl.load_notifications()
+    expected = df[df["country_code"].isin(["HND", "SLV"])].sort_values(["country_code", "date"])
+    assert [r["new_cases"] for r in pages] == expected["new_cases"].tolist()
+    assert set(pages[0]) == {"date", "country_code", "new_cases"}
+
+def test_choropleth_matches_monthly_sums(synthetic_data):
+    out = _json("/choropleth/notifications", "metric=new_cases&period=month&limit=1000")
+    got = pd.DataFrame(out["data"]).set_index(["country_code", "period_start"])["new_cases"]
+    df = dl.load_notifications()
+    month = df["date"].dt.to_period("M").dt.to_timestamp().dt.strftime("%Y-%m-%dT%H:%M:%S")
+    expected = df.groupby([df["country_code"].astype(str), month])["new_cases"].sum()
+    assert got.sort_index().tolist() == expected.sort_index().tolist()
+
+def test_etag_revalidation_and_head(synthetic_data):
+    status, headers, body = _call("/series/notifications", "country=MEX")
+    assert status == 200 and headers["etag"]
+    status, again, empty = _call("/series/notifications", "country=MEX", {"If-None-Match": headers["etag"]})
+    assert (status, empty, again["etag"]) == (304, b"", headers["etag"])
+    status, head, empty = _call("/series/notifications", "country=MEX", method="HEAD")
+    assert status == 200 and empty == b"" and head["content-length"] == str(len(body))
+    assert _call("/series/notifications", "country=GTM")[1]["etag"] != headers["etag"]
+    # datos nuevos: otra huella, otro ETag y el 304 ya no aplica
+    with open(synthetic_data / dl.EXPECTED_FILES["notifications"], "a", encoding="utf-8") as f:
+        f.write("2030-01-01,Mexico,MEX,1,1,0,0\n")
+    status, changed, _ = _call("/series/notifications", "country=MEX", {"If-None-Match": headers["etag"]})
+    assert status == 200 and changed["etag"] != headers["etag"]
+
+def test_arrow_format(synthetic_data):
+    status, headers, body = _call("/rows/notifications", "country=MEX&limit=10", {"Accept": api.ARROW_MIME})
+    assert status == 200 and headers["content-type"] == api.ARROW_MIME
+    table = pa.ipc.open_stream(io.BytesIO(body)).read_all()
+    assert table.num_rows == 10
+    assert json.loads(table.schema.metadata[b"covid_api"])["total"] == 60
+    assert json.loads(_call("/rows/notifications", "country=MEX&limit=10")[2])["total"] == 60
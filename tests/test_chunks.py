@@ -0,0 +1,28 @@
+# test_chunks.py
+import tracemalloc
+
+from benchmarks import synthetic
+from covid_stats_app import data_loader as dl
+from covid_stats_app import stats
+
+# 200.000 filas (~8 MB de CSV; la carga completa pasa de 30 MB): el modo por bloques no
+# debe depender del tamaño del archivo
+CHUNK_ROWS = 10_000
+PEAK_CEILING_MB = 8
+
+def _peak_mb(fn):
+    tracemalloc.start()
+    try:
+        result = fn()
+        return result, tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+def test_summarize_chunks_peak_is_bounded(data_dir):
+    synthetic.generate(data_dir, n_countries=200, days=1000, datasets=["notifications"])
+    # columna acumulada: casi todos los valores son distintos
+    chunks = dl.iter_chunks("notifications", CHUNK_ROWS, columns=["cum_cases"])
+    summary, peak = _peak_mb(lambda: stats.summarize_chunks(chunks, "cum_cases"))
+    assert summary["count"] == 200_000
+    assert summary["approximate"]
+    assert peak < PEAK_CEILING_MB, f"pico {peak:.1f} MB"
@@ -0,0 +1,74 @@
+# test_export.py
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+from covid_stats_app import data_loader as dl
+from covid_stats_app import export
+from covid_stats_app.query import QueryIndex
+from covid_stats_app.result_cache import EXPORT_CACHE
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    EXPORT_CACHE.clear()
+    yield
+    EXPORT_CACHE.clear()
+
+def test_csv_zip_holds_the_source_files(synthetic_data):
+    path = export.csv_zip()
+    with zipfile.ZipFile(path) as zf:
+        assert sorted(zf.namelist()) == sorted(dl.EXPECTED_FILES.values())
+        for key, name in dl.EXPECTED_FILES.items():
+            assert zf.read(name) == (synthetic_data / name).read_bytes()
+    # mismo contenido: se reutiliza el artefacto; sin temporales sueltos
+    assert export.csv_zip() == path
+    assert [p.name for p in export.export_dir().iterdir()] == [path.name]
+
+def test_csv_zip_follows_data_changes(synthetic_data):
+    old = export.csv_zip()
+    src = synthetic_data / dl.EXPECTED_FILES["notifications"]
+    with open(src, "a", encoding="utf-8") as f:
+        f.write("2030-01-01,Mexico,MEX,1,1,0,0\n")
+    new = export.csv_zip(["notifications"])
+    assert new != old and not old.exists()
+    with zipfile.ZipFile(new) as zf:
+        assert zf.namelist() == [dl.EXPECTED_FILES["notifications"]]
+        assert zf.read(dl.EXPECTED_FILES["notifications"]).endswith(b"2030-01-01,Mexico,MEX,1,1,0,0\n")
+
+def test_csv_zip_without_data(data_dir):
+    assert export.csv_zip() is None
+    assert export.parquet_file("notifications") is None
+
+def test_parquet_file_keeps_types(synthetic_data):
+    df = dl.load_deaths_by_age()
+    out = pd.read_parquet(export.parquet_file("deaths_by_age"))
+    pd.testing.assert_frame_equal(out, df)
+    assert out["age_group"].dtype.ordered
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_filtered_matches_slice(synthetic_data, fmt):
+    df = dl.load_notifications()
+    index = QueryIndex(df)
+    data, rows = export.filtered(index, "notifications", ["HND", "MEX"], "2020-03-10", "2020-03-20",
+                                 metrics=["new_cases"], fmt=fmt)
+    expected = df[df["country_code"].isin(["MEX", "HND"]) & df["date"].between("2020-03-10", "2020-03-20")]
+    expected = expected.drop(columns=["cum_cases", "new_deaths", "cum_deaths"])
+    expected = expected.sort_values(["country_code", "date"]).reset_index(drop=True)
+    assert rows == len(expected) == 22
+    if fmt == "parquet":
+        pd.testing.assert_frame_equal(pd.read_parquet(io.BytesIO(data)), expected)
+    else:
+        got = pd.read_csv(io.BytesIO(data))
+        assert list(got.columns) == list(expected.columns)
+        assert got["new_cases"].tolist() == expected["new_cases"].tolist()
+        assert got["date"].tolist() == expected["date"].dt.strftime("%Y-%m-%d").tolist()
+    # el orden de los países no cambia la clave de la caché
+    assert export.filtered(index, "notifications", ["MEX", "HND"], "2020-03-10", "2020-03-20",
+                           metrics=["new_cases"], fmt=fmt) == (data, rows)
+    assert EXPORT_CACHE.stats()["size"] == 1
+
+def test_filtered_rejects_unknown_format(synthetic_data):
+    with pytest.raises(ValueError):
+        export.filtered(QueryIndex(dl.load_notifications()), "notifications", fmt="xlsx")
@@ -0,0 +1,57 @@
+# test_fitting.py
+import numpy as np
+import pytest
+from scipy import optimize, stats
+
+from covid_stats_app import data_loader as dl
+from covid_stats_app import fitting
+
+@pytest.fixture
+def cases(synthetic_data):
+    x = dl.load_notifications()["new_cases"].dropna().to_numpy(dtype="float64")
+    return x[x > 0]
+
+def test_gamma_matches_scipy(cases):
+    a, loc, scale = stats.gamma.fit(cases, floc=0)
+    got = fitting.fit_gamma(cases)
+    assert np.isclose(got["a"], a, rtol=1e-4) and np.isclose(got["scale"], scale, rtol=1e-4)
+    assert got["loc"] == loc == 0
+
+def test_gamma_shape_is_vectorized():
+    rng = np.random.default_rng(1)
+    samples = [rng.gamma(shape, 10, 500) for shape in (0.5, 2.0, 30.0)]
+    s = [np.log(x.mean()) - np.log(x).mean() for x in samples]
+    expected = [stats.gamma.fit(x, floc=0)[0] for x in samples]
+    assert np.allclose(fitting.gamma_shape(s), expected, rtol=1e-4)
+
+def test_weibull_matches_scipy(cases):
+    c, loc, scale = stats.weibull_min.fit(cases, floc=0)
+    got = fitting.fit_weibull(cases)
+    assert np.isclose(got["c"], c, rtol=1e-4) and np.isclose(got["scale"], scale, rtol=1e-4)
+
+def test_lognormal_matches_scipy(cases):
+    sigma, loc, scale = stats.lognorm.fit(cases, floc=0)
+    got = fitting.fit_lognormal(cases)
+    assert np.isclose(got["sigma"], sigma, rtol=1e-6) and np.isclose(np.exp(got["mu"]), scale, rtol=1e-6)
+
+def test_nbinom_maximizes_likelihood():
+    x = np.random.default_rng(2).negative_binomial(3, 0.05, 2000).astype("float64")
+    got = fitting.fit_nbinom(x)
+    # perfil de verosimilitud: para cada r el p óptimo es r / (r + media)
+    def nll(log_r):
+        r = np.exp(log_r)
+        return -stats.nbinom.logpmf(x, r, r / (r + x.mean())).sum()
+    r = np.exp(optimize.minimize_scalar(nll, bounds=(-5, 10), method="bounded", options={"xatol": 1e-10}).x)
+    assert np.isclose(got["r"], r, rtol=1e-4)
+    assert np.isclose(got["p"], r / (r + x.mean()), rtol=1e-4)
+    assert nll(np.log(got["r"])) <= nll(np.log(r)) + 1e-6
+
+def test_nbinom_needs_overdispersion():
+    assert fitting.fit_nbinom(np.array([1.0, 2.0, 3.0])) is None
+
+def test_fit_candidates_report_ks(cases):
+    fits = {r["dist"]: r for r in fitting.fit_candidates(cases, continuous=True)}
+    assert set(fits) == set(fitting.CONTINUOUS)
+    p = fits["gamma"]["params"]
+    expected = stats.kstest(cases, "gamma", args=(p["a"], 0.0, p["scale"])).pvalue
+    assert np.isclose(fits["gamma"]["kstest_pvalue"], expected)
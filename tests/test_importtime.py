@@ -0,0 +1,12 @@
+# test_importtime.py
+from covid_stats_app import importtime
+
+def test_probe_covers_app_imports():
+    for name in ("data_loader", "stats", "plots", "rollups", "indicators", "worker",
+                 "export", "validation", "query", "instrument", "result_cache"):
+        assert f"covid_stats_app.{name}" in importtime.MODULES
+
+def test_import_budget():
+    ok, res = importtime.check_budget()
+    assert res["loaded"] == [], f"dependencias cargadas al importar: {res['loaded']}"
+    assert ok, f"importación {res['seconds']:.3f}s > presupuesto {res['budget']:.3f}s"
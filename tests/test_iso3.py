@@ -0,0 +1,32 @@
+# test_iso3.py
+import json
+
+import pytest
+
+from covid_stats_app import data_loader as dl
+
+@pytest.fixture
+def iso3_table(data_dir, monkeypatch):
+    """Tabla ISO3 vacía en memoria (la del proceso se restaura al terminar)."""
+    monkeypatch.setattr(dl, "_iso3_table", None)
+    return dl._iso3_table_path()
+
+def _reload(monkeypatch):
+    monkeypatch.setattr(dl, "_iso3_table", None)
+    return dl._load_iso3_table()
+
+def test_misses_are_retried_after_pycountry_changes(iso3_table, monkeypatch):
+    monkeypatch.setattr(dl, "_pycountry_version", lambda: "1.0")
+    dl._resolve_iso3("Atlántida")
+    dl._save_iso3_table()
+    assert json.loads(iso3_table.read_text(encoding="utf-8"))["table"]["atlántida"] is None
+    assert "atlántida" in _reload(monkeypatch)
+    # otra versión de pycountry (o recién instalado): la tabla guardada no vale
+    monkeypatch.setattr(dl, "_pycountry_version", lambda: "2.0")
+    assert _reload(monkeypatch) == {}
+
+def test_misses_are_not_saved_without_pycountry(iso3_table, monkeypatch):
+    monkeypatch.setattr(dl, "_get_pycountry", lambda: None)
+    dl._load_iso3_table().update({"chile": "CHL", "atlántida": None})
+    dl._save_iso3_table()
+    assert json.loads(iso3_table.read_text(encoding="utf-8"))["table"] == {"chile": "CHL"}
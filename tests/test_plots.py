@@ -0,0 +1,73 @@
+# test_plots.py
+import math
+
+import numpy as np
+import pytest
+
+from covid_stats_app import data_loader as dl
+from covid_stats_app import plots
+
+def _lttb_reference(x, y, n):
+    """LTTB de referencia, punto a punto como en la descripción original (Steinarsson, 2013)."""
+    every = (len(x) - 2) / (n - 2)
+    out, a = [0], 0
+    for i in range(n - 2):
+        lo, hi = int(math.floor(i * every)) + 1, int(math.floor((i + 1) * every)) + 1
+        nlo, nhi = hi, min(int(math.floor((i + 2) * every)) + 1, len(x))
+        cx, cy = np.mean(x[nlo:nhi]), np.mean(y[nlo:nhi])
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(best)
+        a = best
+    return np.array(out + [len(x) - 1])
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(3)
+    y = rng.normal(100, 10, 2000).cumsum()
+    y[777], y[1500] = y.max() * 3, -y.max()
+    return np.arange(len(y), dtype="float64"), y
+
+@pytest.mark.parametrize("n", [3, 10, 97, 500])
+def test_lttb_matches_reference(series, n):
+    x, y = series
+    assert np.array_equal(plots.lttb_indices(x, y, n), _lttb_reference(x, y, n))
+
+def test_lttb_keeps_endpoints_and_extrema(series):
+    x, y = series
+    idx = plots.lttb_indices(x, y, 100)
+    assert len(idx) <= 100 and np.all(np.diff(idx) > 0)
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    assert {777, 1500} <= set(idx.tolist())
+
+def test_minmax_keeps_every_bucket_extrema(series):
+    _, y = series
+    n = 100
+    idx = plots.minmax_indices(y, n)
+    assert np.all(np.diff(idx) > 0) and len(idx) <= n + 2
+    assert idx[0] == 0 and idx[-1] == len(y) - 1
+    kept = set(idx.tolist())
+    for bucket in np.array_split(np.arange(len(y)), n // 2):
+        assert {bucket[np.argmin(y[bucket])], bucket[np.argmax(y[bucket])]} <= kept
+
+def test_short_series_are_untouched(series):
+    x, y = series
+    assert np.array_equal(plots.lttb_indices(x[:50], y[:50], 100), np.arange(50))
+    assert np.array_equal(plots.minmax_indices(y[:50], 100), np.arange(50))
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_decimate_bounds_each_series(synthetic_data, method):
+    df = dl.load_notifications()
+    out = plots.decimate(df, "date", "new_cases", entity_col="country", max_points=20, method=method)
+    assert len(out) < len(df)
+    for country, part in df.groupby("country", observed=True):
+        got = out[out["country"] == country]
+        assert len(got) <= 22
+        assert got["date"].min() == part["date"].min() and got["date"].max() == part["date"].max()
+        if method == "minmax":
+            # LTTB elige por área visual y puede dejar fuera un máximo casi empatado
+            assert got["new_cases"].max() == part["new_cases"].max()
+            assert got["new_cases"].min() == part["new_cases"].min()
@@ -0,0 +1,52 @@
+# test_preprocess.py
+import pandas as pd
+
+from covid_stats_app import data_loader as dl
+from covid_stats_app import preprocess
+
+def _drop_columns(path, columns):
+    pd.read_csv(path).drop(columns=columns).to_csv(path, index=False)
+
+def test_batch_hospitalizations_without_country_code(synthetic_data, tmp_path):
+    _drop_columns(synthetic_data / dl.EXPECTED_FILES["hospitalizations"], ["country_code"])
+    reports = preprocess.preprocess_batch(["hospitalizations"], workers=1, lite=True, out_dir=tmp_path / "out")
+    assert [r["metric"] for r in reports] == dl.METRIC_COLUMNS["hospitalizations"]
+    assert not any(r["error"] for r in reports)
+    agg = pd.read_csv(tmp_path / "out" / "hospitalizations_agg_icu.csv")
+    assert agg["country_code"].nunique() == 4
+
+def test_batch_skips_dataset_without_country(synthetic_data, tmp_path):
+    _drop_columns(synthetic_data / dl.EXPECTED_FILES["hospitalizations"], ["country", "country_code"])
+    reports = preprocess.preprocess_batch(["hospitalizations"], workers=1, lite=True, out_dir=tmp_path / "out")
+    assert reports == []
+
+def test_indicators_key_on_country_when_code_is_missing(data_dir, monkeypatch, tmp_path):
+    dates = pd.date_range("2021-01-01", periods=20).strftime("%Y-%m-%d")
+    pd.DataFrame({
+        "date": list(dates) * 2,
+        "country": ["Atlántida"] * 20 + ["Lemuria"] * 20,
+        "new_hospitalizations": range(40),
+        "icu": 1,
+    }).to_csv(data_dir / dl.EXPECTED_FILES["hospitalizations"], index=False)
+    out = pd.read_csv(preprocess.write_indicators("hospitalizations", out_dir=tmp_path / "out"))
+    assert sorted(out["country"].unique()) == ["Atlántida", "Lemuria"]
+    assert set(out["metric"]) == {"new_hospitalizations", "icu"}
+
+def test_indicators_skip_dataset_without_country(synthetic_data, tmp_path):
+    _drop_columns(synthetic_data / dl.EXPECTED_FILES["hospitalizations"], ["country", "country_code"])
+    assert preprocess.write_indicators("hospitalizations", out_dir=tmp_path / "out") is None
+
+def test_batch_matches_chunked_for_every_metric(synthetic_data, tmp_path):
+    # dos regiones por (fecha, país): el agregado debe sumarlas en ambos caminos
+    for dataset in preprocess.BATCH_DATASETS:
+        path = synthetic_data / dl.EXPECTED_FILES[dataset]
+        df = pd.read_csv(path)
+        pd.concat([df.assign(region="A"), df.assign(region="B")]).to_csv(path, index=False)
+    cube = preprocess.preprocess_batch(workers=1, lite=True, out_dir=tmp_path / "cube")
+    chunked = preprocess.preprocess_batch(workers=1, lite=True, chunked=True, out_dir=tmp_path / "chunked")
+    metrics = [(d, m) for d in preprocess.BATCH_DATASETS for m in dl.METRIC_COLUMNS[d]]
+    assert sorted((r["dataset"], r["metric"]) for r in cube) == sorted(metrics)
+    assert sorted((r["dataset"], r["metric"]) for r in chunked) == sorted(metrics)
+    for dataset, metric in metrics:
+        name = f"{dataset}_agg_{metric}.csv"
+        pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "cube" / name), pd.read_csv(tmp_path / "chunked" / name))
@@ -0,0 +1,51 @@
+# test_query.py
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from covid_stats_app import data_loader as dl
+from covid_stats_app.query import QueryIndex
+
+def _masked(df, keys, start, end):
+    """La misma consulta como filtro con máscara booleana, en el orden del índice."""
+    mask = pd.Series(True, index=df.index)
+    if keys is not None:
+        mask &= df["country_code"].isin([keys] if isinstance(keys, str) else keys)
+    if start is not None:
+        mask &= df["date"] >= pd.Timestamp(start)
+    if type(end) is date:
+        # una fecha sin hora como final incluye todo ese día
+        mask &= df["date"] < pd.Timestamp(end) + pd.Timedelta(days=1)
+    elif end is not None:
+        mask &= df["date"] <= pd.Timestamp(end)
+    return df[mask.to_numpy()].sort_values(["country_code", "date"], kind="mergesort").reset_index(drop=True)
+
+@pytest.mark.parametrize("keys,start,end", [
+    (None, None, None),
+    ("MEX", None, None),
+    (["GTM", "HND"], "2020-03-10", "2020-04-01"),
+    (["SLV", "XXX"], date(2020, 3, 5), date(2020, 3, 5)),
+    (None, pd.Timestamp("2020-04-01 12:00"), None),
+    ("MEX", "2021-01-01", None),
+])
+def test_slice_matches_boolean_mask(synthetic_data, keys, start, end):
+    df = dl.load_notifications()
+    index = QueryIndex(df)
+    expected = _masked(df, keys, start, end)
+    got = index.slice(keys, start, end).reset_index(drop=True)
+    pd.testing.assert_frame_equal(got, expected)
+    assert len(index.positions(keys, start, end)) == len(expected)
+
+def test_slice_projects_columns_and_series_sums_keys(synthetic_data):
+    df = dl.load_notifications()
+    index = QueryIndex(df)
+    got = index.slice(["MEX", "GTM"], "2020-03-10", "2020-03-20", columns=["date", "new_cases", "missing"])
+    assert list(got.columns) == ["date", "new_cases"]
+    expected = (_masked(df, ["MEX", "GTM"], "2020-03-10", "2020-03-20")
+                .groupby("date", as_index=False)["new_cases"].sum())
+    pd.testing.assert_frame_equal(index.series("new_cases", ["MEX", "GTM"], "2020-03-10", "2020-03-20"), expected)
+
+def test_missing_columns_raise():
+    with pytest.raises(ValueError):
+        QueryIndex(pd.DataFrame({"date": []}))
@@ -0,0 +1,36 @@
+# test_rollups.py
+import pandas as pd
+
+from covid_stats_app import data_loader as dl
+from covid_stats_app import preprocess
+from covid_stats_app import rollups
+
+def _two_rows_per_day(data_dir):
+    """Chile con dos regiones por día: cada fila trae su propio acumulado."""
+    pd.DataFrame({
+        "date": ["2021-01-01", "2021-01-01", "2021-01-02", "2021-01-02", "2021-01-08", "2021-01-08"],
+        "country": "Chile",
+        "country_code": "CHL",
+        "region": ["A", "B"] * 3,
+        "new_cases": [1, 3, 2, 4, 5, 6],
+        "cum_cases": [1, 3, 3, 7, 8, 13],
+    }).to_csv(data_dir / dl.EXPECTED_FILES["notifications"], index=False)
+
+def test_cube_sums_rows_of_the_same_day(data_dir):
+    _two_rows_per_day(data_dir)
+    for metric in ("cum_cases", "new_cases"):
+        cube = preprocess._aggregate_metric("notifications", metric)
+        chunked = preprocess._aggregate_metric("notifications", metric, chunked=True)
+        pd.testing.assert_frame_equal(cube.reset_index(drop=True), chunked.reset_index(drop=True), check_dtype=False)
+    day = rollups.rollup("notifications", "day", metrics=["cum_cases"])
+    assert day["cum_cases"].tolist() == [4, 10, 21]
+    # por semana: último día de la semana, ya sumado entre regiones
+    week = rollups.rollup("notifications", "week", metrics=["cum_cases"])
+    assert week["cum_cases"].tolist() == [10, 21]
+
+def test_running_totals_keep_nullable_dtype(synthetic_data):
+    cube = rollups.build_cube(dl.load_notifications(), "notifications")
+    assert cube["new_cases_cum"].dtype == "Int64"
+    assert cube["new_deaths_cum"].dtype == "Int64"
+    agg = preprocess._aggregate_metric("notifications", "new_cases")
+    assert agg["cum"].dtype == "Int64"
@@ -0,0 +1,62 @@
+# test_stats.py
+import numpy as np
+import pandas as pd
+
+from covid_stats_app import data_loader as dl
+from covid_stats_app import stats
+
+def test_grouped_covariance_large_counts():
+    rng = np.random.default_rng(0)
+    n = 1000
+    x = 1e8 + rng.normal(0, 1, n)
+    y = x + rng.normal(0, 0.1, n)
+    df = pd.DataFrame({"country_code": np.repeat(["CHL", "PER"], n // 2), "x": x, "y": y})
+    out = stats.grouped_covariance(df, "x", "y", ["country_code"])
+    for code, part in df.groupby("country_code"):
+        expected = np.cov(part["x"], part["y"], ddof=0)[0, 1]
+        got = out.loc[out["country_code"] == code, "cov"].item()
+        assert np.isclose(got, expected, rtol=1e-6)
+
+def _close(a, b):
+    assert a.keys() == b.keys()
+    for k in a:
+        if isinstance(a[k], float):
+            assert np.isclose(a[k], b[k], rtol=1e-9), k
+        else:
+            assert a[k] == b[k], k
+
+def test_merged_summaries_match_single_pass(synthetic_data):
+    cases = dl.load_notifications()["new_cases"].copy()
+    cases.iloc[::7] = pd.NA
+    parts = [cases.iloc[:1], cases.iloc[1:1], cases.iloc[1:90], cases.iloc[90:]]
+    merged = stats.Summary()
+    for part in parts:
+        merged = merged.merge(stats.Summary.from_series(part))
+    expected = stats.Summary.from_series(cases)
+    _close(merged.to_dict(ddof=1), expected.to_dict(ddof=1))
+    assert merged.count == cases.notna().sum()
+    assert np.isclose(merged.mean, cases.astype("float64").mean())
+    assert np.isclose(merged.variance(ddof=1), cases.astype("float64").var(ddof=1))
+
+def test_summarize_chunks_matches_describe(synthetic_data):
+    full = stats.describe(dl.load_notifications()["new_cases"])
+    chunks = dl.iter_chunks("notifications", chunksize=37, columns=["new_cases"])
+    _close(stats.summarize_chunks(chunks, "new_cases", max_distinct=None), full)
+
+def test_bounded_counts_are_approximate(synthetic_data):
+    cases = dl.load_notifications()["new_cases"]
+    exact = stats.describe(cases)
+    chunks = dl.iter_chunks("notifications", chunksize=37, columns=["new_cases"])
+    approx = stats.summarize_chunks(chunks, "new_cases", max_distinct=16)
+    assert approx["approximate"] and not exact["approximate"]
+    # los momentos siguen siendo exactos; la mediana cae cerca de la exacta
+    assert approx["count"] == exact["count"]
+    assert np.isclose(approx["mean"], exact["mean"]) and np.isclose(approx["var"], exact["var"])
+    spread = cases.max() - cases.min()
+    assert abs(approx["median"] - exact["median"]) <= spread / 16
+
+def test_covariance_chunks_matches_numpy(synthetic_data):
+    df = dl.load_notifications()
+    chunks = dl.iter_chunks("notifications", chunksize=50, columns=["new_cases", "new_deaths"])
+    expected = np.cov(df["new_cases"].astype("float64"), df["new_deaths"].astype("float64"), ddof=0)[0, 1]
+    assert np.isclose(stats.covariance_chunks(chunks, "new_cases", "new_deaths"), expected)
@@ -0,0 +1,65 @@
+# test_storage.py
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+from covid_stats_app import storage
+
+def test_touched_csv_signature_is_refreshed(tmp_path, monkeypatch):
+    csv = tmp_path / "datos.csv"
+    pd.DataFrame({"a": [1, 2, 3]}).to_csv(csv, index=False)
+    storage.write_typed(pd.read_csv(csv), csv, "1")
+    st = csv.stat()
+    os.utime(csv, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    # mismo contenido, otro mtime: se compara el sha1 y se guarda la firma nueva
+    assert storage.read_typed(csv, "1")["a"].tolist() == [1, 2, 3]
+    assert storage.read_meta(storage.typed_path(csv))["mtime_ns"] == csv.stat().st_mtime_ns
+
+    # las lecturas siguientes ya no leen el CSV entero
+    def no_hash(*args, **kwargs):
+        raise AssertionError("sha1 recalculado")
+    monkeypatch.setattr(storage, "file_sha1", no_hash)
+    assert storage.read_typed(csv, "1") is not None
+    assert storage.typed_num_rows(csv, "1") == 3
+
+def test_changed_csv_is_not_fresh(tmp_path):
+    csv = tmp_path / "datos.csv"
+    pd.DataFrame({"a": [1, 2, 3]}).to_csv(csv, index=False)
+    storage.write_typed(pd.read_csv(csv), csv, "1")
+    st = csv.stat()
+    pd.DataFrame({"a": [1, 2, 4]}).to_csv(csv, index=False)
+    os.utime(csv, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert storage.read_typed(csv, "1") is None
+
+def _mixed_frame(n=1000):
+    return pd.DataFrame({
+        "date": pd.date_range("2021-01-01", periods=n, freq="D"),
+        "country_code": pd.Categorical(["CHL", "PER"] * (n // 2)),
+        "country": ["Chile", "Perú"] * (n // 2),
+        "cases": pd.array(range(n), dtype="Int32"),
+        "deaths": pd.array([None if i % 10 == 0 else i for i in range(n)], dtype="Int64"),
+        "rate": [i / 3 for i in range(n)],
+    })
+
+def test_shared_round_trip(tmp_path):
+    df = _mixed_frame()
+    path = storage.write_shared(df, tmp_path / "notifications-v1-x.arrow")
+    pd.testing.assert_frame_equal(storage.read_shared(path), df)
+    part = storage.read_shared(path, columns=["deaths", "date", "missing"])
+    pd.testing.assert_frame_equal(part, df[["deaths", "date"]])
+    assert storage.read_shared(tmp_path / "missing.arrow") is None
+    path.write_bytes(b"no es arrow")
+    assert storage.read_shared(path) is None
+
+def test_shared_columns_are_mapped_without_copy(tmp_path):
+    df = _mixed_frame(1 << 16)[["date", "cases", "rate"]]
+    path = storage.write_shared(df, tmp_path / "notifications-v1-x.arrow")
+    before = pa.total_allocated_bytes()
+    mapped = storage.read_shared(path)
+    # los valores viven en el mapa del archivo, no en memoria de Arrow ni copias de numpy
+    assert pa.total_allocated_bytes() - before < df.memory_usage(index=False).sum() / 10
+    assert not mapped["cases"].array._data.flags.writeable
+    assert not mapped["rate"].to_numpy().flags.writeable
+    pd.testing.assert_frame_equal(mapped, df)
@@ -0,0 +1,104 @@
+# test_validation.py
+import pandas as pd
+import pytest
+
+from covid_stats_app import data_loader as dl
+from covid_stats_app import validation
+
+def _drop_column(path, column):
+    pd.read_csv(path).drop(columns=[column]).to_csv(path, index=False)
+
+def test_hospitalizations_without_country_code_load(synthetic_data):
+    path = synthetic_data / dl.EXPECTED_FILES["hospitalizations"]
+    source = pd.read_csv(path)
+    _drop_column(path, "country_code")
+    df = dl.load_hospitalizations()
+    assert len(df) == len(source)
+    assert validation.is_validated(df)
+    # el código se deriva del nombre del país
+    assert df["country_code"].astype(str).tolist() == source["country_code"].tolist()
+    checks = {c["check"]: c for c in dl.quality_report("hospitalizations")["checks"]}
+    assert checks["cumulative_decrease"]["rows"] == 0
+
+def test_keys_fall_back_to_country():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2021-01-01", "2021-01-01", "2021-01-02"]),
+        "country": ["Chile", "Peru", "Chile"],
+        "cum_hospitalizations": pd.array([5, 1, 4], dtype="Int64"),
+    })
+    _, report = validation.validate(df, "hospitalizations", ["cum_hospitalizations"])
+    checks = {c["check"]: c for c in report["checks"]}
+    assert checks["duplicate_key"]["column"] == "date,country"
+    assert checks["duplicate_key"]["rows"] == 0
+    assert checks["cumulative_decrease"]["rows"] == 1
+
+def test_single_series_without_country_columns():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2021-01-01", "2021-01-02", "2021-01-03"]),
+        "cum_hospitalizations": pd.array([5, 3, 7], dtype="Int64"),
+    })
+    out, report = validation.validate(df, "hospitalizations", ["cum_hospitalizations"])
+    checks = {c["check"]: c for c in report["checks"]}
+    assert len(out) == 3
+    assert checks["cumulative_decrease"]["rows"] == 1
+    assert checks["duplicate_key"]["column"] == "date"
+
+def test_iter_chunks_drops_duplicates_across_chunks(data_dir):
+    rows = pd.DataFrame({
+        "date": ["2021-01-01", "2021-01-02", "2021-01-01", "2021-01-03", "2021-01-02", "", "2021-01-01"],
+        "country": "Chile",
+        "country_code": ["CHL", "CHL", "CHL", "CHL", "CHL", "CHL", "chl"],
+        "new_cases": [1, 2, 1, 3, 2, 5, 1],
+        "note": [None, None, None, None, None, None, None],
+    })
+    rows.to_csv(data_dir / dl.EXPECTED_FILES["notifications"], index=False)
+    # sin copia tipada: los bloques salen del CSV
+    per_chunk = pd.concat(list(dl.iter_chunks("notifications", chunksize=2, dedupe=False)), ignore_index=True)
+    streamed = pd.concat(list(dl.iter_chunks("notifications", chunksize=2)), ignore_index=True)
+    full = dl.load_notifications()
+    # fecha vacía fuera; "chl" pasa a "CHL" en la coerción y también es duplicado
+    assert len(streamed) == len(full) == 3
+    assert streamed["new_cases"].tolist() == full["new_cases"].tolist()
+    assert len(per_chunk) == 6
+
+@pytest.mark.parametrize("key", list(dl.EXPECTED_FILES))
+def test_appended_rows_match_full_reload(synthetic_data, monkeypatch, key):
+    path = synthetic_data / dl.EXPECTED_FILES[key]
+    dl.LOADERS[key]()
+    last = pd.read_csv(path).iloc[-1]
+    later = (pd.Timestamp(last["date"]) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    metrics = [c for c in dl.METRIC_COLUMNS[key] if c in last.index]
+    rows = pd.DataFrame([
+        last,                                            # duplicado exacto de una fila anterior
+        pd.Series({**last, "date": "sin fecha"}),
+        pd.Series({**last, "date": later, **{c: 1 for c in metrics}}),  # acumulados que bajan
+        pd.Series({**last, "date": later, **{c: 2 for c in metrics}}),  # clave repetida
+    ])
+    if "age_group" in rows.columns:
+        rows = pd.concat([rows, pd.DataFrame([{**last, "date": later, "age_group": "100+"}])])
+    rows.to_csv(path, mode="a", header=False, index=False)
+
+    calls = []
+    def spy(cached, new, *args):
+        calls.append(len(new))
+        return validate_tail(cached, new, *args)
+    validate_tail = validation.validate_appended
+    monkeypatch.setattr(validation, "validate_appended", spy)
+    appended = dl.LOADERS[key]()
+    report = dl.quality_report(key)
+    assert calls == [len(rows)]
+    flagged = {c["check"] for c in report["checks"] if c["rows"]}
+    assert {"duplicate_row", "invalid_date", "duplicate_key"} <= flagged
+
+    # recarga completa desde el CSV
+    dl.storage.typed_path(path).unlink()
+    for p in dl.get_shared_dir().glob(f"{key}-v*.arrow"):
+        p.unlink()
+    (dl.get_cache_dir() / "quality" / f"{key}.json").unlink()
+    full = dl.LOADERS[key]()
+    pd.testing.assert_frame_equal(appended, full)
+    expected = dl.quality_report(key)
+    assert {k: report[k] for k in ("rows_in", "rows_out", "fingerprint")} == \
+        {k: expected[k] for k in ("rows_in", "rows_out", "fingerprint")}
+    assert sorted(report["checks"], key=lambda c: (c["check"], c["column"] or "")) == \
+        sorted(expected["checks"], key=lambda c: (c["check"], c["column"] or ""))
@@ -0,0 +1,42 @@
+# test_worker.py
+import os
+
+from covid_stats_app import data_loader as dl
+from covid_stats_app import preprocess
+from covid_stats_app import worker
+
+def test_failed_dataset_is_isolated_and_not_retried(synthetic_data, monkeypatch):
+    calls = []
+    broken = {"hospitalizations"}
+    write_indicators = preprocess.write_indicators
+    def failing(dataset, out_dir=None, window=7):
+        calls.append(dataset)
+        if dataset in broken:
+            raise RuntimeError("fallo determinista")
+        return write_indicators(dataset, out_dir=out_dir, window=window)
+    monkeypatch.setattr(preprocess, "write_indicators", failing)
+
+    status = worker.run_once(lite=True)
+    assert status["state"] == "error"
+    assert list(status["failed"]) == ["hospitalizations"]
+    # lo del dataset sano se publica; lo del fallido no
+    assert "notifications_indicators.csv" in status["artifacts"]
+    assert not any(name.startswith(("hospitalizations", "choropleth_hospitalizations")) for name in status["artifacts"])
+    assert "notifications" in status["sources"] and "hospitalizations" not in status["sources"]
+
+    # sin cambios en los CSV no se vuelve a intentar
+    calls.clear()
+    assert worker.run_once(lite=True) == worker.read_status()
+    assert calls == []
+
+    # al cambiar el CSV del dataset fallido se reintenta sólo ése
+    broken.clear()
+    path = synthetic_data / dl.EXPECTED_FILES["hospitalizations"]
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    status = worker.run_once(lite=True)
+    assert calls == ["hospitalizations"]
+    assert status["changed"] == ["hospitalizations"]
+    assert status["state"] == "idle" and status["failed"] == {}
+    assert "notifications_indicators.csv" in status["artifacts"]
+    assert "hospitalizations_indicators.csv" in status["artifacts"]